@@ -0,0 +1,254 @@
+"""
+Class-wide batch grading jobs
+A job grades many submissions against one rubric. Identical submissions (same
+file paths and contents) are graded once; grading goes through the same
+cached path as /v1/labs/evaluate, so per-criterion results for unchanged files
+are reused. Each job grades BATCH_CONCURRENCY submissions at once; the LLM
+calls of all jobs and requests in a process share the provider concurrency
+limit (LLM_MAX_CONCURRENCY).
+
+Job state, submitted files and every result are written to the shared store as
+they complete. The worker running a job renews a heartbeat; if it dies, the
+job is resumed by any backend process (its own successor after a restart, or
+another worker) and only ungraded submissions are processed again.
+
+Environment:
+    BATCH_CONCURRENCY   Submissions graded at once per job (default: 4)
+    BATCH_LEASE_S       Heartbeat age after which another process takes over a job (default: 60)
+    BATCH_JOB_TTL_S     How long jobs and results are kept (default: 2592000, 30 days)
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+from llm.provider_factory import get_llm_provider
+from routers.labs import FileSubmission, LabTestCase, grade_submission
+from store import cache_key, content_hash, get_store, register_durable
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+LEASE = float(os.getenv("BATCH_LEASE_S", "60"))
+JOB_TTL = float(os.getenv("BATCH_JOB_TTL_S", str(30 * 24 * 3600)))
+
+NS_JOB = "batch_job"
+NS_SUBMISSION = "batch_submission"
+NS_RESULT = "batch_result"
+# Queued jobs and their submissions must outlive cache pressure
+register_durable(NS_JOB, NS_SUBMISSION, NS_RESULT)
+
+BATCH_SUBMISSIONS = metrics.Counter(
+    "contextweave_batch_submissions_total",
+    "Unique submissions processed by batch grading jobs, by result (graded, error, missing)",
+    ["result"]
+)
+
+BATCH_DUPLICATES = metrics.Counter(
+    "contextweave_batch_duplicate_submissions_total",
+    "Submissions skipped because an identical submission was in the same job"
+)
+
+
+def submission_key(files: List[FileSubmission]) -> str:
+    """Identity of a submission: its file paths and content hashes"""
+    return cache_key(sorted((file.path or "", content_hash(file.content)) for file in files))
+
+
+def _owner_alive(owner: str) -> bool:
+    """Whether the process named in a job's owner field can still be running"""
+    host, _, rest = owner.partition(":")
+    pid = rest.partition(":")[0]
+    if host != socket.gethostname() or not pid.isdigit():
+        return True  # Unknown: rely on the heartbeat lease
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class BatchGrader:
+    """Creates, runs and resumes batch grading jobs for this process"""
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._monitor: Optional[asyncio.Task] = None
+
+    async def create_job(
+        self,
+        submissions: List[Tuple[str, List[FileSubmission]]],
+        rubric: Dict[str, int],
+        rubric_descriptions: Optional[Dict[str, str]] = None,
+        mode: Optional[str] = None,
+        test_cases: Optional[List[LabTestCase]] = None
+    ) -> Dict:
+        """
+        Persist a job and start grading it in the background
+
+        Args:
+            submissions: (student_id, files) pairs
+            rubric: Points per criterion
+            rubric_descriptions: Optional description per criterion
+            mode: Evaluation mode passed to grade_submission
+            test_cases: Instructor test cases run against every submission
+
+        Returns:
+            The job document
+        """
+        store = get_store()
+        job_id = uuid.uuid4().hex
+        students: Dict[str, str] = {}
+        unique: Dict[str, List[FileSubmission]] = {}
+        for student_id, files in submissions:
+            key = submission_key(files)
+            if key in unique:
+                BATCH_DUPLICATES.inc()
+            unique.setdefault(key, files)
+            students[student_id] = key
+
+        for key, files in unique.items():
+            await store.aset(NS_SUBMISSION, f"{job_id}:{key}", [f.model_dump() for f in files], ttl=JOB_TTL)
+
+        now = time.time()
+        job = {
+            "id": job_id,
+            "status": "running",
+            "rubric": rubric,
+            "rubric_descriptions": rubric_descriptions,
+            "mode": mode,
+            "test_cases": [case.model_dump() for case in test_cases or []],
+            "students": students,
+            "unique": list(unique),
+            "created_at": now,
+            "completed_at": None,
+            "owner": self.owner,
+            "heartbeat": now,
+        }
+        await store.aset(NS_JOB, job_id, job, ttl=JOB_TTL)
+        logger.info(f"Batch job {job_id[:8]}: {len(students)} submissions, {len(unique)} unique")
+        self._start(job)
+        return job
+
+    async def get_job(self, job_id: str) -> Optional[Dict]:
+        return await get_store().aget(NS_JOB, job_id)
+
+    async def get_results(self, job_id: str) -> Dict[str, Dict]:
+        """Results recorded so far, by submission key"""
+        prefix = f"{job_id}:"
+        return {key[len(prefix):]: value for key, value in await get_store().aitems(NS_RESULT, prefix)}
+
+    def _start(self, job: Dict):
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job["id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job["id"], None))
+
+    async def _run(self, job: Dict):
+        store = get_store()
+        job_id = job["id"]
+        graded = {key for key, result in (await self.get_results(job_id)).items() if result.get("status") == "graded"}
+        queue: asyncio.Queue = asyncio.Queue()
+        for key in job["unique"]:
+            if key not in graded:
+                queue.put_nowait(key)
+        if graded:
+            logger.info(f"Batch job {job_id[:8]}: resuming, {queue.qsize()} of {len(job['unique'])} left")
+
+        provider = get_llm_provider()
+
+        async def worker():
+            while not queue.empty():
+                key = queue.get_nowait()
+                files = await store.aget(NS_SUBMISSION, f"{job_id}:{key}")
+                if files is None:
+                    # Evicted or expired: grading nothing would pass off an empty submission as graded
+                    logger.warning(f"Batch job {job_id[:8]}: submission {key[:8]} is missing from the store")
+                    result = {"status": "error", "error": "Submission files are no longer in the store; resubmit them"}
+                    await store.aset(NS_RESULT, f"{job_id}:{key}", result, ttl=JOB_TTL)
+                    BATCH_SUBMISSIONS.inc(result="missing")
+                    continue
+                try:
+                    evaluation = await grade_submission(
+                        provider, [FileSubmission(**f) for f in files],
+                        job["rubric"], job["rubric_descriptions"], job["mode"],
+                        [LabTestCase(**case) for case in job.get("test_cases") or []]
+                    )
+                    result = {"status": "graded", "evaluation": evaluation.model_dump()}
+                except Exception as e:
+                    logger.warning(f"Batch job {job_id[:8]}: grading failed: {e}")
+                    result = {"status": "error", "error": str(e)}
+                await store.aset(NS_RESULT, f"{job_id}:{key}", result, ttl=JOB_TTL)
+                BATCH_SUBMISSIONS.inc(result=result["status"])
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(min(CONCURRENCY, queue.qsize()), 1))))
+            await self._update(job_id, status="completed", completed_at=time.time())
+            logger.info(f"Batch job {job_id[:8]} completed")
+        finally:
+            heartbeat.cancel()
+
+    async def _update(self, job_id: str, **changes) -> bool:
+        """Apply changes to a job this process owns (compare-and-set against concurrent takeovers)"""
+        store = get_store()
+        for _ in range(5):
+            job = await store.aget(NS_JOB, job_id)
+            if not job or job["owner"] != self.owner:
+                return False
+            updated = dict(job, **changes)
+            if await store.acompare_and_set(NS_JOB, job_id, job, updated, JOB_TTL):
+                return True
+        return False
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(LEASE / 4)
+            if not await self._update(job_id, heartbeat=time.time()):
+                logger.warning(f"Batch job {job_id[:8]} was taken over by another process")
+                task = self._tasks.get(job_id)
+                if task:
+                    task.cancel()
+                return
+
+    async def resume_abandoned(self):
+        """Claim and resume running jobs whose owner died or stopped renewing its lease"""
+        store = get_store()
+        if not store:
+            return
+        now = time.time()
+        for job_id, job in await store.aitems(NS_JOB):
+            if job.get("status") != "running" or job_id in self._tasks:
+                continue
+            if now - job.get("heartbeat", 0) < LEASE and _owner_alive(job.get("owner", "")):
+                continue
+            claimed = dict(job, owner=self.owner, heartbeat=now)
+            if await store.acompare_and_set(NS_JOB, job_id, job, claimed, JOB_TTL):
+                self._start(claimed)
+
+    async def run_monitor(self):
+        """Background task: resume abandoned jobs at startup and then periodically"""
+        while True:
+            try:
+                await self.resume_abandoned()
+            except Exception as e:
+                logger.warning(f"Batch job resume check failed: {e}")
+            await asyncio.sleep(LEASE / 2)
+
+    def start(self):
+        self._monitor = asyncio.create_task(self.run_monitor())
+
+    def stop(self):
+        if self._monitor:
+            self._monitor.cancel()
+        for task in list(self._tasks.values()):
+            task.cancel()
+
+
+grader = BatchGrader()
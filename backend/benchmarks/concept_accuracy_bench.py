@@ -0,0 +1,177 @@
+"""
+Concept detector accuracy benchmark
+Compares the local rule-based concept detector (concept_rules.py) with tags
+from the configured LLM provider on a corpus of source files, and reports
+precision/recall/F1 overall and per tag, how often /v1/detect-concepts would
+still fall back to the LLM, and the detector's latency.
+
+LLM labels are fetched once per sample with the same prompt the endpoint uses
+and cached in the labels file, so later runs (and runs without an LLM) reuse
+them. Only tags the rules can produce are scored; the share of LLM tags
+outside that vocabulary is reported separately.
+
+Usage:
+    python benchmarks/concept_accuracy_bench.py --corpus ../demo --labels concept_labels.json
+    python benchmarks/concept_accuracy_bench.py --corpus ~/course/submissions --split-functions --labels labels.json
+"""
+import argparse
+import ast
+import asyncio
+import json
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from concept_rules import GENERIC_TAGS, TAG_ORDER, detect_concepts_local  # noqa: E402
+from routers.explain import CONCEPTS_MIN_CONFIDENCE, CONCEPTS_PROMPT  # noqa: E402
+
+SOURCE_SUFFIXES = (".py", ".js", ".ts", ".java", ".c", ".cpp", ".cc", ".h", ".cs", ".go")
+
+# Spellings LLMs use for the rule vocabulary
+SYNONYMS = {
+    "loop": "loops", "for-loop": "loops", "for-loops": "loops", "while-loop": "loops", "while-loops": "loops",
+    "iteration": "loops", "nested-loop": "nested-loops", "array": "arrays", "lists": "arrays", "list": "arrays",
+    "dictionary": "dictionaries", "dict": "dictionaries", "hash-map": "dictionaries", "hash-maps": "dictionaries",
+    "hashmap": "dictionaries", "hash-table": "hashing", "hash-tables": "hashing", "set": "sets",
+    "recursive": "recursion", "recursive-functions": "recursion", "binary-search-algorithm": "binary-search",
+    "dp": "dynamic-programming", "memoisation": "memoization", "bfs": "breadth-first-search",
+    "dfs": "depth-first-search", "graph": "graphs", "tree": "trees", "binary-trees": "trees",
+    "linked-list": "linked-lists", "stack": "stacks", "queue": "queues", "sort": "sorting",
+    "sorting-algorithms": "sorting", "oop": "object-oriented-programming", "classes": "object-oriented-programming",
+    "exceptions": "exception-handling", "error-handling": "exception-handling", "function": "functions",
+    "conditional-statements": "conditionals", "if-statements": "conditionals", "conditional": "conditionals",
+    "strings": "string-manipulation", "string-formatting": "string-manipulation", "lambda": "lambda-functions",
+    "lambdas": "lambda-functions", "list-comprehension": "list-comprehensions", "generator": "generators",
+    "decorator": "decorators", "file-handling": "file-io", "testing": "unit-testing", "unit-tests": "unit-testing",
+    "async": "async-programming", "asynchronous-programming": "async-programming", "type-annotations": "type-hints",
+    "edge-case-handling": "edge-cases", "two-pointer": "two-pointers",
+}
+
+
+def normalize_tag(tag: str) -> str:
+    tag = re.sub(r"[\s_]+", "-", str(tag).strip().lower())
+    return SYNONYMS.get(tag, tag)
+
+
+def load_corpus(path: Path, split_functions: bool) -> List[Tuple[str, str, str]]:
+    """(sample id, code, file path) for every source file, or every top-level Python function"""
+    files = [path] if path.is_file() else sorted(p for p in path.rglob("*") if p.suffix in SOURCE_SUFFIXES)
+    samples = []
+    for file in files:
+        code = file.read_text(encoding="utf-8", errors="replace")
+        if split_functions and file.suffix == ".py":
+            try:
+                tree = ast.parse(code)
+            except SyntaxError:
+                tree = None
+            if tree:
+                for node in tree.body:
+                    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                        samples.append((f"{file}:{node.name}", ast.get_source_segment(code, node) or "", file.name))
+                continue
+        samples.append((str(file), code, file.name))
+    return samples
+
+
+async def fetch_labels(samples, labels: Dict[str, List[str]], labels_path: Path):
+    """Ask the LLM for tags of samples without a cached label; save after each one"""
+    missing = [s for s in samples if s[0] not in labels]
+    if not missing:
+        return
+    from llm.provider_factory import get_llm_provider
+
+    provider = get_llm_provider()
+    print(f"Labelling {len(missing)} samples with {provider.get_provider_name()} ...")
+    for sample_id, code, _ in missing:
+        prompt = f"{CONCEPTS_PROMPT}\nCODE:\n```\n{code}\n```\n"
+        try:
+            response = await provider.complete(prompt=prompt, temperature=0.0, max_tokens=200)
+            tags = json.loads(response[response.index("["):response.rindex("]") + 1])
+        except Exception as e:
+            print(f"  skipped {sample_id}: {e}")
+            continue
+        labels[sample_id] = [str(t) for t in tags]
+        labels_path.write_text(json.dumps(labels, indent=2))
+
+
+def score(samples, labels) -> None:
+    vocabulary = set(TAG_ORDER)
+    true_pos: Dict[str, int] = {}
+    false_pos: Dict[str, int] = {}
+    false_neg: Dict[str, int] = {}
+    latencies = []
+    fallbacks = 0
+    llm_tags_total = llm_tags_in_vocab = 0
+    scored = 0
+
+    for sample_id, code, file_path in samples:
+        if sample_id not in labels:
+            continue
+        start = time.perf_counter()
+        predicted, confidence = detect_concepts_local(code, file_path)
+        latencies.append(time.perf_counter() - start)
+        fallbacks += confidence < CONCEPTS_MIN_CONFIDENCE
+        scored += 1
+
+        expected = {normalize_tag(t) for t in labels[sample_id]}
+        llm_tags_total += len(expected)
+        expected &= vocabulary
+        llm_tags_in_vocab += len(expected)
+        # Generic tags are only scored when the LLM mentioned them; LLMs rarely list "functions"
+        predicted_set = {t for t in predicted if t not in GENERIC_TAGS or t in expected}
+        for tag in predicted_set & expected:
+            true_pos[tag] = true_pos.get(tag, 0) + 1
+        for tag in predicted_set - expected:
+            false_pos[tag] = false_pos.get(tag, 0) + 1
+        for tag in expected - predicted_set:
+            false_neg[tag] = false_neg.get(tag, 0) + 1
+
+    if not scored:
+        raise SystemExit("No labelled samples to score")
+
+    def prf(tp, fp, fn):
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        return precision, recall, f1
+
+    tp, fp, fn = sum(true_pos.values()), sum(false_pos.values()), sum(false_neg.values())
+    precision, recall, f1 = prf(tp, fp, fn)
+    ordered = sorted(latencies)
+    print(f"\nSamples scored: {scored}")
+    print(f"Micro precision {precision:.3f}  recall {recall:.3f}  F1 {f1:.3f}")
+    print(f"LLM tags inside the rule vocabulary: {llm_tags_in_vocab}/{llm_tags_total}")
+    print(f"LLM fallback rate at confidence < {CONCEPTS_MIN_CONFIDENCE}: {fallbacks / scored:.1%}")
+    print(
+        f"Local detection latency: median {statistics.median(ordered) * 1e6:.0f} us, "
+        f"p99 {ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e6:.0f} us"
+    )
+    print(f"\n{'tag':30} {'prec':>6} {'recall':>6} {'f1':>6} {'support':>8}")
+    for tag in sorted(set(true_pos) | set(false_pos) | set(false_neg), key=lambda t: TAG_ORDER.index(t)):
+        p, r, f = prf(true_pos.get(tag, 0), false_pos.get(tag, 0), false_neg.get(tag, 0))
+        print(f"{tag:30} {p:6.2f} {r:6.2f} {f:6.2f} {true_pos.get(tag, 0) + false_neg.get(tag, 0):8d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy of rule-based concept tags against LLM labels")
+    parser.add_argument("--corpus", type=Path, default=BACKEND_DIR.parent / "demo", help="Source file or directory")
+    parser.add_argument("--labels", type=Path, default=Path("concept_labels.json"), help="LLM label cache (JSON)")
+    parser.add_argument("--split-functions", action="store_true", help="One sample per top-level Python def/class")
+    parser.add_argument("--no-fetch", action="store_true", help="Only score samples that already have labels")
+    args = parser.parse_args()
+
+    samples = load_corpus(args.corpus, args.split_functions)
+    labels = json.loads(args.labels.read_text()) if args.labels.exists() else {}
+    if not args.no_fetch:
+        asyncio.run(fetch_labels(samples, labels, args.labels))
+    score(samples, labels)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+End-to-end HTTP load test for the ContextWeave backend
+Drives /context/file, /v1/explain, /v1/chat, /v1/labs/evaluate and /health with
+a weighted request mix and reports throughput, error rate and p50/p95/p99
+latency per endpoint.
+
+By default every request is a cold one: each carries a unique marker (a comment
+in the code, the selection or the question) so it misses the backend's caches,
+and --spawn starts the backend on an empty store. --cache warm sends identical
+requests instead, measuring cache hits once the warm-up has filled them.
+
+Usage (against an already running backend that points at a mock LLM):
+    python benchmarks/load_test.py --base-url http://127.0.0.1:8000 --concurrency 60 --duration 30
+
+Usage (spawn the mock LLM and the backend automatically):
+    python benchmarks/load_test.py --spawn --concurrency 60 --duration 30 --llm-latency-ms 300
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+REPO_ROOT = BACKEND_DIR.parent
+DEMO_FILE = REPO_ROOT / "demo" / "lab1_binary_search.py"
+DEMO_RUBRIC = REPO_ROOT / "demo" / "rubric.json"
+
+DEFAULT_MIX = "context=3,explain=3,chat=2,labs=1,health=1"
+
+
+def build_requests(repo_path: str, file_path: str) -> Dict[str, Dict]:
+    """Build the request template for each endpoint in the mix"""
+    code = Path(file_path).read_text(encoding="utf-8")
+    rubric = json.loads(DEMO_RUBRIC.read_text(encoding="utf-8"))
+
+    return {
+        "context": {
+            "method": "POST",
+            "path": "/context/file",
+            "json": {
+                "repo_path": repo_path,
+                "file_path": file_path,
+                "commit_limit": 20,
+                "llm_provider": "ollama"
+            }
+        },
+        "explain": {
+            "method": "POST",
+            "path": "/v1/explain",
+            "json": {"code": code, "level": 2, "lang": "en"}
+        },
+        "chat": {
+            "method": "POST",
+            "path": "/v1/chat",
+            "json": {
+                "messages": [
+                    {"role": "user", "content": "Why does binary search need a sorted array?"}
+                ],
+                "context": {"current_file": os.path.basename(file_path)}
+            }
+        },
+        "labs": {
+            "method": "POST",
+            "path": "/v1/labs/evaluate",
+            "json": {
+                "files": [{"path": os.path.basename(file_path), "content": code}],
+                "rubric": rubric["criteria"],
+                "rubric_descriptions": rubric["descriptions"]
+            }
+        },
+        "health": {"method": "GET", "path": "/health"},
+    }
+
+
+def vary(name: str, body: Optional[Dict], variant: int) -> Optional[Dict]:
+    """Copy of a request body that no other request matches, so it misses every cache"""
+    tag = f"load-test request {variant}"
+    if name == "context":
+        return dict(body, selected_code=f"# {tag}")
+    if name == "explain":
+        return dict(body, code=f"{body['code']}\n# {tag}\n")
+    if name == "chat":
+        messages = [dict(message) for message in body["messages"]]
+        messages[-1]["content"] += f" ({tag})"
+        return dict(body, messages=messages)
+    if name == "labs":
+        files = [dict(file) for file in body["files"]]
+        files[0]["content"] += f"\n# {tag}\n"
+        return dict(body, files=files)
+    return body
+
+
+def request_body(name: str, template: Dict, variants: Optional[itertools.count]) -> Optional[Dict]:
+    body = template.get("json")
+    return vary(name, body, next(variants)) if variants is not None and body is not None else body
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    """Parse 'context=3,explain=1' into a weight mapping"""
+    weights = {}
+    for part in mix.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = int(weight or 1)
+    return weights
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100.0 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Stats:
+    """Latency and error accounting for one endpoint"""
+
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.errors = 0
+        self.status_counts: Dict[str, int] = {}
+
+    def record(self, latency_ms: float, status: str, ok: bool):
+        self.latencies_ms.append(latency_ms)
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        if not ok:
+            self.errors += 1
+
+    def summary(self, elapsed: float) -> Dict:
+        values = sorted(self.latencies_ms)
+        count = len(values)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "throughput_rps": round(count / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(values, 50), 1),
+            "p95_ms": round(percentile(values, 95), 1),
+            "p99_ms": round(percentile(values, 99), 1),
+            "max_ms": round(values[-1], 1) if values else 0.0,
+            "status_counts": self.status_counts,
+        }
+
+
+async def worker(
+    client: httpx.AsyncClient,
+    templates: Dict[str, Dict],
+    names: List[str],
+    weights: List[int],
+    stats: Dict[str, Stats],
+    deadline: float,
+    remaining: Optional[List[int]],
+    variants: Optional[itertools.count]
+):
+    """Issue requests until the deadline or the request budget is exhausted"""
+    while time.perf_counter() < deadline:
+        if remaining is not None:
+            if remaining[0] <= 0:
+                return
+            remaining[0] -= 1
+
+        name = random.choices(names, weights=weights)[0]
+        template = templates[name]
+        start = time.perf_counter()
+        try:
+            response = await client.request(
+                template["method"], template["path"], json=request_body(name, template, variants)
+            )
+            status = str(response.status_code)
+            ok = response.status_code < 400
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+            ok = False
+        stats[name].record((time.perf_counter() - start) * 1000.0, status, ok)
+
+
+async def run_load(args, templates: Dict[str, Dict]) -> Dict:
+    weights_map = parse_mix(args.mix)
+    unknown = set(weights_map) - set(templates)
+    if unknown:
+        raise SystemExit(f"Unknown endpoint(s) in mix: {', '.join(sorted(unknown))}")
+
+    names = [n for n, w in weights_map.items() if w > 0]
+    weights = [weights_map[n] for n in names]
+    stats = {name: Stats() for name in names}
+    # Cold runs number every request, warm-up included; warm runs repeat the templates
+    variants = itertools.count() if args.cache == "cold" else None
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        if args.warmup > 0:
+            for name in names:
+                for _ in range(args.warmup):
+                    template = templates[name]
+                    try:
+                        await client.request(
+                            template["method"], template["path"], json=request_body(name, template, variants)
+                        )
+                    except httpx.HTTPError:
+                        pass
+
+        remaining = [args.requests] if args.requests else None
+        start = time.perf_counter()
+        deadline = start + (args.duration if args.duration else float("inf"))
+        await asyncio.gather(*[
+            worker(client, templates, names, weights, stats, deadline, remaining, variants)
+            for _ in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - start
+
+    all_stats = Stats()
+    for s in stats.values():
+        all_stats.latencies_ms.extend(s.latencies_ms)
+        all_stats.errors += s.errors
+        for status, count in s.status_counts.items():
+            all_stats.status_counts[status] = all_stats.status_counts.get(status, 0) + count
+
+    return {
+        "base_url": args.base_url,
+        "concurrency": args.concurrency,
+        "cache": args.cache,
+        "elapsed_s": round(elapsed, 2),
+        "mix": weights_map,
+        "endpoints": {name: s.summary(elapsed) for name, s in stats.items()},
+        "total": all_stats.summary(elapsed),
+    }
+
+
+def print_report(report: Dict):
+    print(f"\n{'='*96}")
+    print(
+        f"Load test: {report['base_url']}  concurrency={report['concurrency']}  "
+        f"cache={report['cache']}  elapsed={report['elapsed_s']}s"
+    )
+    print(f"{'='*96}")
+    header = f"{'endpoint':<10} {'reqs':>7} {'err%':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}  statuses"
+    print(header)
+    print("-" * 96)
+    rows = list(report["endpoints"].items()) + [("TOTAL", report["total"])]
+    for name, s in rows:
+        statuses = ", ".join(f"{k}:{v}" for k, v in sorted(s["status_counts"].items()))
+        print(
+            f"{name:<10} {s['requests']:>7} {s['error_rate']*100:>6.1f}% {s['throughput_rps']:>8.2f} "
+            f"{s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['p99_ms']:>9.1f} {s['max_ms']:>9.1f}  {statuses}"
+        )
+
+
+def wait_for(url: str, timeout: float = 30.0):
+    """Poll a URL until it answers or the timeout expires"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"Timed out waiting for {url}")
+
+
+def spawn_stack(args) -> List[subprocess.Popen]:
+    """Start the mock LLM and a backend instance wired to it, on an empty shared store"""
+    mock_url = f"http://127.0.0.1:{args.mock_port}"
+    mock = subprocess.Popen([
+        sys.executable, str(Path(__file__).parent / "mock_llm_server.py"),
+        "--port", str(args.mock_port),
+        "--latency-ms", str(args.llm_latency_ms),
+        "--jitter-ms", str(args.llm_jitter_ms),
+    ])
+    wait_for(f"{mock_url}/api/tags")
+
+    env = dict(os.environ)
+    env.update({
+        "LLM_PROVIDER": "ollama",
+        "OLLAMA_API_BASE": mock_url,
+        "LOCALAI_API_BASE": f"{mock_url}/v1",
+        # Results cached by earlier runs must not turn this run's requests into hits
+        "CACHE_DB": os.path.join(tempfile.mkdtemp(prefix="contextweave-load-"), "cache.db"),
+    })
+    port = args.base_url.rsplit(":", 1)[-1].rstrip("/")
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", port, "--log-level", "warning"],
+        cwd=str(BACKEND_DIR),
+        env=env
+    )
+    wait_for(f"{args.base_url}/")
+    return [backend, mock]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ContextWeave backend load test")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=20, help="Number of concurrent clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Test duration in seconds (0 = until --requests)")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many requests (0 = no limit)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted endpoint mix (default: {DEFAULT_MIX})")
+    parser.add_argument("--warmup", type=int, default=1, help="Warm-up requests per endpoint before measuring")
+    parser.add_argument(
+        "--cache", choices=("cold", "warm"), default="cold",
+        help="cold: every request is unique and misses the caches; warm: identical requests (default: cold)"
+    )
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--repo-path", default=str(REPO_ROOT), help="Repository path sent to /context/file")
+    parser.add_argument("--file-path", default=str(DEMO_FILE), help="File path sent to /context/file")
+    parser.add_argument("--json", dest="json_out", help="Also write the report to this JSON file")
+    parser.add_argument("--spawn", action="store_true", help="Start the mock LLM and backend before testing")
+    parser.add_argument("--mock-port", type=int, default=11500)
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    if not args.duration and not args.requests:
+        parser.error("Set --duration and/or --requests")
+
+    processes = spawn_stack(args) if args.spawn else []
+    try:
+        templates = build_requests(args.repo_path, args.file_path)
+        report = asyncio.run(run_load(args, templates))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Mock LLM server for load testing
+Emulates the Ollama (/api/*) and OpenAI-compatible (/v1/*) endpoints the
+providers call, with a configurable artificial latency, so the backend can be
+exercised end-to-end without a real model. With --load-ms, /api/generate also
+emulates Ollama model loading: the first call, a call after keep_alive expired
+or a call with a different num_ctx pays the load time and reports it as
+load_duration. With --prefill-ms-per-1k, prompt processing costs time per
+1000 characters not shared with the previous prompt (a single-slot prefix
+cache like llama.cpp's), and "stream": true returns NDJSON chunks so
+time-to-first-token can be measured.
+
+Usage:
+    python benchmarks/mock_llm_server.py --port 11500 --latency-ms 200 --jitter-ms 50
+    python benchmarks/mock_llm_server.py --port 11500 --load-ms 3000
+    python benchmarks/mock_llm_server.py --port 11500 --prefill-ms-per-1k 40
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI(title="ContextWeave Mock LLM")
+
+# Latency settings (overridden from the command line)
+LATENCY = {"base_ms": 200.0, "jitter_ms": 50.0, "load_ms": 0.0, "prefill_ms_per_1k": 0.0}
+
+# Emulated prefix cache: last prompt processed per model
+_last_prompt = {}
+
+# Emulated Ollama model residency: (model, num_ctx) -> unload deadline
+_loaded = {}
+
+
+def _keep_alive_seconds(value) -> float:
+    """Parse an Ollama keep_alive value ("30m", "1h", "45s", seconds, or -1 for forever)"""
+    if value is None:
+        return 300.0
+    text = str(value).strip()
+    units = {"s": 1, "m": 60, "h": 3600}
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    seconds = float(text)
+    return float("inf") if seconds < 0 else seconds
+
+
+async def _simulate_load(body: dict) -> int:
+    """Sleep for the load time if the model is not resident; return load_duration in ns"""
+    if not LATENCY["load_ms"]:
+        return 0
+    now = time.monotonic()
+    num_ctx = (body.get("options") or {}).get("num_ctx", 2048)
+    model = body.get("model", "llama3")
+    resident = _loaded.get((model, num_ctx), 0) > now
+    if not resident:
+        # Ollama keeps one context size per model: a new num_ctx means a reload
+        for loaded_key in [k for k in _loaded if k[0] == model]:
+            del _loaded[loaded_key]
+        await asyncio.sleep(LATENCY["load_ms"] / 1000.0)
+    _loaded[(model, num_ctx)] = time.monotonic() + _keep_alive_seconds(body.get("keep_alive"))
+    return 0 if resident else int(LATENCY["load_ms"] * 1e6)
+
+
+def _fake_completion(prompt: str) -> str:
+    """Return a canned response shaped like what the calling prompt expects"""
+    if "Return JSON array of evaluations" in prompt:
+        criteria = [
+            line.split("(")[0].strip("- ").strip().lower()
+            for line in prompt.splitlines()
+            if line.startswith("- ") and "points)" in line
+        ]
+        return json.dumps([
+            {"criterion": c, "score": "Met", "feedback": "Looks good."}
+            for c in criteria
+        ])
+    if "against ONE rubric criterion" in prompt:
+        criterion = next(
+            (line[len("CRITERION: "):].split("(")[0].strip().lower()
+             for line in prompt.splitlines() if line.startswith("CRITERION: ")),
+            "unknown"
+        )
+        return json.dumps({"criterion": criterion, "score": "Met", "feedback": "Looks good."})
+    if "concept tags" in prompt:
+        return json.dumps(["binary-search", "loops"])
+    if '"hint"' in prompt:
+        return json.dumps({
+            "hint": "This code narrows a search range by half on each step.",
+            "concepts": ["binary-search"],
+            "difficulty": 2
+        })
+    if '"summary"' in prompt:
+        return json.dumps({
+            "summary": "This file implements a small algorithm with tests.",
+            "decisions": [{"title": "Iterative loop", "description": "Avoids recursion depth limits.", "commits": []}],
+            "related_files": [],
+            "weird_code_explanation": None
+        })
+    return "What do you think happens when the middle element is larger than the target?"
+
+
+async def _simulate_latency():
+    delay = LATENCY["base_ms"] + random.uniform(-LATENCY["jitter_ms"], LATENCY["jitter_ms"])
+    await asyncio.sleep(max(delay, 0.0) / 1000.0)
+
+
+async def _simulate_prefill(model: str, prompt: str) -> int:
+    """Sleep for prompt processing of the uncached suffix; return the evaluated token count"""
+    cached = len(os.path.commonprefix([_last_prompt.get(model, ""), prompt]))
+    _last_prompt[model] = prompt
+    uncached = len(prompt) - cached
+    if LATENCY["prefill_ms_per_1k"]:
+        await asyncio.sleep(uncached / 1000.0 * LATENCY["prefill_ms_per_1k"] / 1000.0)
+    return max(uncached // 4, 1)
+
+
+@app.get("/api/tags")
+async def ollama_tags():
+    return {"models": [{"name": "llama3"}]}
+
+
+@app.post("/api/generate")
+async def ollama_generate(request: Request):
+    body = await request.json()
+    prompt = body.get("prompt", "")
+    load_duration = await _simulate_load(body)
+    if not prompt:
+        # Ollama loads the model and returns immediately for an empty prompt
+        return {"model": body.get("model", "llama3"), "response": "", "done": True, "load_duration": load_duration}
+    model = body.get("model", "llama3")
+    prompt_eval_count = await _simulate_prefill(model, prompt)
+    text = _fake_completion(prompt)
+    final = {
+        "model": model,
+        "done": True,
+        "load_duration": load_duration,
+        "prompt_eval_count": prompt_eval_count,
+        "eval_count": len(text) // 4,
+        # Stand-in for the conversation tokens Ollama returns for continuation
+        "context": list(body.get("context") or []) + [0] * (len(prompt) // 4 + len(text) // 4)
+    }
+    if body.get("stream"):
+        async def chunks():
+            # First token right after prefill, the rest after the generation latency
+            words = text.split(" ")
+            yield json.dumps({"model": model, "response": words[0], "done": False}) + "\n"
+            await _simulate_latency()
+            yield json.dumps({"model": model, "response": " " + " ".join(words[1:]), "done": False}) + "\n"
+            yield json.dumps(dict(final, response="")) + "\n"
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+    await _simulate_latency()
+    return dict(final, response=text)
+
+
+@app.get("/v1/models")
+async def openai_models():
+    return {"object": "list", "data": [{"id": "gpt-3.5-turbo", "object": "model"}]}
+
+
+@app.post("/v1/chat/completions")
+async def openai_chat(request: Request):
+    body = await request.json()
+    prompt = "\n".join(m.get("content") or "" for m in body.get("messages", []))
+    await _simulate_latency()
+    text = _fake_completion(prompt)
+    return {
+        "id": "mock-completion",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-3.5-turbo"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": text},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(text) // 4,
+            "total_tokens": (len(prompt) + len(text)) // 4
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock LLM server (Ollama + OpenAI compatible)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Mean simulated generation latency")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Uniform +/- jitter around the mean")
+    parser.add_argument("--load-ms", type=float, default=0.0,
+                        help="Simulated Ollama model load time when the model is not resident (0 disables)")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=0.0,
+                        help="Simulated prompt processing time per 1000 uncached prompt characters")
+    args = parser.parse_args()
+
+    LATENCY["base_ms"] = args.latency_ms
+    LATENCY["jitter_ms"] = args.jitter_ms
+    LATENCY["load_ms"] = args.load_ms
+    LATENCY["prefill_ms_per_1k"] = args.prefill_ms_per_1k
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
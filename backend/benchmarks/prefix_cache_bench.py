@@ -0,0 +1,174 @@
+"""
+Prompt prefix cache benchmark
+Sends the same stream of hint and lab-evaluation requests to an Ollama-compatible
+server twice: once with the previous prompt layout (per-request values such as
+the response language and the rubric/code placed before static instructions)
+and once with the current layout (static prefix first). Reports time to first
+token and the number of prompt tokens the server had to evaluate, which drops
+when the server reuses its cached prefix.
+
+Usage:
+    python benchmarks/prefix_cache_bench.py --base-url http://localhost:11434 --model llama3
+    python benchmarks/prefix_cache_bench.py --spawn-mock --prefill-ms-per-1k 40
+"""
+import argparse
+import json
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from routers.explain import LANG_INSTRUCTIONS, LEVEL_INSTRUCTIONS, TUTOR_SYSTEM_PROMPT, get_hint_prompt  # noqa: E402
+from routers.labs import EVALUATOR_PROMPT, FileSubmission, build_evaluation_prompt  # noqa: E402
+
+CODE_SAMPLES = [
+    "def binary_search(items, target):\n    lo, hi = 0, len(items) - 1\n    while lo <= hi:\n"
+    "        mid = (lo + hi) // 2\n        if items[mid] == target:\n            return mid\n"
+    "        if items[mid] < target:\n            lo = mid + 1\n        else:\n            hi = mid - 1\n    return -1",
+    "def fib(n):\n    if n < 2:\n        return n\n    return fib(n - 1) + fib(n - 2)",
+    "class Stack:\n    def __init__(self):\n        self.items = []\n    def push(self, x):\n"
+    "        self.items.append(x)\n    def pop(self):\n        return self.items.pop()",
+    "for i in range(10):\n    if i % 2 == 0:\n        print(i)",
+]
+
+RUBRICS = [
+    {"correctness": 40, "style": 20, "testing": 40},
+    {"correctness": 50, "documentation": 50},
+]
+
+
+def legacy_hint_prompt(code: str, level: int, lang: str, exam_mode: bool) -> str:
+    """The hint prompt layout before static-prefix ordering: language inside the system prompt"""
+    system = TUTOR_SYSTEM_PROMPT.replace("the language requested below", lang)
+    exam_note = "\n⚠️ EXAM MODE ACTIVE: Providing only Level 1 conceptual hints." if exam_mode else ""
+    static_rules, _, output_format = system.partition("Provide your response as JSON:")
+    return (
+        f"{static_rules}\n{LANG_INSTRUCTIONS[lang]}\n\n{LEVEL_INSTRUCTIONS[level]}\n\n{exam_note}\n\n"
+        f"CODE TO EXPLAIN:\n```\n{code}\n```\n\nProvide your response as JSON:{output_format}"
+    )
+
+
+def legacy_evaluation_prompt(files, rubric) -> str:
+    """The evaluator prompt layout before static-prefix ordering: output format after the code"""
+    current = build_evaluation_prompt(files, rubric)
+    rules, _, output_format = EVALUATOR_PROMPT.partition("For each rubric criterion below, provide:")
+    return rules + current[len(EVALUATOR_PROMPT):] + "\nFor each criterion, provide:" + output_format
+
+
+def workload(count: int, seed: int):
+    """(legacy, current) prompt pairs for a mixed stream of students"""
+    rng = random.Random(seed)
+    pairs = []
+    for _ in range(count):
+        code = rng.choice(CODE_SAMPLES)
+        if rng.random() < 0.7:
+            level, lang, exam_mode = rng.choice([1, 2, 3]), rng.choice(["en", "hi"]), rng.random() < 0.2
+            pairs.append((legacy_hint_prompt(code, level, lang, exam_mode), get_hint_prompt(code, level, lang, exam_mode)))
+        else:
+            files = [FileSubmission(path="lab.py", content=code)]
+            rubric = rng.choice(RUBRICS)
+            pairs.append((legacy_evaluation_prompt(files, rubric), build_evaluation_prompt(files, rubric)))
+    return pairs
+
+
+def measure(client: httpx.Client, base_url: str, model: str, prompt: str):
+    """Stream one generation; return (seconds to first token, prompt tokens evaluated)"""
+    start = time.perf_counter()
+    first_token = None
+    prompt_eval_count = None
+    with client.stream(
+        "POST",
+        f"{base_url}/api/generate",
+        json={"model": model, "prompt": prompt, "stream": True, "options": {"num_predict": 16, "num_ctx": 4096}}
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if first_token is None and chunk.get("response"):
+                first_token = time.perf_counter() - start
+            if chunk.get("done"):
+                prompt_eval_count = chunk.get("prompt_eval_count")
+    return first_token or (time.perf_counter() - start), prompt_eval_count
+
+
+def run_layout(base_url: str, model: str, prompts):
+    ttfts, evaluated = [], []
+    with httpx.Client(timeout=300.0) as client:
+        # Same starting state for both layouts: one unrelated prompt first
+        measure(client, base_url, model, "Say hello.")
+        for prompt in prompts:
+            ttft, tokens = measure(client, base_url, model, prompt)
+            ttfts.append(ttft)
+            if tokens is not None:
+                evaluated.append(tokens)
+    return ttfts, evaluated
+
+
+def report(name: str, ttfts, evaluated):
+    ordered = sorted(ttfts)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    tokens = f", prompt tokens evaluated mean {statistics.mean(evaluated):.0f}" if evaluated else ""
+    print(
+        f"{name:8} TTFT median {statistics.median(ttfts) * 1000:7.1f} ms, "
+        f"p95 {p95 * 1000:7.1f} ms{tokens}"
+    )
+    return statistics.median(ttfts)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare time to first token for legacy vs static-prefix prompts")
+    parser.add_argument("--base-url", default="http://localhost:11434", help="Ollama-compatible server")
+    parser.add_argument("--model", default="llama3")
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--spawn-mock", action="store_true", help="Start benchmarks/mock_llm_server.py instead")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=40.0,
+                        help="Mock prompt processing cost per 1000 uncached characters (--spawn-mock only)")
+    args = parser.parse_args()
+
+    mock = None
+    base_url = args.base_url.rstrip("/")
+    if args.spawn_mock:
+        port = free_port()
+        mock = subprocess.Popen(
+            [sys.executable, str(BACKEND_DIR / "benchmarks" / "mock_llm_server.py"), "--port", str(port),
+             "--latency-ms", "20", "--jitter-ms", "0", "--prefill-ms-per-1k", str(args.prefill_ms_per_1k)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        for _ in range(100):
+            try:
+                httpx.get(f"{base_url}/api/tags", timeout=0.5)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+
+    try:
+        pairs = workload(args.requests, args.seed)
+        legacy = report("legacy", *run_layout(base_url, args.model, [p[0] for p in pairs]))
+        current = report("current", *run_layout(base_url, args.model, [p[1] for p in pairs]))
+        print(f"\nmedian TTFT change: {(current - legacy) / legacy * 100:+.1f}%")
+    finally:
+        if mock:
+            mock.terminate()
+            mock.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
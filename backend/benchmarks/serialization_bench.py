@@ -0,0 +1,146 @@
+"""
+JSON serialization and compression benchmark
+Measures, on synthetic payloads shaped like the API's largest bodies, the CPU
+time to encode a response the old way (jsonable_encoder + Starlette's
+JSONResponse) and through fast_json.FastJSONResponse, the time to decode
+request bodies with json and fast_json, and the bytes on the wire with and
+without gzip at GZIP_LEVEL.
+
+Payloads: a /context/file response, a lab submission with whole source files
+(request side), a finished batch job's results, and a cohort's mastery
+profiles (request side) and report.
+
+Usage:
+    python benchmarks/serialization_bench.py
+    python benchmarks/serialization_bench.py --students 5000 --topics 30 --submissions 1000 --repeat 20
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Dict
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+
+import compression  # noqa: E402
+import fast_json  # noqa: E402
+from cohort_analytics import analyze_cohort  # noqa: E402
+from schemas import ContextResponse  # noqa: E402
+
+
+def source_files(limit: int) -> list:
+    files = sorted(BACKEND_DIR.glob("*.py"))[:limit]
+    return [{"path": f.name, "content": f.read_text(encoding="utf-8")} for f in files]
+
+
+def context_payload(rng: random.Random) -> Dict:
+    response = ContextResponse(
+        summary="Handles the repository context analysis pipeline. " * 4,
+        decisions=[
+            {"title": f"Decision {i}", "description": "Cache results by content hash " * 3,
+             "commits": [f"{rng.getrandbits(160):040x}" for _ in range(5)]}
+            for i in range(8)
+        ],
+        related_files=[{"path": f"backend/module_{i}.py", "reason": "Imported by this file"} for i in range(10)],
+        metadata={"commits_analyzed": 50, "provider": "ollama", "model": "llama3", "cached": False},
+    )
+    # FastAPI serializes the response_model first; both renderers get the same dict
+    return response.model_dump(mode="json")
+
+
+def batch_payload(rng: random.Random, submissions: int) -> Dict:
+    criteria = ["correctness", "style", "documentation", "testing"]
+    results = []
+    for i in range(submissions):
+        rows = [
+            {"criterion": c, "score": rng.choice(["Met", "Partial", "Not Met"]), "points": rng.randint(0, 10),
+             "max_points": 10, "feedback": "Handles the main cases; edge cases around empty input are missing. " * 2}
+            for c in criteria
+        ]
+        results.append({
+            "student_id": f"student-{i:05d}", "status": "done",
+            "result": {"overall_score": sum(r["points"] for r in rows), "overall_max": 40,
+                       "percentage": rng.randint(0, 100), "criteria": rows,
+                       "summary": "Solid submission with room to improve testing."},
+        })
+    return {"job_id": "bench", "status": "done", "total": submissions, "graded": submissions, "results": results}
+
+
+def cohort_profiles(rng: random.Random, students: int, topics: int) -> list:
+    names = [f"topic-{t}" for t in range(topics)]
+    start = date(2026, 9, 1)
+    return [
+        (f"student-{s:05d}", {
+            name: {"score": round(rng.uniform(0, 5), 2), "attempts": rng.randint(0, 20),
+                   "hint_usage": rng.randint(0, 5),
+                   "last_review": (start + timedelta(days=rng.randint(0, 45))).isoformat()}
+            for name in names
+        })
+        for s in range(students)
+    ]
+
+
+def timed(function: Callable, repeat: int) -> float:
+    """Median milliseconds of function()"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def report_response(name: str, content, repeat: int):
+    old_ms = timed(lambda: JSONResponse(jsonable_encoder(content)), repeat)
+    new_ms = timed(lambda: fast_json.FastJSONResponse(content), repeat)
+    body = fast_json.FastJSONResponse(content).body
+    gzip_ms = timed(lambda: compression.gzip_body(body), repeat)
+    wire = len(compression.gzip_body(body))
+    print(f"{name:<18} encode {old_ms:8.2f} ms -> {new_ms:7.2f} ms ({old_ms / new_ms:5.1f}x)   "
+          f"bytes {len(body):>10,} -> gzip {wire:>9,} ({wire / len(body):5.1%}, {gzip_ms:.2f} ms)")
+
+
+def report_request(name: str, content, repeat: int):
+    body = json.dumps(content).encode("utf-8")
+    old_ms = timed(lambda: json.loads(body), repeat)
+    new_ms = timed(lambda: fast_json.loads(body), repeat)
+    compressed = compression.gzip_body(body)
+    gunzip_ms = timed(lambda: compression.gunzip(compressed), repeat)
+    print(f"{name:<18} decode {old_ms:8.2f} ms -> {new_ms:7.2f} ms ({old_ms / new_ms:5.1f}x)   "
+          f"bytes {len(body):>10,} -> gzip {len(compressed):>9,} "
+          f"({len(compressed) / len(body):5.1%}, gunzip {gunzip_ms:.2f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON encoding CPU and gzip bytes for large API payloads")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--topics", type=int, default=30)
+    parser.add_argument("--submissions", type=int, default=500)
+    parser.add_argument("--lab-files", type=int, default=12, help="Backend source files in the lab submission")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"orjson: {'yes' if fast_json.orjson is not None else 'no (stdlib fallback)'}, "
+          f"gzip level {compression.LEVEL}\n")
+    report_response("context response", context_payload(rng), args.repeat)
+    lab = {"files": source_files(args.lab_files), "rubric": {"correctness": 30, "style": 20}}
+    report_request("lab submission", lab, args.repeat)
+    report_response("batch results", batch_payload(rng, args.submissions), args.repeat)
+    profiles = cohort_profiles(rng, args.students, args.topics)
+    report_request("cohort request", {"students": [{"student_id": s, "topics": t} for s, t in profiles]}, args.repeat)
+    exam_topics = [f"topic-{t}" for t in range(min(10, args.topics))]
+    report_response("cohort report", analyze_cohort(profiles, exam_topics, date(2026, 10, 19)), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Backend startup benchmark
+Measures wall-clock time from process start to the first successful `GET /`
+response, the same thing BackendManager.start in the VS Code extension waits
+for.
+
+Usage:
+    python benchmarks/startup_bench.py --runs 5
+    python benchmarks/startup_bench.py --mode uvicorn --runs 5
+"""
+import argparse
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_once(mode: str, timeout: float) -> float:
+    """Start the backend once and return seconds until GET / succeeds"""
+    port = free_port()
+    env = dict(os.environ, PORT=str(port))
+    if mode == "main":
+        # Exactly what the extension runs (includes the reloader process)
+        command = [sys.executable, "main.py"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)]
+
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command,
+        cwd=str(BACKEND_DIR),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=0.5).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.HTTPError:
+                pass
+            if process.poll() is not None:
+                raise SystemExit(f"Backend exited early with code {process.returncode}")
+            time.sleep(0.01)
+        raise SystemExit(f"Backend did not answer within {timeout}s")
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time from backend process start to first successful / response")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mode", choices=["main", "uvicorn"], default="main",
+                        help="'main' runs python main.py like the extension; 'uvicorn' runs a single process")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    timings = []
+    for i in range(args.runs):
+        elapsed = measure_once(args.mode, args.timeout)
+        timings.append(elapsed)
+        print(f"run {i + 1}: {elapsed * 1000:.0f} ms")
+
+    print(
+        f"\nstartup ({args.mode}): min {min(timings) * 1000:.0f} ms, "
+        f"median {statistics.median(timings) * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
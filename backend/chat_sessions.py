@@ -0,0 +1,216 @@
+"""
+Server-side tutor chat sessions
+Conversation state lives on the server, keyed by a client-chosen session id, so
+the client only sends the new message each turn. Older turns are folded into a
+rolling summary by a background LLM call, and the prompt is built from the
+summary plus as many recent turns as fit in a token budget, so the per-turn
+prompt stays flat as the conversation grows. Where the provider keeps
+conversation state (Ollama's context tokens), it is reused and only the new
+turn is sent.
+
+Sessions are stored in the shared store (store.py) when it is enabled, so any
+worker can serve the next turn; otherwise they are kept in process memory.
+Turns of one session are serialized within a worker; across workers the last
+write wins.
+
+Environment:
+    CHAT_HISTORY_TOKENS      Token budget for summary + recent turns in a prompt (default: 1500)
+    CHAT_KEEP_TURNS          Recent turns kept verbatim when summarizing (default: 6)
+    CHAT_CONTEXT_MAX_TOKENS  Largest provider context reused before rebuilding from the summary (default: 4096)
+    CHAT_SESSION_TTL_S       Idle lifetime of a session (default: 86400)
+"""
+import asyncio
+import logging
+import os
+import time
+import weakref
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+from llm.provider_factory import provider_slots
+from prefetch import prefetcher
+from store import get_store
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "1500"))
+KEEP_TURNS = int(os.getenv("CHAT_KEEP_TURNS", "6"))
+CONTEXT_MAX_TOKENS = int(os.getenv("CHAT_CONTEXT_MAX_TOKENS", "4096"))
+SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL_S", "86400"))
+
+SUMMARY_PROMPT = """You maintain a running summary of a tutoring conversation between a student and ContextWeave Coach.
+Update the summary with the new turns below. Keep: the student's goal, the code and files discussed,
+concepts they struggled with, hints already given and open questions. Use at most 150 words.
+Return only the summary text.
+"""
+
+CHAT_PROMPT_TOKENS = metrics.Histogram(
+    "contextweave_chat_prompt_tokens",
+    "Estimated tokens sent per chat turn, by mode (full prompt or provider context continuation)",
+    ["mode"],
+    buckets=(50, 100, 250, 500, 1000, 1500, 2000, 3000, 5000, 10000)
+)
+
+CHAT_SUMMARIES = metrics.Counter(
+    "contextweave_chat_summaries_total",
+    "Background summarizations of older chat turns",
+    ["result"]
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English and code)"""
+    return len(text) // 4 + 1
+
+
+class ChatTurn(BaseModel):
+    seq: int
+    role: str
+    content: str
+
+
+class ChatSession(BaseModel):
+    id: str
+    turns: List[ChatTurn] = []
+    next_seq: int = 0
+    summary: str = ""
+    # Provider-side conversation state and the provider/model/system prompt it belongs to
+    provider_state: Optional[Any] = None
+    provider_state_key: Optional[str] = None
+    updated_at: float = 0.0
+
+    def add_turn(self, role: str, content: str):
+        self.turns.append(ChatTurn(seq=self.next_seq, role=role, content=content))
+        self.next_seq += 1
+
+    def needs_summary(self) -> bool:
+        """True when turns older than the last KEEP_TURNS no longer fit the budget"""
+        if len(self.turns) <= KEEP_TURNS:
+            return False
+        history_tokens = estimate_tokens(self.summary) + sum(estimate_tokens(t.content) for t in self.turns)
+        return history_tokens > HISTORY_TOKENS // 2
+
+
+def build_session_prompt(session: ChatSession, system_prompt: str, message: str) -> str:
+    """
+    System prompt, rolling summary and the newest turns that fit the token budget
+
+    Args:
+        session: Session whose history is used
+        system_prompt: Static system prompt plus student context
+        message: The new user message
+
+    Returns:
+        Complete prompt ending with "ASSISTANT:"
+    """
+    budget = HISTORY_TOKENS - estimate_tokens(message)
+    summary = ""
+    if session.summary:
+        summary = f"\nSummary of the earlier conversation:\n{session.summary}\n"
+        budget -= estimate_tokens(summary)
+
+    recent: List[str] = []
+    for turn in reversed(session.turns):
+        line = f"{turn.role.upper()}: {turn.content}\n"
+        cost = estimate_tokens(line)
+        if cost > budget:
+            break
+        budget -= cost
+        recent.append(line)
+
+    return f"{system_prompt}{summary}\n{''.join(reversed(recent))}USER: {message}\n\nASSISTANT:"
+
+
+class ChatSessionStore:
+    """Loads and saves sessions and summarizes them in the background"""
+
+    NAMESPACE = "chat_session"
+
+    def __init__(self):
+        self._memory: Dict[str, Dict] = {}
+        # Locks disappear once no request holds them
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._summarizing = set()
+        self._tasks = set()
+
+    def lock(self, session_id: str) -> asyncio.Lock:
+        """Per-session lock so turns of one session run one at a time"""
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        return lock
+
+    async def load(self, session_id: str) -> Optional[ChatSession]:
+        store = get_store()
+        if store:
+            data = await store.aget(self.NAMESPACE, session_id)
+        else:
+            data = self._memory.get(session_id)
+            if data and time.time() - data["updated_at"] > SESSION_TTL:
+                data = None
+        return ChatSession(**data) if data else None
+
+    async def save(self, session: ChatSession):
+        session.updated_at = time.time()
+        data = session.model_dump()
+        store = get_store()
+        if store:
+            await store.aset(self.NAMESPACE, session.id, data, ttl=SESSION_TTL)
+        else:
+            self._memory[session.id] = data
+            self._prune_memory()
+
+    def _prune_memory(self):
+        cutoff = time.time() - SESSION_TTL
+        for session_id in [k for k, v in self._memory.items() if v["updated_at"] < cutoff]:
+            del self._memory[session_id]
+
+    def schedule_summary(self, session: ChatSession, provider):
+        """Fold older turns into the summary without delaying the current response"""
+        if session.id in self._summarizing or not session.needs_summary():
+            return
+        self._summarizing.add(session.id)
+        task = asyncio.create_task(self._summarize(session.id, provider))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, session_id: str, provider):
+        try:
+            session = await self.load(session_id)
+            if not session or len(session.turns) <= KEEP_TURNS:
+                return
+            # The older turns are dropped once summarized: never replace them
+            # with an unconfigured provider's placeholder text
+            if not await run_in_threadpool(provider.is_available):
+                CHAT_SUMMARIES.inc(result="unavailable")
+                return
+            folded = session.turns[:-KEEP_TURNS]
+            transcript = "".join(f"{t.role.upper()}: {t.content}\n" for t in folded)
+            prompt = f"{SUMMARY_PROMPT}\nCURRENT SUMMARY:\n{session.summary or 'None'}\n\nNEW TURNS:\n{transcript}"
+            # Counts against the provider limit and holds off prefetching like any other call
+            async with provider_slots(provider), prefetcher.busy():
+                summary = (await provider.complete(prompt=prompt, temperature=0.2, max_tokens=300)).strip()
+            if not summary or summary == provider.mock_completion:
+                CHAT_SUMMARIES.inc(result="empty" if not summary else "fallback")
+                return
+
+            # Turns may have been added while the summary was generated
+            async with self.lock(session_id):
+                latest = await self.load(session_id) or session
+                through = folded[-1].seq
+                latest.summary = summary
+                latest.turns = [t for t in latest.turns if t.seq > through]
+                await self.save(latest)
+            CHAT_SUMMARIES.inc(result="ok")
+            logger.info(f"Summarized {len(folded)} turns of chat session {session_id[:8]}")
+        except Exception as e:
+            CHAT_SUMMARIES.inc(result="error")
+            logger.warning(f"Chat summarization failed: {e}")
+        finally:
+            self._summarizing.discard(session_id)
+
+
+sessions = ChatSessionStore()
@@ -0,0 +1,267 @@
+"""
+Cohort mastery analytics and spaced-review scheduling
+Takes the mastery profiles the extension keeps per student (score 0-5,
+attempts, hint usage and last review date per topic) for a whole cohort and
+computes, with the same rules as the extension's MasteryManager:
+per-topic weakness across the cohort, exam readiness per student, and each
+topic's next review date from its spaced-repetition interval.
+
+Profiles are flattened once into parallel NumPy columns (student, topic,
+score, last review, attempts, hints); due dates are computed for all cells
+at once, per-topic and per-student sums go through np.bincount, and review
+queues come from one lexsort of all cells by student, due date and score.
+Python only reads the profiles and builds the response.
+
+Environment:
+    COHORT_WEAK_SCORE    Score below which a topic counts as weak (default: 3.0)
+"""
+import heapq
+import os
+from datetime import date
+from itertools import repeat
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+WEAK_SCORE = float(os.getenv("COHORT_WEAK_SCORE", "3.0"))
+DEFAULT_SCORE = 2.5
+MAX_SCORE = 5.0
+# Topics without a (valid) review date are due on the analysis day
+NEVER_REVIEWED = -1
+
+# Same thresholds as the extension's exam readiness and review schedule
+READY_PERCENT = 80
+NEEDS_WORK_PERCENT = 60
+
+
+def review_interval(score: float) -> int:
+    """Days between reviews: daily for weak topics, every 3 days for middling ones, weekly otherwise"""
+    if score <= 2:
+        return 1
+    if score <= 3.5:
+        return 3
+    return 7
+
+
+def review_intervals(scores: np.ndarray) -> np.ndarray:
+    """review_interval() of every score"""
+    return np.where(scores <= 2, 1, np.where(scores <= 3.5, 3, 7))
+
+
+def readiness_label(percentage: float) -> str:
+    if percentage >= READY_PERCENT:
+        return "Ready"
+    if percentage >= NEEDS_WORK_PERCENT:
+        return "Needs Work"
+    return "Not Ready"
+
+
+def _column(cells: List[Dict], key: str, default) -> np.ndarray:
+    """One numeric field of every cell (None is NaN); .get() only runs when a cell lacks the key"""
+    try:
+        return np.fromiter(map(itemgetter(key), cells), np.float64, len(cells))
+    except KeyError:
+        return np.array([cell.get(key, default) for cell in cells], dtype=np.float64)
+
+
+def weak_topics(topics: Dict[str, Dict]) -> List[str]:
+    """Topics of one mastery profile scoring below WEAK_SCORE, weakest first"""
+    weak = [(data.get("score", 0), topic) for topic, data in topics.items() if data.get("score", 0) < WEAK_SCORE]
+    return [topic for _, topic in sorted(weak)]
+
+
+class CohortColumns:
+    """A cohort's mastery cells as parallel arrays, grouped by student"""
+
+    def __init__(self, profiles: Iterable[Tuple[str, Dict[str, Dict]]], as_of: date):
+        self.as_of = as_of.toordinal()
+        self.student_ids: List[str] = []
+        self.topics: List[str] = []
+        topic_index: Dict[str, int] = {}
+        offsets = [0]
+        topic: List[int] = []
+        cells: List[Dict] = []
+        for student_id, topics in profiles:
+            self.student_ids.append(student_id)
+            if not topic_index.keys() >= topics.keys():
+                for name in topics.keys() - topic_index.keys():
+                    topic_index[name] = len(self.topics)
+                    self.topics.append(name)
+            topic.extend(map(topic_index.__getitem__, topics))
+            cells.extend(topics.values())
+            offsets.append(len(cells))
+
+        # Cells of student i are offsets[i]:offsets[i + 1]
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.student = np.repeat(np.arange(len(self.student_ids)), np.diff(self.offsets))
+        self.topic = np.array(topic, dtype=np.int64)
+        # Missing (None) numbers become NaN; a NaN score counts as 0, like the extension's clamp
+        score = _column(cells, "score", DEFAULT_SCORE)
+        self.score = np.clip(np.nan_to_num(score, nan=0.0, posinf=MAX_SCORE, neginf=0.0), 0.0, MAX_SCORE)
+        self.attempts = np.nan_to_num(_column(cells, "attempts", 0))
+        self.hints = np.nan_to_num(_column(cells, "hint_usage", 0))
+        try:
+            reviewed = list(map(itemgetter("last_review"), cells))
+        except KeyError:
+            reviewed = [cell.get("last_review") for cell in cells]
+        # A cohort has few distinct review dates: parse each once
+        days = {value: self._day(value) for value in set(reviewed)}
+        self.last_review = np.fromiter(map(days.__getitem__, reviewed), np.int64, len(cells))
+
+    @staticmethod
+    def _day(value: Optional[str]) -> int:
+        """Day ordinal of an ISO date (or datetime); NEVER_REVIEWED if missing or invalid"""
+        try:
+            return date.fromisoformat(str(value)[:10]).toordinal()
+        except ValueError:
+            return NEVER_REVIEWED
+
+
+def _topic_stats(columns: CohortColumns, due: np.ndarray) -> List[Dict]:
+    def per_topic(weights=None) -> List[float]:
+        return np.bincount(columns.topic, weights=weights, minlength=len(columns.topics)).tolist()
+
+    students = per_topic()
+    weak = per_topic(columns.score < WEAK_SCORE)
+    due_now = per_topic(due <= columns.as_of)
+    score_sum = per_topic(columns.score)
+    attempts = per_topic(columns.attempts)
+    hints = per_topic(columns.hints)
+
+    stats = []
+    for i, name in enumerate(columns.topics):
+        stats.append({
+            "topic": name,
+            "students": students[i],
+            "mean_score": round(score_sum[i] / students[i], 2),
+            "weak_share": round(weak[i] / students[i], 3),
+            "hint_rate": round(hints[i] / attempts[i], 3) if attempts[i] else 0.0,
+            "due_share": round(due_now[i] / students[i], 3),
+        })
+    # Weakest first: most students below the threshold, then lowest mean score
+    stats.sort(key=lambda s: (-s["weak_share"], s["mean_score"], s["topic"]))
+    return stats
+
+
+def _readiness(columns: CohortColumns, exam_topics: List[str]) -> List[Dict]:
+    wanted = [columns.topics.index(t) for t in set(exam_topics) if t in columns.topics]
+    exam_cell = np.isin(columns.topic, wanted)
+    student_count = len(columns.student_ids)
+    seen = np.bincount(columns.student, weights=exam_cell, minlength=student_count)
+    total = np.bincount(columns.student, weights=np.where(exam_cell, columns.score, 0.0), minlength=student_count)
+    # As in the extension: topics the student has not met do not count
+    percentages = np.divide(total, seen, out=np.zeros(student_count), where=seen > 0) / MAX_SCORE * 100
+    return [
+        {
+            "student_id": student_id,
+            "percentage": round(percentage),
+            "readiness": readiness_label(percentage),
+            "topics_seen": int(topics_seen),
+        }
+        for student_id, percentage, topics_seen in zip(columns.student_ids, percentages.tolist(), seen.tolist())
+    ]
+
+
+def _queue_order(columns: CohortColumns, due: np.ndarray) -> np.ndarray:
+    """Cell indices by student, then due date, score and topic"""
+    if not len(due):
+        return np.zeros(0, dtype=np.int64)
+    # One int64 key sorts several times faster than np.lexsort over the four columns
+    _, score_rank = np.unique(columns.score, return_inverse=True)
+    day = due - due.min()
+    days, scores, topics = int(day.max()) + 1, int(score_rank.max()) + 1, len(columns.topics)
+    if len(columns.student_ids) * days * scores * topics >= 1 << 63:
+        return np.lexsort((columns.topic, columns.score, due, columns.student))
+    key = ((columns.student * days + day) * scores + score_rank.reshape(-1)) * topics + columns.topic
+    return np.argsort(key, kind="stable")
+
+
+def _review_queues(columns: CohortColumns, due: np.ndarray, limit: int) -> Dict[str, List[Dict]]:
+    order = _queue_order(columns, due)
+    # Cells stay grouped by student, so a cell's rank in its queue is its offset in the group
+    rank = np.arange(len(order)) - columns.offsets[columns.student[order]]
+    chosen = order[rank < limit]
+    due_days = due[chosen]
+    iso_days = {day: date.fromordinal(day).isoformat() for day in np.unique(due_days).tolist()}
+    entries = [
+        {"topic": topic, "due": due_day, "overdue_days": overdue_days, "score": score, "interval_days": interval}
+        for topic, due_day, overdue_days, score, interval in zip(
+            map(columns.topics.__getitem__, columns.topic[chosen].tolist()),
+            map(iso_days.__getitem__, due_days.tolist()),
+            np.maximum(columns.as_of - due_days, 0).tolist(),
+            map(round, columns.score[chosen].tolist(), repeat(2)),
+            review_intervals(columns.score[chosen]).tolist(),
+        )
+    ]
+    ends = np.cumsum(np.minimum(np.diff(columns.offsets), limit)).tolist()
+    return {
+        student_id: entries[start:end]
+        for student_id, start, end in zip(columns.student_ids, [0] + ends, ends)
+    }
+
+
+def analyze_cohort(
+    profiles: Iterable[Tuple[str, Dict[str, Dict]]],
+    exam_topics: Optional[List[str]] = None,
+    as_of: Optional[date] = None,
+    queue_limit: int = 5,
+    top: int = 20,
+) -> Dict:
+    """
+    Mastery, readiness and review schedule for a cohort
+
+    Args:
+        profiles: (student id, {topic: {"score", "attempts", "hint_usage", "last_review"}})
+        exam_topics: Topics of an upcoming exam; readiness is skipped without them
+        as_of: Day the schedule is computed for (default: today)
+        queue_limit: Topics listed in each student's review queue
+        top: Students listed in each cohort ranking
+
+    Returns:
+        {"students", "topics": [per-topic stats, weakest first],
+         "readiness": {"counts", "at_risk"}, "most_overdue": [...],
+         "review_queues": {student_id: [...]}}
+    """
+    as_of = as_of or date.today()
+    columns = CohortColumns(profiles, as_of)
+    due = np.where(
+        columns.last_review != NEVER_REVIEWED,
+        columns.last_review + review_intervals(columns.score),
+        columns.as_of
+    )
+
+    result = {
+        "as_of": as_of.isoformat(),
+        "students": len(columns.student_ids),
+        "topics": _topic_stats(columns, due) if columns.topics else [],
+    }
+
+    if exam_topics:
+        readiness = _readiness(columns, exam_topics)
+        counts = {"Ready": 0, "Needs Work": 0, "Not Ready": 0}
+        for entry in readiness:
+            counts[entry["readiness"]] += 1
+        result["readiness"] = {
+            "exam_topics": exam_topics,
+            "counts": counts,
+            "at_risk": heapq.nsmallest(top, readiness, key=lambda e: (e["percentage"], e["student_id"])),
+        }
+
+    student_count = len(columns.student_ids)
+    overdue_cell = due <= columns.as_of
+    due_topics = np.bincount(columns.student, weights=overdue_cell, minlength=student_count).astype(np.int64)
+    overdue_days = np.bincount(
+        columns.student, weights=np.where(overdue_cell, columns.as_of - due, 0), minlength=student_count
+    ).astype(np.int64)
+    overdue = [
+        (count, total, columns.student_ids[i])
+        for i, count, total in zip(np.flatnonzero(due_topics).tolist(),
+                                   due_topics[due_topics > 0].tolist(), overdue_days[due_topics > 0].tolist())
+    ]
+    result["most_overdue"] = [
+        {"student_id": student_id, "due_topics": count, "overdue_days": total}
+        for count, total, student_id in heapq.nlargest(top, overdue)
+    ]
+    result["review_queues"] = _review_queues(columns, due, queue_limit)
+    return result
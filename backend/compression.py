@@ -0,0 +1,188 @@
+"""
+gzip for request and response bodies
+Pure ASGI middleware. Requests sent with Content-Encoding: gzip (the
+extension compresses large lab submissions) are decompressed before the app
+reads them, up to MAX_REQUEST_MB. Responses of at least GZIP_MIN_BYTES are
+compressed for clients that accept gzip.
+
+Only complete bodies are compressed: NDJSON and event streams (batch
+progress) pass through untouched, since a gzip stream holds small writes
+back until its buffer fills. Bodies larger than THREADPOOL_BYTES are compressed
+and decompressed in the threadpool so the event loop is not blocked.
+Compressing a response with a strong ETag makes it weak (as nginx does); the
+If-None-Match check uses weak comparison, so revalidation still matches.
+
+Environment:
+    GZIP_MIN_BYTES      Smallest response body that is compressed (default: 1024)
+    GZIP_LEVEL          Compression level 1-9 (default: 6)
+    MAX_REQUEST_MB      Largest decompressed request body accepted (default: 64)
+"""
+import gzip
+import os
+import zlib
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+
+import metrics
+
+MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
+LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+MAX_REQUEST_BYTES = int(float(os.getenv("MAX_REQUEST_MB", "64")) * 1024 * 1024)
+THREADPOOL_BYTES = 256 * 1024
+MAX_BUFFER_BYTES = 32 * 1024 * 1024
+
+UNCOMPRESSED_TYPES = ("application/x-ndjson", "text/event-stream")
+
+BODY_BYTES = metrics.Counter(
+    "contextweave_http_body_bytes_total",
+    "Gzipped request and response body bytes, before (raw) and after (wire) compression",
+    ["direction", "stage"]
+)
+
+
+class RequestTooLarge(ValueError):
+    pass
+
+
+def gunzip(data: bytes, limit: Optional[int] = None) -> bytes:
+    """Decompress a gzip body, refusing output larger than limit (default: MAX_REQUEST_MB; zip bombs)"""
+    limit = MAX_REQUEST_BYTES if limit is None else limit
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    body = decompressor.decompress(data, limit + 1)
+    if len(body) > limit:
+        raise RequestTooLarge(f"Decompressed body exceeds {limit} bytes")
+    if not decompressor.eof:
+        raise zlib.error("Truncated gzip body")
+    return body
+
+
+def gzip_body(body: bytes) -> bytes:
+    # mtime=0: the same body always compresses to the same bytes
+    return gzip.compress(body, compresslevel=LEVEL, mtime=0)
+
+
+async def _offload(function, data: bytes) -> bytes:
+    if len(data) > THREADPOOL_BYTES:
+        return await run_in_threadpool(function, data)
+    return function(data)
+
+
+class CompressionMiddleware:
+    """ASGI middleware: gunzip request bodies, gzip complete response bodies"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = Headers(scope=scope)
+        if "gzip" in headers.get("content-encoding", "").lower():
+            decoded = await self._decompress_request(scope, receive, send)
+            if decoded is None:
+                return
+            scope, receive = decoded
+        if "gzip" in headers.get("accept-encoding", "").lower():
+            send = _GzipSender(send)
+        await self.app(scope, receive, send)
+
+    async def _decompress_request(self, scope, receive, send):
+        """(scope, receive) for the decompressed body, or None after sending an error response"""
+        compressed = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return None  # Client went away
+            compressed += message.get("body", b"")
+            if len(compressed) > MAX_REQUEST_BYTES:
+                await JSONResponse({"detail": "Request body too large"}, status_code=413)(scope, receive, send)
+                return None
+            if not message.get("more_body", False):
+                break
+        try:
+            body = await _offload(gunzip, bytes(compressed))
+        except RequestTooLarge as e:
+            await JSONResponse({"detail": str(e)}, status_code=413)(scope, receive, send)
+            return None
+        except zlib.error as e:
+            await JSONResponse({"detail": f"Invalid gzip request body: {e}"}, status_code=400)(scope, receive, send)
+            return None
+        BODY_BYTES.inc(len(body), direction="request", stage="raw")
+        BODY_BYTES.inc(len(compressed), direction="request", stage="wire")
+
+        raw_headers = [
+            (name, value) for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ]
+        raw_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        delivered = False
+
+        async def decompressed_receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return dict(scope, headers=raw_headers), decompressed_receive
+
+
+class _GzipSender:
+    """
+    Wraps send: holds the response until its body is complete, then decides whether to compress
+
+    Bodies usually arrive in more than one message (BaseHTTPMiddleware re-streams
+    them), so they are buffered up to MAX_BUFFER_BYTES; larger or streamed
+    responses are passed through as they are.
+    """
+
+    def __init__(self, send):
+        self.send = send
+        self.start = None
+        self.chunks = []
+        self.buffered = 0
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            if "content-encoding" in headers or headers.get("content-type", "").startswith(UNCOMPRESSED_TYPES):
+                return await self.send(message)
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.start is None:
+            return await self.send(message)
+
+        body = message.get("body", b"")
+        self.chunks.append(body)
+        self.buffered += len(body)
+        if message.get("more_body", False):
+            if self.buffered > MAX_BUFFER_BYTES:
+                await self._flush(b"".join(self.chunks), more_body=True)
+            return
+        await self._finish(b"".join(self.chunks))
+
+    async def _flush(self, body: bytes, more_body: bool = False):
+        start, self.start, self.chunks = self.start, None, []
+        await self.send(start)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    async def _finish(self, body: bytes):
+        if len(body) < MIN_BYTES:
+            return await self._flush(body)
+        compressed = await _offload(gzip_body, body)
+        if len(compressed) >= len(body):
+            return await self._flush(body)
+        BODY_BYTES.inc(len(body), direction="response", stage="raw")
+        BODY_BYTES.inc(len(compressed), direction="response", stage="wire")
+        headers = MutableHeaders(raw=self.start["headers"])
+        headers["Content-Encoding"] = "gzip"
+        headers["Content-Length"] = str(len(compressed))
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = "W/" + etag
+        await self._flush(compressed)
@@ -0,0 +1,424 @@
+"""
+Repo-wide concept index
+A background job walks a repository, splits each source file into functions
+(methods included) and tags every function with the local concept detector
+(concept_rules.py). Tags are cached by a hash of the function's source and
+the rules version, so a function is only tagged again after it is edited or
+the rules change, and identical functions in other files or repos reuse the
+same result.
+
+For each file the index keeps its functions and their tags; for each concept
+it keeps a posting per file listing the functions that use it. "Which
+concepts does this file (or lab folder) exercise" and "where else does
+recursion appear" are then prefix reads instead of detector or LLM calls.
+Files whose size and mtime have not changed since the last run (under the
+same rules) are not read again.
+
+The index lives in the shared store (store.py) so all workers see it, or in
+process memory when the store is off.
+
+Environment:
+    CONCEPT_INDEX_TTL_S       How long indexed files and cached tags are kept (default: 2592000, 30 days)
+    CONCEPT_INDEX_MAX_FILES   Source files indexed per repo (default: 5000)
+"""
+import ast
+import asyncio
+import logging
+import os
+import re
+import textwrap
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+from concept_rules import RULES_VERSION, detect_concepts_local
+from store import content_hash, get_store
+
+logger = logging.getLogger(__name__)
+
+TTL = float(os.getenv("CONCEPT_INDEX_TTL_S", str(30 * 24 * 3600)))
+MAX_FILES = int(os.getenv("CONCEPT_INDEX_MAX_FILES", "5000"))
+
+NS_TAGS = "concept_tags"
+NS_FILE = "concept_file"
+NS_POSTING = "concept_posting"
+NS_JOB = "concept_index_job"
+
+SOURCE_SUFFIXES = (
+    ".py", ".js", ".jsx", ".ts", ".tsx", ".java", ".c", ".h", ".cpp", ".cc", ".hpp", ".cs", ".go",
+)
+SKIP_DIRS = {
+    "node_modules", "__pycache__", "venv", "env", "build", "dist", "out", "target", "site-packages",
+}
+MAX_FILE_BYTES = 512 * 1024
+PROGRESS_EVERY = 50
+
+_STRIP = re.compile(r"//[^\n]*|/\*.*?\*/|\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`", re.S)
+_HEADER = re.compile(
+    r"\bfunction\s*\*?\s*(\w+)\s*\([^)]*\)\s*\{"
+    r"|\b(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s*)?(?:\([^)]*\)|\w+)\s*=>\s*\{"
+    r"|\b(\w+)\s*\([^;{}()]*\)\s*(?:const\s*)?(?:throws\s+[\w.,\s]+)?\{"
+)
+_NOT_FUNCTIONS = {
+    "if", "for", "while", "switch", "catch", "with", "return", "else", "do", "try", "synchronized",
+    "foreach", "using", "lock", "fixed", "sizeof", "function",
+}
+
+CONCEPT_INDEX_FUNCTIONS = metrics.Counter(
+    "contextweave_concept_index_functions_total",
+    "Functions seen by the concept indexer, by whether their tags were cached or newly detected",
+    ["result"]
+)
+
+
+def repo_key(repo_path: str) -> str:
+    return content_hash(os.path.realpath(repo_path))[:16]
+
+
+def relative_path(repo_path: str, path: Optional[str]) -> str:
+    """Path inside the repo with "/" separators; "" for the repo root"""
+    if not path:
+        return ""
+    if os.path.isabs(path):
+        path = os.path.relpath(os.path.realpath(path), os.path.realpath(repo_path))
+    path = os.path.normpath(path).replace(os.sep, "/")
+    if path == "." or path.startswith("../") or path == "..":
+        return ""
+    return path
+
+
+def _python_units(code: str) -> Optional[List[Dict]]:
+    """Top-level functions and (nested) class methods, or None if the code does not parse"""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+    lines = code.splitlines()
+    units = []
+
+    def visit(body, prefix: str):
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                end = node.end_lineno or node.lineno
+                source = textwrap.dedent("\n".join(lines[start - 1:end]))
+                units.append({"name": prefix + node.name, "line": start, "end_line": end, "source": source})
+            elif isinstance(node, ast.ClassDef):
+                visit(node.body, f"{prefix}{node.name}.")
+
+    visit(tree.body, "")
+    return units
+
+
+def _brace_units(code: str) -> List[Dict]:
+    """Functions of brace languages: a header followed by its matched { ... } block"""
+    # Blank out comments and strings without moving offsets, so braces in them do not count
+    stripped = _STRIP.sub(lambda m: re.sub(r"[^\n]", " ", m.group(0)), code)
+    units = []
+    end = 0
+    for match in _HEADER.finditer(stripped):
+        name = next(group for group in match.groups() if group)
+        if match.start() < end or name in _NOT_FUNCTIONS:
+            continue  # Nested in the previous function, or a control statement
+        depth = 0
+        for i in range(match.end() - 1, len(stripped)):
+            if stripped[i] == "{":
+                depth += 1
+            elif stripped[i] == "}":
+                depth -= 1
+                if depth == 0:
+                    end = i + 1
+                    break
+        else:
+            end = len(stripped)
+        start_line = code.count("\n", 0, match.start()) + 1
+        units.append({
+            "name": name,
+            "line": start_line,
+            "end_line": code.count("\n", 0, end) + 1,
+            "source": code[match.start():end],
+        })
+    return units
+
+
+def split_functions(code: str, file_path: str) -> List[Dict]:
+    """
+    Split a source file into the units the index tags
+
+    Returns:
+        [{"name", "line", "end_line", "source"}]; the whole file as one
+        "<module>" unit when no functions are found
+    """
+    units = _python_units(code) if file_path.endswith((".py", ".pyw")) else None
+    if units is None:
+        units = _brace_units(code)
+    if not units and code.strip():
+        units = [{"name": "<module>", "line": 1, "end_line": code.count("\n") + 1, "source": code}]
+    return units
+
+
+def _unit_hash(unit: Dict, file_path: str) -> str:
+    # Python and the other languages go through different rules
+    language = "python" if file_path.endswith((".py", ".pyw")) else "tokens"
+    return f"{language}:{RULES_VERSION}:{content_hash(unit['source'])[:32]}"
+
+
+def _read_units(path: str, relative: str) -> List[Dict]:
+    with open(path, encoding="utf-8", errors="replace") as handle:
+        code = handle.read()
+    units = split_functions(code, relative)
+    for unit in units:
+        unit["hash"] = _unit_hash(unit, relative)
+    return units
+
+
+def _walk(repo_path: str) -> List[Tuple[str, str]]:
+    """(absolute path, relative path) of the repo's source files"""
+    found = []
+    for root, dirs, files in os.walk(repo_path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d not in SKIP_DIRS)
+        for name in sorted(files):
+            if name.endswith(SOURCE_SUFFIXES):
+                path = os.path.join(root, name)
+                found.append((path, relative_path(repo_path, os.path.relpath(path, repo_path))))
+                if len(found) >= MAX_FILES:
+                    return found
+    return found
+
+
+class ConceptIndex:
+    """Per-repo function and concept index, with background indexing jobs"""
+
+    def __init__(self):
+        # In-process fallback when the shared store is off
+        self._memory: Dict[str, Dict[str, object]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def _get(self, namespace: str, key: str):
+        store = get_store()
+        if store:
+            return await store.aget(namespace, key)
+        return self._memory.get(namespace, {}).get(key)
+
+    async def _set(self, namespace: str, key: str, value, ttl: float = TTL):
+        store = get_store()
+        if store:
+            await store.aset(namespace, key, value, ttl=ttl)
+        else:
+            self._memory.setdefault(namespace, {})[key] = value
+
+    async def _delete(self, namespace: str, key: str):
+        store = get_store()
+        if store:
+            await store.adelete(namespace, key)
+        else:
+            self._memory.get(namespace, {}).pop(key, None)
+
+    async def _items(self, namespace: str, prefix: str) -> List[Tuple[str, object]]:
+        store = get_store()
+        if store:
+            return await store.aitems(namespace, prefix)
+        return sorted((k, v) for k, v in self._memory.get(namespace, {}).items() if k.startswith(prefix))
+
+    async def _tag_units(self, units: List[Dict], file_path: str) -> int:
+        """Fill in each unit's tags from the hash cache, detecting the missing ones; returns how many were detected"""
+        missing = []
+        for unit in units:
+            cached = await self._get(NS_TAGS, unit["hash"])
+            if cached is None:
+                missing.append(unit)
+            else:
+                unit["tags"] = cached
+        if missing:
+            detected = await run_in_threadpool(
+                lambda: [detect_concepts_local(unit["source"], file_path)[0] for unit in missing]
+            )
+            for unit, tags in zip(missing, detected):
+                unit["tags"] = tags
+                # Keyed by content, so shared by every file and repo with the same function
+                await self._set(NS_TAGS, unit["hash"], tags)
+        CONCEPT_INDEX_FUNCTIONS.inc(len(units) - len(missing), result="cached")
+        CONCEPT_INDEX_FUNCTIONS.inc(len(missing), result="tagged")
+        return len(missing)
+
+    async def _write_postings(self, key: str, relative: str, old: Optional[Dict], functions: List[Dict]):
+        by_tag: Dict[str, List[Dict]] = {}
+        for function in functions:
+            for tag in function["tags"]:
+                by_tag.setdefault(tag, []).append({"name": function["name"], "line": function["line"]})
+        for tag in set((old or {}).get("concepts", [])) - set(by_tag):
+            await self._delete(NS_POSTING, f"{key}:{tag}:{relative}")
+        for tag, entries in by_tag.items():
+            await self._set(NS_POSTING, f"{key}:{tag}:{relative}", entries)
+
+    async def _remove_file(self, key: str, relative: str, entry: Dict):
+        for tag in entry.get("concepts", []):
+            await self._delete(NS_POSTING, f"{key}:{tag}:{relative}")
+        await self._delete(NS_FILE, f"{key}:{relative}")
+
+    async def index_file(self, repo_path: str, path: str, relative: str, force: bool = False) -> Optional[int]:
+        """
+        Index one file if it changed since it was last indexed
+
+        Returns:
+            Number of functions whose tags had to be detected, or None if the
+            file was unchanged (or is gone, in which case it is dropped)
+        """
+        key = repo_key(repo_path)
+        old = await self._get(NS_FILE, f"{key}:{relative}")
+        try:
+            stat = os.stat(path)
+        except OSError:
+            if old:
+                await self._remove_file(key, relative, old)
+            return None
+        if (old and not force and old.get("rules") == RULES_VERSION
+                and old["mtime_ns"] == stat.st_mtime_ns and old["size"] == stat.st_size):
+            return None
+        if stat.st_size > MAX_FILE_BYTES:
+            return None
+
+        units = await run_in_threadpool(_read_units, path, relative)
+        tagged = await self._tag_units(units, relative)
+        functions = [
+            {"name": u["name"], "line": u["line"], "end_line": u["end_line"], "hash": u["hash"], "tags": u["tags"]}
+            for u in units
+        ]
+        concepts = Counter(tag for function in functions for tag in function["tags"])
+        await self._write_postings(key, relative, old, functions)
+        await self._set(NS_FILE, f"{key}:{relative}", {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "rules": RULES_VERSION,
+            "functions": functions,
+            "concepts": [tag for tag, _ in concepts.most_common()],
+            "indexed_at": time.time(),
+        })
+        return tagged
+
+    async def index_paths(self, repo_path: str, paths: List[str]) -> Dict:
+        """Re-index specific files right away (e.g. on save)"""
+        indexed = tagged = 0
+        for path in paths:
+            relative = relative_path(repo_path, path)
+            if not relative:
+                continue
+            result = await self.index_file(repo_path, os.path.join(repo_path, relative), relative)
+            if result is not None:
+                indexed += 1
+                tagged += result
+        return {"files_indexed": indexed, "functions_tagged": tagged}
+
+    async def _run(self, repo_path: str):
+        key = repo_key(repo_path)
+        job = {
+            "repo_path": repo_path,
+            "status": "running",
+            "files_seen": 0,
+            "files_indexed": 0,
+            "files_removed": 0,
+            "functions_tagged": 0,
+            "started_at": time.time(),
+            "completed_at": None,
+            "error": None,
+        }
+        await self._set(NS_JOB, key, job)
+        try:
+            files = await run_in_threadpool(_walk, repo_path)
+            seen = set()
+            for path, relative in files:
+                seen.add(relative)
+                result = await self.index_file(repo_path, path, relative)
+                job["files_seen"] += 1
+                if result is not None:
+                    job["files_indexed"] += 1
+                    job["functions_tagged"] += result
+                if job["files_seen"] % PROGRESS_EVERY == 0:
+                    await self._set(NS_JOB, key, job)
+            for entry_key, entry in await self._items(NS_FILE, f"{key}:"):
+                relative = entry_key[len(key) + 1:]
+                if relative not in seen:
+                    await self._remove_file(key, relative, entry)
+                    job["files_removed"] += 1
+            job["status"] = "done"
+        except asyncio.CancelledError:
+            job["status"] = "cancelled"
+            raise
+        except Exception as e:
+            logger.exception(f"Concept indexing failed for {repo_path}")
+            job.update(status="error", error=str(e))
+        finally:
+            job["completed_at"] = time.time()
+            await self._set(NS_JOB, key, job)
+            self._tasks.pop(key, None)
+        logger.info(
+            f"Concept index for {repo_path}: {job['files_indexed']} of {job['files_seen']} files re-indexed, "
+            f"{job['functions_tagged']} functions tagged"
+        )
+
+    def start(self, repo_path: str) -> bool:
+        """Start indexing a repo in the background; False if this process is already indexing it"""
+        key = repo_key(repo_path)
+        if key in self._tasks:
+            return False
+        self._tasks[key] = asyncio.create_task(self._run(repo_path))
+        return True
+
+    def stop(self):
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+    async def status(self, repo_path: str) -> Optional[Dict]:
+        return await self._get(NS_JOB, repo_key(repo_path))
+
+    async def concepts_for(self, repo_path: str, path: Optional[str] = None) -> Dict:
+        """
+        Concepts exercised by a file, or by every indexed file under a folder
+
+        Args:
+            repo_path: Repository root
+            path: File or folder (absolute, or relative to the repo); the whole repo if empty
+
+        Returns:
+            {"path", "files", "concepts": {tag: functions using it}, "functions": [...]}
+            where functions is only listed for a single file
+        """
+        key = repo_key(repo_path)
+        relative = relative_path(repo_path, path)
+        entry = await self._get(NS_FILE, f"{key}:{relative}") if relative else None
+        if entry:
+            entries = [(relative, entry)]
+        else:
+            prefix = f"{key}:{relative}/" if relative else f"{key}:"
+            entries = [(k[len(key) + 1:], v) for k, v in await self._items(NS_FILE, prefix)]
+
+        concepts = Counter(tag for _, e in entries for function in e["functions"] for tag in function["tags"])
+        return {
+            "path": relative,
+            "files": len(entries),
+            "concepts": dict(concepts.most_common()),
+            "functions": [
+                {k: function[k] for k in ("name", "line", "end_line", "tags")} for function in entry["functions"]
+            ] if entry else [],
+        }
+
+    async def where(self, repo_path: str, concept: str) -> List[Dict]:
+        """
+        Every indexed function tagged with a concept
+
+        Returns:
+            [{"file", "functions": [{"name", "line"}]}] ordered by file path
+        """
+        key = repo_key(repo_path)
+        prefix = f"{key}:{concept}:"
+        return [
+            {"file": posting_key[len(prefix):], "functions": functions}
+            for posting_key, functions in await self._items(NS_POSTING, prefix)
+        ]
+
+
+index = ConceptIndex()
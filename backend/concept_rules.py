@@ -0,0 +1,466 @@
+"""
+Local rule-based concept detection
+Finds the concept tags /v1/detect-concepts returns (recursion, binary-search,
+nested-loops, ...) from code structure instead of an LLM call. Python is
+matched with AST pattern rules; other languages with token patterns over
+comment- and string-stripped source. Detection takes well under a
+millisecond for a typical lab file (an LLM call takes seconds).
+
+Every result carries a confidence. Parsed Python is trusted when it shows a
+concept beyond loops, conditionals, functions and arrays; token matches are
+trusted when they found several concepts; anything else (little or nothing
+recognized, Python that does not parse) is low confidence, and the endpoint
+asks the LLM instead.
+"""
+import ast
+import re
+from typing import List, Optional, Set, Tuple
+
+# Tags the rules below can produce, in the order they are reported (most specific first)
+TAG_ORDER = (
+    "binary-search", "dynamic-programming", "memoization", "recursion", "backtracking",
+    "breadth-first-search", "depth-first-search", "graphs", "trees", "linked-lists",
+    "two-pointers", "sorting", "hashing", "stacks", "queues", "nested-loops",
+    "edge-cases", "exception-handling", "object-oriented-programming", "inheritance",
+    "generators", "list-comprehensions", "lambda-functions", "decorators",
+    "async-programming", "file-io", "string-manipulation", "dictionaries", "sets",
+    "arrays", "loops", "conditionals", "functions", "unit-testing", "type-hints",
+)
+_RANK = {tag: i for i, tag in enumerate(TAG_ORDER)}
+
+# Structural tags everybody's code has; on their own they do not say much
+GENERIC_TAGS = {"loops", "conditionals", "functions", "arrays"}
+
+# Algorithmic patterns the token rules only match on fairly specific shapes
+ALGORITHM_TAGS = {
+    "binary-search", "dynamic-programming", "memoization", "recursion", "backtracking",
+    "breadth-first-search", "depth-first-search", "two-pointers", "sorting", "nested-loops",
+    "linked-lists", "trees", "graphs", "stacks", "queues", "hashing",
+}
+
+MAX_TAGS = 8
+
+# Part of the concept index's cache keys: bump when the rules change what they
+# tag, so functions tagged by the old rules are tagged again
+RULES_VERSION = 2
+
+_MIDPOINT_NAMES = re.compile(r"^(mid|middle|m|pivot|half)\w*$", re.I)
+_DP_NAMES = re.compile(r"^(dp|memo|cache|table)\w*$", re.I)
+
+
+def _names(node: ast.AST) -> Set[str]:
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name)}
+
+
+def _is_halving(node: ast.AST) -> bool:
+    return isinstance(node, ast.BinOp) and (
+        (isinstance(node.op, (ast.FloorDiv, ast.Div)) and isinstance(node.right, ast.Constant) and node.right.value == 2)
+        or (isinstance(node.op, ast.RShift) and isinstance(node.right, ast.Constant) and node.right.value == 1)
+    )
+
+
+def _call_name(node: ast.Call) -> str:
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    return ""
+
+
+def _own_nodes(function: ast.AST):
+    """Nodes in a function's body, not descending into nested functions, lambdas or classes"""
+    stack = list(function.body)
+    while stack:
+        node = stack.pop()
+        yield node
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)):
+            stack.extend(ast.iter_child_nodes(node))
+
+
+def _calls_itself(function: ast.AST, nodes: List[ast.AST], method: bool) -> bool:
+    """A function calling its own name, or a method calling self.name / cls.name"""
+    for node in nodes:
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        if method:
+            if (isinstance(func, ast.Attribute) and func.attr == function.name
+                    and isinstance(func.value, ast.Name) and func.value.id in ("self", "cls")):
+                return True
+        elif isinstance(func, ast.Name) and func.id == function.name:
+            return True
+    return False
+
+
+class _PythonFacts(ast.NodeVisitor):
+    """Walks a module once and records which tags its structure shows"""
+
+    def __init__(self):
+        self.tags: Set[str] = set()
+        self.loop_depth = 0
+        self.function_stack: List[str] = []
+        self.class_stack: List[ast.ClassDef] = []
+
+    def visit_FunctionDef(self, node):
+        self.tags.add("functions")
+        if node.name.startswith("test"):
+            self.tags.add("unit-testing")
+        if node.returns is not None or any(a.annotation is not None for a in node.args.args):
+            self.tags.add("type-hints")
+        for decorator in node.decorator_list:
+            name = decorator.id if isinstance(decorator, ast.Name) else getattr(decorator, "attr", "")
+            if isinstance(decorator, ast.Call):
+                name = _call_name(decorator)
+            if name in ("lru_cache", "cache"):
+                self.tags.update(("memoization", "dynamic-programming"))
+            else:
+                self.tags.add("decorators")
+        if isinstance(node, ast.AsyncFunctionDef):
+            self.tags.add("async-programming")
+
+        # Recursion: the function (or method, via self.name) calls itself from its own body
+        nodes = list(_own_nodes(node))
+        method = bool(self.class_stack) and node in self.class_stack[-1].body
+        if _calls_itself(node, nodes, method):
+            self.tags.add("recursion")
+            calls = {_call_name(n) for n in nodes if isinstance(n, ast.Call)}
+            body_loops = any(isinstance(n, (ast.For, ast.While)) for n in nodes)
+            if body_loops and calls & {"pop", "remove"}:
+                self.tags.add("backtracking")
+
+        # Early return on empty/None/short input
+        for stmt in node.body[:4]:
+            if isinstance(stmt, ast.If) and any(isinstance(s, (ast.Return, ast.Raise)) for s in stmt.body):
+                test = stmt.test
+                if (
+                    isinstance(test, ast.UnaryOp) and isinstance(test.op, ast.Not)
+                    or isinstance(test, ast.Compare) and any(
+                        isinstance(c, ast.Constant) and c.value in (None, 0, 1) for c in test.comparators
+                    )
+                ):
+                    self.tags.add("edge-cases")
+
+        self.function_stack.append(node.name)
+        outer, self.loop_depth = self.loop_depth, 0
+        self.generic_visit(node)
+        self.loop_depth = outer
+        self.function_stack.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self.tags.add("object-oriented-programming")
+        bases = [b for b in node.bases if not (isinstance(b, ast.Name) and b.id == "object")]
+        if bases:
+            base_names = {getattr(b, "id", getattr(b, "attr", "")) for b in bases}
+            self.tags.add("unit-testing" if "TestCase" in base_names else "inheritance")
+        self.class_stack.append(node)
+        self.generic_visit(node)
+        self.class_stack.pop()
+
+    def _visit_loop(self, node):
+        self.tags.add("loops")
+        self.loop_depth += 1
+        if self.loop_depth >= 2:
+            self.tags.add("nested-loops")
+        if isinstance(node, ast.While):
+            nodes = list(ast.walk(node))
+            self._check_binary_search(node, nodes)
+            self._check_two_pointers(node, nodes)
+            self._check_traversal(nodes)
+        self.generic_visit(node)
+        self.loop_depth -= 1
+
+    visit_For = visit_AsyncFor = visit_While = _visit_loop
+
+    def _check_binary_search(self, node: ast.While, nodes: List[ast.AST]):
+        """while lo <= hi (or lo < hi) with a midpoint computed by halving inside"""
+        test = node.test
+        if not (isinstance(test, ast.Compare) and isinstance(test.ops[0], (ast.Lt, ast.LtE))):
+            return
+        bounds = _names(test)
+        for stmt in nodes:
+            if isinstance(stmt, ast.Assign) and any(_is_halving(n) for n in ast.walk(stmt.value)):
+                if _names(stmt.value) & bounds or any(
+                    isinstance(t, ast.Name) and _MIDPOINT_NAMES.match(t.id) for t in stmt.targets
+                ):
+                    self.tags.add("binary-search")
+                    return
+
+    def _check_two_pointers(self, node: ast.While, nodes: List[ast.AST]):
+        """while left < right with one index moving up and another moving down"""
+        test = node.test
+        if not (isinstance(test, ast.Compare) and isinstance(test.left, ast.Name) and test.comparators
+                and isinstance(test.comparators[0], ast.Name)):
+            return
+        low, high = test.left.id, test.comparators[0].id
+        moves = {
+            (n.target.id, type(n.op)) for n in nodes
+            if isinstance(n, ast.AugAssign) and isinstance(n.target, ast.Name)
+        }
+        if (low, ast.Add) in moves and (high, ast.Sub) in moves and "binary-search" not in self.tags:
+            self.tags.add("two-pointers")
+
+    def _check_traversal(self, nodes: List[ast.AST]):
+        """while queue/stack: with popleft() (BFS) or pop() and append() (explicit stack)"""
+        calls = {_call_name(n) for n in nodes if isinstance(n, ast.Call)}
+        if "popleft" in calls:
+            self.tags.add("breadth-first-search")
+        elif "pop" in calls and "append" in calls:
+            self.tags.add("stacks")
+
+    def visit_Call(self, node: ast.Call):
+        name = _call_name(node)
+        if name in ("sorted", "sort"):
+            self.tags.add("sorting")
+        elif name == "open":
+            self.tags.add("file-io")
+        elif name in ("deque", "Queue", "PriorityQueue", "heappush", "heappop", "popleft"):
+            self.tags.add("queues")
+        elif name in ("split", "join", "strip", "replace", "lower", "upper", "startswith", "endswith", "format"):
+            self.tags.add("string-manipulation")
+        elif name in ("dict", "defaultdict", "Counter"):
+            self.tags.update(("dictionaries", "hashing"))
+        elif name in ("set", "frozenset"):
+            self.tags.add("sets")
+        elif name == "append":
+            self.tags.add("arrays")
+        elif name in ("bisect", "bisect_left", "bisect_right"):
+            self.tags.add("binary-search")
+        elif name.startswith("assert") and isinstance(node.func, ast.Attribute):
+            self.tags.add("unit-testing")
+        self.generic_visit(node)
+
+    def visit_Attribute(self, node: ast.Attribute):
+        if node.attr == "next":
+            self.tags.add("linked-lists")
+        elif node.attr in ("left", "right", "children"):
+            self.tags.add("trees")
+        elif node.attr in ("neighbors", "adj", "edges"):
+            self.tags.add("graphs")
+        self.generic_visit(node)
+
+    def visit_Subscript(self, node: ast.Subscript):
+        # dp[i] = dp[i - 1] + ... : a table filled from earlier entries
+        if isinstance(node.value, ast.Name) and _DP_NAMES.match(node.value.id):
+            if isinstance(node.ctx, ast.Store):
+                self.tags.add("dynamic-programming")
+                if node.value.id.lower().startswith(("memo", "cache")):
+                    self.tags.add("memoization")
+        self.tags.add("arrays")
+        self.generic_visit(node)
+
+    def visit_If(self, node: ast.If):
+        self.tags.add("conditionals")
+        self.generic_visit(node)
+
+    def visit_Try(self, node):
+        self.tags.add("exception-handling")
+        self.generic_visit(node)
+
+    visit_TryStar = visit_Try
+
+    def visit_Raise(self, node: ast.Raise):
+        self.tags.add("exception-handling")
+        self.generic_visit(node)
+
+    def visit_Assert(self, node: ast.Assert):
+        self.tags.add("unit-testing" if not self.function_stack or self.function_stack[-1].startswith("test") else "edge-cases")
+        self.generic_visit(node)
+
+    def visit_List(self, node: ast.List):
+        self.tags.add("arrays")
+        self.generic_visit(node)
+
+    def visit_Dict(self, node: ast.Dict):
+        self.tags.update(("dictionaries", "hashing"))
+        self.generic_visit(node)
+
+    def visit_Set(self, node: ast.Set):
+        self.tags.add("sets")
+        self.generic_visit(node)
+
+    def visit_ListComp(self, node):
+        self.tags.add("list-comprehensions")
+        self.generic_visit(node)
+
+    visit_SetComp = visit_DictComp = visit_ListComp
+
+    def visit_GeneratorExp(self, node):
+        self.tags.add("generators")
+        self.generic_visit(node)
+
+    def visit_Yield(self, node):
+        self.tags.add("generators")
+        self.generic_visit(node)
+
+    visit_YieldFrom = visit_Yield
+
+    def visit_Lambda(self, node: ast.Lambda):
+        self.tags.add("lambda-functions")
+        self.generic_visit(node)
+
+    def visit_Await(self, node: ast.Await):
+        self.tags.add("async-programming")
+        self.generic_visit(node)
+
+    def visit_JoinedStr(self, node: ast.JoinedStr):
+        self.tags.add("string-manipulation")
+        self.generic_visit(node)
+
+    def visit_Import(self, node):
+        modules = {alias.name.split(".")[0] for alias in node.names}
+        if isinstance(node, ast.ImportFrom) and node.module:
+            modules.add(node.module.split(".")[0])
+        if modules & {"unittest", "pytest"}:
+            self.tags.add("unit-testing")
+        if "asyncio" in modules:
+            self.tags.add("async-programming")
+        if "bisect" in modules:
+            self.tags.add("binary-search")
+        if "heapq" in modules:
+            self.tags.add("queues")
+
+    visit_ImportFrom = visit_Import
+
+
+def _python_tags(code: str) -> Optional[Set[str]]:
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+    facts = _PythonFacts()
+    facts.visit(tree)
+    tags = facts.tags
+    # DFS: recursion (or an explicit stack) over a graph or tree with a visited set
+    if ("recursion" in tags or "stacks" in tags) and ("graphs" in tags or "trees" in tags or "sets" in tags):
+        if "graphs" in tags or re.search(r"\bvisited\b|\bseen\b", code):
+            tags.add("depth-first-search")
+    if "breadth-first-search" in tags or "depth-first-search" in tags:
+        if "trees" not in tags:
+            tags.add("graphs")
+    return tags
+
+
+# Token patterns for C-like languages (JavaScript/TypeScript, Java, C, C++, C#, Go)
+_STRIP = re.compile(r"//[^\n]*|/\*.*?\*/|#[^\n]*|\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|`(?:\\.|[^`\\])*`", re.S)
+_FUNCTION_NAMES = re.compile(
+    r"\bfunction\s+(\w+)|\b(?:def|func|fn)\s+(\w+)|(\w+)\s*=\s*(?:async\s*)?\([^)]*\)\s*=>"
+    r"|\b(?:public|private|protected|static|void|int|long|bool|boolean|double|float|auto|String|string)\s+[\w<>\[\]]*\s*(\w+)\s*\("
+)
+_LOOP = re.compile(r"\b(for|while)\s*\(|\bfor\s+\w+\s*(?::=|in)\b")
+_TOKEN_RULES: Tuple[Tuple[str, "re.Pattern"], ...] = (
+    ("binary-search", re.compile(r"\bwhile\s*\(\s*\w+\s*<=?\s*\w+\s*\)[^}]*?\bmid\w*\s*=|(?:>>>?\s*1|/\s*2)\W[^;]*;[^}]*?\b(lo|low|left)\w*\s*=", re.S)),
+    ("sorting", re.compile(r"\.sort\s*\(|\bsort\s*\(|Arrays\.sort|Collections\.sort|std::sort|\bqsort\b")),
+    ("hashing", re.compile(r"\bHashMap\b|\bHashSet\b|\bnew\s+Map\s*\(|\bunordered_map\b|\bmap\s*\[|\bDictionary<|\bmake\s*\(\s*map")),
+    ("dictionaries", re.compile(r"\bMap<|\bnew\s+Map\s*\(|\bunordered_map\b|\bmap\[|\bDictionary<|\bHashMap\b")),
+    ("sets", re.compile(r"\bSet<|\bnew\s+Set\s*\(|\bunordered_set\b|\bHashSet\b|\bstd::set\b")),
+    ("stacks", re.compile(r"\bStack<|\bstd::stack\b|\.push\s*\([^)]*\)[^}]*\.pop\s*\(", re.S)),
+    ("queues", re.compile(r"\bQueue<|\bDeque<|\bstd::queue\b|\bPriorityQueue\b|\.shift\s*\(|\.poll\s*\(")),
+    ("linked-lists", re.compile(r"(?:\.|->)next\b|\bLinkedList\b|\bListNode\b")),
+    ("trees", re.compile(r"(?:\.|->)(?:left|right)\b|\bTreeNode\b")),
+    ("graphs", re.compile(r"\badj\w*\b|\bneighbou?rs\b|\bgraph\b", re.I)),
+    ("exception-handling", re.compile(r"\btry\s*\{|\bcatch\s*\(|\bthrow\b|\bthrows\b|\bpanic\s*\(")),
+    ("object-oriented-programming", re.compile(r"\bclass\s+\w+|\binterface\s+\w+|\bstruct\s+\w+\s*\{")),
+    ("inheritance", re.compile(r"\bextends\b|\bimplements\b|\bclass\s+\w+\s*:\s*(?:public|private|protected)\b")),
+    ("async-programming", re.compile(r"\basync\b|\bawait\b|\bPromise\b|\.then\s*\(|\bgo\s+\w+\s*\(")),
+    ("lambda-functions", re.compile(r"=>|\[[=&]?\]\s*\(")),
+    ("arrays", re.compile(r"\w\s*\[[^\]]*\]|\bArrayList\b|\bvector<|\bnew\s+\w+\s*\[")),
+    ("string-manipulation", re.compile(r"\.split\s*\(|\.join\s*\(|\.substring\s*\(|\.substr\s*\(|\.charAt\s*\(|\bStringBuilder\b|\.trim\s*\(")),
+    ("file-io", re.compile(r"\bfopen\b|\bifstream\b|\bofstream\b|\bFileReader\b|\bfs\.\w+|\bFiles\.\w+")),
+    ("conditionals", re.compile(r"\bif\s*\(|\bswitch\s*\(|\?[^:;]+:")),
+    ("functions", _FUNCTION_NAMES),
+    ("unit-testing", re.compile(r"@Test\b|\bdescribe\s*\(|\bit\s*\(|\bexpect\s*\(|\bassert\w*\s*\(|\bTEST\s*\(")),
+    ("edge-cases", re.compile(r"\bif\s*\(\s*(?:!\s*\w+|\w+\s*===?\s*null|\w+(?:\.length|\.size\(\))\s*(?:===?|<=?)\s*[01])\s*\)\s*\{?\s*return")),
+)
+
+
+def _function_body(stripped: str, start: int) -> str:
+    """The braces block of the function declared at start, or up to the ";" of a braceless one"""
+    brace = stripped.find("{", start)
+    end = stripped.find(";", start)
+    if brace == -1 or -1 < end < brace:
+        # Prototype, or an arrow function returning an expression
+        return stripped[start:end if end != -1 else len(stripped)]
+    depth = 0
+    for i in range(brace, len(stripped)):
+        if stripped[i] == "{":
+            depth += 1
+        elif stripped[i] == "}":
+            depth -= 1
+            if depth == 0:
+                return stripped[brace + 1:i]
+    return stripped[brace + 1:]
+
+
+def _token_tags(code: str) -> Set[str]:
+    stripped = _STRIP.sub(" ", code)
+    tags = {tag for tag, pattern in _TOKEN_RULES if pattern.search(stripped)}
+
+    loops = list(_LOOP.finditer(stripped))
+    if loops:
+        tags.add("loops")
+        # Nested loops: a loop keyword inside the braces of an earlier loop
+        for loop in loops:
+            depth, opened = 0, False
+            for i in range(loop.end(), len(stripped)):
+                char = stripped[i]
+                if char == "{":
+                    depth, opened = depth + 1, True
+                elif char == "}":
+                    depth -= 1
+                    if opened and depth <= 0:
+                        break
+                elif opened and char in "fw" and _LOOP.match(stripped, i) and (i == 0 or not stripped[i - 1].isalnum()):
+                    tags.add("nested-loops")
+                    break
+            if "nested-loops" in tags:
+                break
+
+    # Recursion: a defined function called inside its own body
+    for match in _FUNCTION_NAMES.finditer(stripped):
+        name = next(g for g in match.groups() if g)
+        if name in ("if", "for", "while", "switch", "return", "catch"):
+            continue
+        if re.search(rf"\b{re.escape(name)}\s*\(", _function_body(stripped, match.end())):
+            tags.add("recursion")
+            break
+    return tags
+
+
+def _confidence(tags: Set[str], parsed_python: bool) -> float:
+    specific = tags - GENERIC_TAGS
+    if parsed_python:
+        # The AST rules see every construct; only generic tags (or none) means trivial code
+        return 0.9 if specific else 0.5
+    if len(specific) >= 2 or specific & ALGORITHM_TAGS:
+        return 0.8
+    if specific:
+        return 0.6
+    return 0.3
+
+
+def detect_concepts_local(code: str, file_path: Optional[str] = None) -> Tuple[List[str], float]:
+    """
+    Concept tags from code structure, without an LLM
+
+    Args:
+        code: Source snippet or file
+        file_path: Used to pick Python rules (.py) or token rules (anything else)
+
+    Returns:
+        (tags ordered most specific first, at most MAX_TAGS; confidence 0-1)
+    """
+    python_file = file_path is None or file_path.endswith((".py", ".pyw"))
+    tags = _python_tags(code) if python_file else None
+    parsed_python = tags is not None
+    if tags is None:
+        tags = _token_tags(code)
+
+    ordered = sorted(tags, key=lambda tag: _RANK.get(tag, len(_RANK)))
+    # Keep generic tags only if there is room after the specific ones
+    specific = [t for t in ordered if t not in GENERIC_TAGS]
+    generic = [t for t in ordered if t in GENERIC_TAGS]
+    result = (specific + generic)[:MAX_TAGS]
+    return result, _confidence(tags, parsed_python)
+
@@ -0,0 +1,38 @@
+"""
+Conditional requests for cached analysis endpoints
+An endpoint whose result is determined by a cache key (store.cache_key over
+file content, HEAD, provider, model, prompt version and request options)
+sends that key as a strong ETag. A client that sends it back in
+If-None-Match gets 304 Not Modified as soon as the key is known, before any
+Git, tokenization or LLM work.
+
+These endpoints are POSTs only because their inputs do not fit a query
+string; they are safe lookups, so a matching If-None-Match is answered with
+304 as it would be for GET rather than with 412.
+"""
+from fastapi import Request, Response
+
+import metrics
+
+NOT_MODIFIED = metrics.Counter(
+    "contextweave_not_modified_total",
+    "Requests answered with 304 Not Modified from If-None-Match, by endpoint",
+    ["endpoint"]
+)
+
+
+def etag_for(key: str) -> str:
+    return f'"{key[:32]}"'
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match lists this ETag (weak comparison, as RFC 9110 specifies)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+
+def not_modified_response(etag: str, endpoint: str) -> Response:
+    NOT_MODIFIED.inc(endpoint=endpoint)
+    return Response(status_code=304, headers={"ETag": etag})
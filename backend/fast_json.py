@@ -0,0 +1,40 @@
+"""
+Fast JSON encoding for responses and large request bodies
+Uses orjson when it is installed (it is in requirements.txt) and falls back
+to the standard library otherwise, with the same compact UTF-8 output as
+Starlette's JSONResponse.
+
+FastJSONResponse is the app's default response class, so every endpoint
+renders through it. Endpoints that build large plain dicts or lists return a
+FastJSONResponse themselves, which also skips FastAPI's jsonable_encoder walk
+over the result (their content is JSON-native already).
+"""
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes | str) -> Any:
+    """Parse JSON; raises ValueError (json.JSONDecodeError or orjson.JSONDecodeError) on bad input"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when available"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
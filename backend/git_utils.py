@@ -5,9 +5,15 @@ Handles commit history, diff analysis, and related file detection
 import os
 import re
 import logging
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, TYPE_CHECKING
 from collections import Counter
-from git import Repo, InvalidGitRepositoryError, GitCommandError
+
+from store import cache_key, get_store
+
+# GitPython is imported inside the functions that need it: it costs ~100ms at
+# startup and is not needed for file-only analysis
+if TYPE_CHECKING:
+    from git import Repo
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +33,8 @@ def get_commit_history(repo_path: str, file_path: str, limit: int = 50) -> List[
     Raises:
         ValueError: If repo_path is not a valid Git repository
     """
+    from git import Repo, InvalidGitRepositoryError
+    
     try:
         repo = Repo(repo_path)
         logger.info(f"Opened Git repository at {repo_path}")
@@ -34,6 +42,15 @@ def get_commit_history(repo_path: str, file_path: str, limit: int = 50) -> List[
         logger.warning(f"Not a valid Git repository: {repo_path}. Skipping commit history.")
         return []
     
+    # Close the repo afterwards so persistent git cat-file processes are not leaked
+    with repo:
+        return _collect_commit_history(repo, repo_path, file_path, limit)
+
+
+def _collect_commit_history(repo: "Repo", repo_path: str, file_path: str, limit: int) -> List[Dict]:
+    """Extract commit metadata for a file from an open repository"""
+    from git import GitCommandError
+    
     # Get relative path from repo root
     relative_path = os.path.relpath(file_path, repo_path)
     logger.info(f"Querying commits for {relative_path} (limit: {limit})")
@@ -170,24 +187,45 @@ def find_co_changed_files(repo_path: str, relative_path: str, limit: int = 100)
         List of dicts with 'path' and 'frequency' keys, sorted by frequency
     """
     try:
+        from git import Repo
         repo = Repo(repo_path)
-        commits = list(repo.iter_commits(paths=relative_path, max_count=limit))
     except Exception as e:
         logger.warning(f"Error finding co-changed files: {e}")
         return []
     
     co_changed = Counter()
     
-    for commit in commits:
+    with repo:
+        # Co-change results only depend on history up to HEAD: reuse them from
+        # the shared store (across workers) until HEAD moves
+        store = get_store()
+        index_key = None
+        try:
+            head = repo.head.commit.hexsha
+            index_key = cache_key(os.path.realpath(repo_path), head, relative_path, limit)
+        except Exception:
+            pass
+        if store and index_key:
+            cached = store.get("co_change", index_key)
+            if cached is not None:
+                return cached
+        
         try:
-            # Get all files changed in this commit
-            changed_files = [item.a_path for item in commit.stats.files.keys()]
-            
-            for file in changed_files:
-                if file != relative_path:
-                    co_changed[file] += 1
+            commits = list(repo.iter_commits(paths=relative_path, max_count=limit))
         except Exception as e:
-            logger.debug(f"Error processing commit {commit.hexsha[:7]}: {e}")
+            logger.warning(f"Error finding co-changed files: {e}")
+            return []
+        
+        for commit in commits:
+            try:
+                # Get all files changed in this commit
+                changed_files = list(commit.stats.files.keys())
+                
+                for file in changed_files:
+                    if file != relative_path:
+                        co_changed[file] += 1
+            except Exception as e:
+                logger.debug(f"Error processing commit {commit.hexsha[:7]}: {e}")
     
     # Return top files sorted by frequency
     result = [
@@ -195,9 +233,64 @@ def find_co_changed_files(repo_path: str, relative_path: str, limit: int = 100)
         for path, count in co_changed.most_common(10)
     ]
     
+    if store and index_key:
+        store.set("co_change", index_key, result)
+    
     return result
 
 
+_SHA = re.compile(r"[0-9a-f]{40}|[0-9a-f]{64}")
+
+
+def _read_head_sha(repo_path: str) -> Optional[str]:
+    """HEAD read straight from .git (no GitPython); None if it cannot be resolved this way"""
+    git_dir = os.path.join(repo_path, ".git")
+    try:
+        with open(os.path.join(git_dir, "HEAD"), encoding="utf-8") as f:
+            head = f.read().strip()
+        if not head.startswith("ref: "):
+            return head if _SHA.fullmatch(head) else None
+        ref = head[len("ref: "):]
+        ref_path = os.path.join(git_dir, *ref.split("/"))
+        if os.path.isfile(ref_path):
+            with open(ref_path, encoding="utf-8") as f:
+                sha = f.read().strip()
+            return sha if _SHA.fullmatch(sha) else None
+        with open(os.path.join(git_dir, "packed-refs"), encoding="utf-8") as f:
+            for line in f:
+                sha, _, name = line.strip().partition(" ")
+                if name == ref and _SHA.fullmatch(sha):
+                    return sha
+    except OSError:
+        pass
+    return None
+
+
+def get_head_sha(repo_path: str) -> Optional[str]:
+    """
+    Get the commit SHA at HEAD, or None if repo_path is not a Git repository
+    
+    Reads .git/HEAD and its ref directly when it can (this runs on every
+    analysis request, including 304 revalidations); worktrees, submodules and
+    other layouts go through GitPython.
+    
+    Args:
+        repo_path: Absolute path to Git repository
+        
+    Returns:
+        Full hex SHA of HEAD, or None
+    """
+    sha = _read_head_sha(repo_path)
+    if sha:
+        return sha
+    try:
+        from git import Repo
+        with Repo(repo_path) as repo:
+            return repo.head.commit.hexsha
+    except Exception:
+        return None
+
+
 def read_file_content(file_path: str, max_lines: int = 10000) -> str:
     """
     Read file content from disk, with truncation for very large files
@@ -0,0 +1,271 @@
+"""
+Structural integrity signals from the AST
+Extracts a fixed feature vector per submission (function and class counts,
+nesting depth, identifier entropy, comment and docstring ratios, use of
+advanced constructs, ...) and scores a whole section at once: every feature
+is turned into a z-score against the lab's baseline, and submissions whose
+structure is far from their classmates' are flagged for a conversation, not
+a verdict.
+
+Baselines are kept per lab as running count/mean/M2 per feature (Welford),
+merged with each scored batch, in the shared store when it is enabled and in
+process memory otherwise. A section is scored as one submissions x FEATURES
+NumPy matrix: its column stats, the z-scores of every cell (one broadcast
+against the baseline's mean and standard deviation), the flags and the
+anomaly scores are array operations.
+
+Environment:
+    INTEGRITY_Z_THRESHOLD     |z| at or above which a feature is reported (default: 2.5)
+    INTEGRITY_MIN_BASELINE    Submissions needed before z-scores are computed (default: 5)
+"""
+import ast
+import io
+import logging
+import math
+import os
+import re
+import tokenize
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from store import get_store, register_durable
+
+logger = logging.getLogger(__name__)
+
+Z_THRESHOLD = float(os.getenv("INTEGRITY_Z_THRESHOLD", "2.5"))
+MIN_BASELINE = int(os.getenv("INTEGRITY_MIN_BASELINE", "5"))
+
+NS_BASELINE = "integrity_baseline"
+register_durable(NS_BASELINE)
+BASELINE_TTL = 365 * 24 * 3600
+
+FEATURES = (
+    "lines",
+    "functions",
+    "classes",
+    "max_nesting",
+    "mean_function_lines",
+    "identifier_entropy",
+    "mean_identifier_length",
+    "comment_ratio",
+    "docstring_ratio",
+    "imports",
+    "advanced_constructs",
+    "annotation_ratio",
+)
+
+_NESTING_NODES = (ast.For, ast.AsyncFor, ast.While, ast.If, ast.With, ast.AsyncWith, ast.Try, ast.FunctionDef,
+                  ast.AsyncFunctionDef, ast.ClassDef)
+_ADVANCED_NODES = (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp, ast.Yield,
+                   ast.YieldFrom, ast.Await, ast.NamedExpr, ast.Starred)
+_FUNCTION_DEF = re.compile(r"\b(def|function)\s+\w+|\w+\s*\([^)]*\)\s*\{")
+_CLASS_DEF = re.compile(r"\bclass\s+\w+")
+
+
+def _max_nesting(node: ast.AST, depth: int = 0) -> int:
+    deepest = depth
+    for child in ast.iter_child_nodes(node):
+        child_depth = depth + 1 if isinstance(child, _NESTING_NODES) else depth
+        deepest = max(deepest, _max_nesting(child, child_depth))
+    return deepest
+
+
+def _entropy(counts: Counter) -> float:
+    total = sum(counts.values())
+    if not total:
+        return 0.0
+    return -sum(c / total * math.log2(c / total) for c in counts.values())
+
+
+def _comment_lines(code: str) -> int:
+    try:
+        return len({
+            token.start[0] for token in tokenize.generate_tokens(io.StringIO(code).readline)
+            if token.type == tokenize.COMMENT
+        })
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return sum(1 for line in code.splitlines() if line.strip().startswith(("#", "//")))
+
+
+def extract_features(code: str) -> Dict[str, float]:
+    """
+    Structural features of one submission
+
+    Python code is measured from its AST; code that does not parse (or is
+    another language) falls back to line-based approximations.
+
+    Returns:
+        {feature: value} for every name in FEATURES, plus "parsed" (1.0 or 0.0)
+    """
+    lines = [line for line in code.splitlines() if line.strip()]
+    features = dict.fromkeys(FEATURES, 0.0)
+    features["lines"] = float(len(lines))
+    features["comment_ratio"] = _comment_lines(code) / len(lines) if lines else 0.0
+
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        features["functions"] = float(len(_FUNCTION_DEF.findall(code)))
+        features["classes"] = float(len(_CLASS_DEF.findall(code)))
+        features["parsed"] = 0.0
+        return features
+
+    functions = [n for n in ast.walk(tree) if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    classes = [n for n in ast.walk(tree) if isinstance(n, ast.ClassDef)]
+    identifiers = Counter(
+        n.id if isinstance(n, ast.Name) else n.arg
+        for n in ast.walk(tree) if isinstance(n, (ast.Name, ast.arg))
+    )
+    identifiers.update(f.name for f in functions)
+    documentable = [tree] + functions + classes
+    arguments = [a for f in functions for a in f.args.args + f.args.kwonlyargs if a.arg not in ("self", "cls")]
+    annotated = sum(a.annotation is not None for a in arguments) + sum(f.returns is not None for f in functions)
+
+    features.update({
+        "functions": float(len(functions)),
+        "classes": float(len(classes)),
+        "max_nesting": float(_max_nesting(tree)),
+        "mean_function_lines": (
+            sum((f.end_lineno or f.lineno) - f.lineno + 1 for f in functions) / len(functions) if functions else 0.0
+        ),
+        "identifier_entropy": _entropy(identifiers),
+        "mean_identifier_length": (
+            sum(len(name) * count for name, count in identifiers.items()) / sum(identifiers.values())
+            if identifiers else 0.0
+        ),
+        "docstring_ratio": sum(ast.get_docstring(n) is not None for n in documentable) / len(documentable),
+        "imports": float(sum(isinstance(n, (ast.Import, ast.ImportFrom)) for n in ast.walk(tree))),
+        "advanced_constructs": float(sum(isinstance(n, _ADVANCED_NODES) for n in ast.walk(tree))),
+        "annotation_ratio": annotated / (len(arguments) + len(functions)) if functions else 0.0,
+        "parsed": 1.0,
+    })
+    return features
+
+
+def _column_stats(matrix: np.ndarray) -> Dict[str, Dict[str, float]]:
+    """count/mean/M2 of every feature column of a submissions x FEATURES matrix"""
+    count = matrix.shape[0]
+    if not count:
+        return _empty_baseline()
+    mean = matrix.mean(axis=0)
+    m2 = ((matrix - mean) ** 2).sum(axis=0)
+    return {
+        feature: {"count": count, "mean": float(mean[j]), "m2": float(m2[j])}
+        for j, feature in enumerate(FEATURES)
+    }
+
+
+def _merge(a: Dict[str, float], b: Dict[str, float]) -> Dict[str, float]:
+    """Combine two count/mean/M2 summaries (Chan et al. parallel variance)"""
+    count = a["count"] + b["count"]
+    if not count:
+        return {"count": 0, "mean": 0.0, "m2": 0.0}
+    delta = b["mean"] - a["mean"]
+    return {
+        "count": count,
+        "mean": a["mean"] + delta * b["count"] / count,
+        "m2": a["m2"] + b["m2"] + delta * delta * a["count"] * b["count"] / count,
+    }
+
+
+def _empty_baseline() -> Dict[str, Dict[str, float]]:
+    return {feature: {"count": 0, "mean": 0.0, "m2": 0.0} for feature in FEATURES}
+
+
+class BaselineStore:
+    """Per-lab feature baselines, merged atomically across workers"""
+
+    def __init__(self):
+        self._memory: Dict[str, Dict] = {}
+
+    async def get(self, lab_id: str) -> Dict[str, Dict[str, float]]:
+        store = get_store()
+        baseline = await store.aget(NS_BASELINE, lab_id) if store else self._memory.get(lab_id)
+        return baseline or _empty_baseline()
+
+    async def merge(self, lab_id: str, batch: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+        """Add a batch's column stats to the lab baseline and return the result"""
+        store = get_store()
+        for _ in range(5):
+            current = await store.aget(NS_BASELINE, lab_id) if store else self._memory.get(lab_id)
+            merged = {
+                feature: _merge((current or _empty_baseline()).get(feature, _empty_baseline()[feature]), batch[feature])
+                for feature in FEATURES
+            }
+            if not store:
+                self._memory[lab_id] = merged
+                return merged
+            # current is None inserts only if no other worker created the baseline meanwhile
+            if await store.acompare_and_set(NS_BASELINE, lab_id, current, merged, ttl=BASELINE_TTL):
+                return merged
+        # Scores still use this batch; the stored baseline just misses it
+        logger.warning(f"Integrity baseline for lab {lab_id} kept changing; this batch was not saved to it")
+        return merged
+
+
+baselines = BaselineStore()
+
+
+def z_scores(matrix: np.ndarray, baseline: Dict[str, Dict[str, float]]) -> np.ndarray:
+    """
+    Z-score every cell of a submissions x FEATURES matrix against the baseline
+
+    Returns:
+        Matrix of the same shape; NaN in the columns whose baseline is too
+        small or does not vary
+    """
+    count = np.array([baseline[feature]["count"] for feature in FEATURES], dtype=np.float64)
+    mean = np.array([baseline[feature]["mean"] for feature in FEATURES], dtype=np.float64)
+    m2 = np.array([baseline[feature]["m2"] for feature in FEATURES], dtype=np.float64)
+    std = np.sqrt(np.divide(m2, count - 1, out=np.zeros_like(m2), where=count > 1))
+    usable = (count >= MIN_BASELINE) & (std >= 1e-9)
+    z = (matrix - mean) / np.where(usable, std, 1.0)
+    z[:, ~usable] = np.nan
+    return z
+
+
+async def score_section(lab_id: str, codes: List[str], update_baseline: bool = True) -> List[Dict]:
+    """
+    Extract features for a batch of submissions and score them against the lab baseline
+
+    Args:
+        lab_id: Lab or assignment the baseline belongs to
+        codes: Source of each submission
+        update_baseline: Merge this batch into the stored baseline first
+
+    Returns:
+        Per submission, in order: {"features", "z_scores", "flags", "anomaly_score"}
+        where flags lists features with |z| >= INTEGRITY_Z_THRESHOLD and
+        anomaly_score is the root mean square of the available z-scores
+    """
+    rows = await run_in_threadpool(lambda: [extract_features(code) for code in codes])
+    matrix = np.array([[row[feature] for feature in FEATURES] for row in rows], dtype=np.float64).reshape(-1, len(FEATURES))
+    batch = _column_stats(matrix)
+    if update_baseline:
+        baseline = await baselines.merge(lab_id, batch)
+    else:
+        stored = await baselines.get(lab_id)
+        baseline = {feature: _merge(stored[feature], batch[feature]) for feature in FEATURES}
+    z = z_scores(matrix, baseline)
+
+    available = ~np.isnan(z)
+    seen = available.sum(axis=1)
+    squares = np.where(available, z * z, 0.0).sum(axis=1)
+    anomaly = np.sqrt(np.divide(squares, seen, out=np.zeros_like(squares), where=seen > 0))
+    flagged = available & (np.abs(np.nan_to_num(z)) >= Z_THRESHOLD)
+    # Within a row, flags strongest first (stable, so ties keep FEATURES order)
+    order = np.argsort(-np.abs(np.nan_to_num(z)), axis=1, kind="stable")
+
+    results = []
+    for i, row in enumerate(rows):
+        z_row = z[i].tolist()
+        results.append({
+            "features": {k: round(v, 3) for k, v in row.items()},
+            "z_scores": {k: (None if math.isnan(value) else round(value, 2)) for k, value in zip(FEATURES, z_row)},
+            "flags": [FEATURES[j] for j in order[i].tolist() if flagged[i, j]],
+            "anomaly_score": round(float(anomaly[i]), 2) if seen[i] else None,
+        })
+    return results
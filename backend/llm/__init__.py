@@ -1,11 +1,17 @@
 """
 LLM provider package
+Provider classes are imported on first access so that starting the backend
+does not pay for openai/instructor/httpx unless a provider actually needs them.
 """
-from .base_provider import LLMProvider
-from .groq_provider import GroqProvider
-from .ollama_provider import OllamaProvider
-from .localai_provider import LocalAIProvider
-from .provider_factory import get_llm_provider
+import importlib
+
+_LAZY_EXPORTS = {
+    'LLMProvider': '.base_provider',
+    'GroqProvider': '.groq_provider',
+    'OllamaProvider': '.ollama_provider',
+    'LocalAIProvider': '.localai_provider',
+    'get_llm_provider': '.provider_factory',
+}
 
 __all__ = [
     'LLMProvider',
@@ -14,3 +20,10 @@ __all__ = [
     'LocalAIProvider',
     'get_llm_provider'
 ]
+
+
+def __getattr__(name):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module, __name__), name)
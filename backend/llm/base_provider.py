@@ -3,13 +3,26 @@ Base abstract class for LLM providers
 All LLM providers must implement this interface
 """
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import Any, List, Dict, Optional, Tuple
 from schemas import ContextResponse
 
 
 class LLMProvider(ABC):
     """Abstract base class for LLM providers"""
     
+    # Concurrent requests one backend process sends this provider when fanning
+    # out (see provider_factory.provider_slots); LLM_MAX_CONCURRENCY overrides it
+    max_concurrency = 4
+    
+    # Part of the /context/file cache key and ETag: bump it (in the provider
+    # whose prompt changed) when the analysis prompt or response parsing
+    # changes, so cached analyses are not served for the old prompt
+    analysis_prompt_version = 1
+    
+    # Placeholder complete() returns instead of model output when the provider
+    # is not configured; callers that store the text (chat summaries) skip it
+    mock_completion: Optional[str] = None
+    
     def __init__(self, config: Dict):
         """
         Initialize provider with configuration
@@ -19,6 +32,14 @@ class LLMProvider(ABC):
         """
         self.config = config
     
+    @classmethod
+    def preload(cls):
+        """
+        Load heavy dependencies and data ahead of the first request
+        (called from a background thread at startup; default is a no-op)
+        """
+        pass
+    
     @abstractmethod
     async def generate(
         self,
@@ -43,6 +64,51 @@ class LLMProvider(ABC):
         """
         pass
     
+    @abstractmethod
+    async def complete(
+        self,
+        prompt: str,
+        temperature: float = 0.3,
+        max_tokens: int = 800
+    ) -> str:
+        """
+        Generate free-form text for a single prompt (used by the /v1 routers)
+        
+        Args:
+            prompt: Complete prompt text
+            temperature: Sampling temperature
+            max_tokens: Maximum number of tokens to generate
+            
+        Returns:
+            Raw model output as string
+        """
+        pass
+    
+    async def complete_in_session(
+        self,
+        prompt: str,
+        session_state: Optional[Any] = None,
+        temperature: float = 0.3,
+        max_tokens: int = 800
+    ) -> Tuple[str, Optional[Any]]:
+        """
+        Generate text continuing a conversation the provider keeps state for
+        
+        Providers that can carry conversation state between calls (such as
+        Ollama's context tokens) override this; by default there is no state and
+        the prompt must contain the whole conversation.
+        
+        Args:
+            prompt: Prompt text (only the new turn when session_state is given)
+            session_state: State returned by the previous call, or None to start fresh
+            temperature: Sampling temperature
+            max_tokens: Maximum number of tokens to generate
+            
+        Returns:
+            Tuple of (model output, state to pass to the next call or None)
+        """
+        return await self.complete(prompt, temperature=temperature, max_tokens=max_tokens), None
+    
     @abstractmethod
     def is_available(self) -> bool:
         """
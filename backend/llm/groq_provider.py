@@ -4,11 +4,9 @@ Groq LLM Provider - Cloud-based LLM using Groq API
 import os
 import logging
 from typing import List, Dict, Optional
-import instructor
-from openai import AsyncOpenAI
-import tiktoken
 
 from .base_provider import LLMProvider
+import metrics
 from schemas import ContextResponse, DesignDecision, RelatedFile
 
 logger = logging.getLogger(__name__)
@@ -17,14 +15,21 @@ logger = logging.getLogger(__name__)
 class GroqProvider(LLMProvider):
     """Groq cloud LLM provider"""
     
+    # Hosted: requests run in parallel server-side, bounded by the account rate limit
+    max_concurrency = 8
+    
+    mock_completion = "Configure LLM_API_KEY environment variable to get AI-powered responses."
+    
     def __init__(self, config: Dict):
         super().__init__(config)
         self.api_key = config.get('api_key') or os.getenv("LLM_API_KEY", "")
         self.api_base = config.get('api_base') or os.getenv("LLM_API_BASE", "https://api.groq.com/openai/v1")
         self.model = config.get('model') or os.getenv("LLM_MODEL", "llama-3.1-8b-instant")
         
-        # Initialize Instructor client
+        # Initialize Instructor client (imported lazily: openai/instructor are slow to import)
         if self.api_key:
+            import instructor
+            from openai import AsyncOpenAI
             self.client = instructor.patch(AsyncOpenAI(
                 api_key=self.api_key,
                 base_url=self.api_base,
@@ -33,6 +38,19 @@ class GroqProvider(LLMProvider):
         else:
             self.client = None
     
+    @classmethod
+    def preload(cls):
+        """Import the client libraries and load the tokenizer encoding"""
+        import instructor  # noqa: F401
+        import tiktoken
+        from openai import AsyncOpenAI  # noqa: F401
+        
+        model = os.getenv("LLM_MODEL", "llama-3.1-8b-instant")
+        try:
+            tiktoken.encoding_for_model(model)
+        except KeyError:
+            tiktoken.get_encoding("cl100k_base")
+    
     def is_available(self) -> bool:
         """Check if Groq provider is configured"""
         return bool(self.api_key and self.client)
@@ -55,28 +73,31 @@ class GroqProvider(LLMProvider):
             return self._create_mock_response(file_path, commits, related_files_data, selected_code)
         
         try:
-            # Truncate content using tiktoken
-            truncated_content = self._truncate_content_tokens(file_content, self.model)
-            
-            # Build messages
-            messages = self._build_messages(
-                file_path=file_path,
-                file_content=truncated_content,
-                commits=commits,
-                related_files_data=related_files_data,
-                selected_code=selected_code
-            )
+            with metrics.observe_stage("prompt_build", "groq", self.model):
+                # Truncate content using tiktoken
+                truncated_content = self._truncate_content_tokens(file_content, self.model)
+                
+                # Build messages
+                messages = self._build_messages(
+                    file_path=file_path,
+                    file_content=truncated_content,
+                    commits=commits,
+                    related_files_data=related_files_data,
+                    selected_code=selected_code
+                )
             
-            # Call LLM with structured output
+            # Call LLM with structured output (Instructor parses inside the call)
             logger.info(f"Calling Groq API: {self.api_base} with model {self.model}")
             
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                response_model=ContextResponse,
-                messages=messages,
-                temperature=0.3,
-                max_retries=2,
-            )
+            with metrics.observe_stage("llm_call", "groq", self.model):
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    response_model=ContextResponse,
+                    messages=messages,
+                    temperature=0.3,
+                    max_retries=2,
+                )
+            self._record_usage(getattr(response, "_raw_response", None))
             
             # Add metadata
             response.metadata = {
@@ -91,16 +112,56 @@ class GroqProvider(LLMProvider):
             
         except Exception as e:
             logger.error(f"Error calling Groq API: {e}", exc_info=True)
+            metrics.record_provider_error("groq", self.model)
             return self._create_mock_response(file_path, commits, related_files_data, selected_code)
     
+    async def complete(
+        self,
+        prompt: str,
+        temperature: float = 0.3,
+        max_tokens: int = 800
+    ) -> str:
+        """Generate free-form text using Groq API"""
+        
+        if not self.is_available():
+            logger.warning("Groq API key not configured")
+            metrics.record_fallback("mock_response", "groq", self.model)
+            return self.mock_completion
+        
+        logger.info(f"Calling Groq API: {self.api_base} with model {self.model}")
+        
+        try:
+            with metrics.observe_stage("llm_call", "groq", self.model):
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                )
+        except Exception:
+            metrics.record_provider_error("groq", self.model)
+            raise
+        
+        self._record_usage(response)
+        return response.choices[0].message.content or ""
+    
+    def _record_usage(self, response):
+        """Export token usage reported by the API, if any"""
+        usage = getattr(response, "usage", None)
+        if usage:
+            metrics.record_tokens("groq", self.model, usage.prompt_tokens, usage.completion_tokens)
+    
     def _truncate_content_tokens(self, content: str, model: str, max_tokens: int = 6000) -> str:
         """Truncate content to a specific number of tokens"""
+        import tiktoken
+        
         try:
             encoding = tiktoken.encoding_for_model(model)
         except KeyError:
             encoding = tiktoken.get_encoding("cl100k_base")
         
-        tokens = encoding.encode(content)
+        with metrics.observe_stage("tokenize", "groq", model):
+            tokens = encoding.encode(content)
         
         if len(tokens) <= max_tokens:
             return content
@@ -5,9 +5,9 @@ import os
 import logging
 from typing import List, Dict, Optional
 import httpx
-from openai import AsyncOpenAI
 
 from .base_provider import LLMProvider
+import metrics
 from schemas import ContextResponse, DesignDecision, RelatedFile
 
 logger = logging.getLogger(__name__)
@@ -18,11 +18,12 @@ class LocalAIProvider(LLMProvider):
     
     def __init__(self, config: Dict):
         super().__init__(config)
-        self.api_base = config.get('api_base', 'http://localhost:8080/v1')
+        self.api_base = config.get('api_base') or os.getenv("LOCALAI_API_BASE", "http://localhost:8080/v1")
         self.model = config.get('model', 'gpt-3.5-turbo')  # LocalAI model name
         self.timeout = config.get('timeout', 60.0)
         
-        # Initialize OpenAI client (LocalAI is compatible)
+        # Initialize OpenAI client (LocalAI is compatible; imported lazily)
+        from openai import AsyncOpenAI
         self.client = AsyncOpenAI(
             api_key="not-needed",  # LocalAI doesn't require API key
             base_url=self.api_base,
@@ -32,16 +33,10 @@ class LocalAIProvider(LLMProvider):
     def is_available(self) -> bool:
         """Check if LocalAI server is running"""
         try:
-            import asyncio
-            async def check():
-                async with httpx.AsyncClient(timeout=5.0) as client:
-                    response = await client.get(f"{self.api_base}/models")
-                    return response.status_code == 200
-            
-            loop = asyncio.new_event_loop()
-            result = loop.run_until_complete(check())
-            loop.close()
-            return result
+            # Synchronous probe: a nested event loop cannot be started from
+            # inside a running FastAPI handler
+            response = httpx.get(f"{self.api_base}/models", timeout=5.0)
+            return response.status_code == 200
         except Exception as e:
             logger.debug(f"LocalAI not available: {e}")
             return False
@@ -61,36 +56,40 @@ class LocalAIProvider(LLMProvider):
         
         try:
             # Build messages
-            messages = self._build_messages(
-                file_path=file_path,
-                file_content=file_content[:8000],  # Truncate to reasonable size
-                commits=commits,
-                related_files_data=related_files_data,
-                selected_code=selected_code
-            )
+            with metrics.observe_stage("prompt_build", "localai", self.model):
+                messages = self._build_messages(
+                    file_path=file_path,
+                    file_content=file_content[:8000],  # Truncate to reasonable size
+                    commits=commits,
+                    related_files_data=related_files_data,
+                    selected_code=selected_code
+                )
             
             # Call LocalAI API
             logger.info(f"Calling LocalAI API: {self.api_base} with model {self.model}")
             
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.3,
-                max_tokens=1000
-            )
+            with metrics.observe_stage("llm_call", "localai", self.model):
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=1000
+                )
+            self._record_usage(response)
             
             # Parse response
             content = response.choices[0].message.content
             
             # Try to parse as structured response
             import json
-            try:
-                parsed = json.loads(content)
-                return self._parse_response(parsed, commits, file_path)
-            except json.JSONDecodeError:
-                # If not JSON, treat as summary
-                logger.warning("LocalAI response not JSON, using as summary")
-                return self._create_text_response(content, file_path, commits, related_files_data)
+            with metrics.observe_stage("response_parse", "localai", self.model):
+                try:
+                    parsed = json.loads(content)
+                    return self._parse_response(parsed, commits, file_path)
+                except json.JSONDecodeError:
+                    # If not JSON, treat as summary
+                    logger.warning("LocalAI response not JSON, using as summary")
+                    return self._create_text_response(content, file_path, commits, related_files_data)
             
         except httpx.ConnectError:
             logger.error("Cannot connect to LocalAI server. Is it running?")
@@ -102,6 +101,37 @@ class LocalAIProvider(LLMProvider):
             logger.error(f"Error calling LocalAI API: {e}", exc_info=True)
             raise Exception(f"LocalAI error: {str(e)}")
     
+    async def complete(
+        self,
+        prompt: str,
+        temperature: float = 0.3,
+        max_tokens: int = 800
+    ) -> str:
+        """Generate free-form text using LocalAI API"""
+        
+        logger.info(f"Calling LocalAI API: {self.api_base} with model {self.model}")
+        
+        try:
+            with metrics.observe_stage("llm_call", "localai", self.model):
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                )
+        except Exception:
+            metrics.record_provider_error("localai", self.model)
+            raise
+        
+        self._record_usage(response)
+        return response.choices[0].message.content or ""
+    
+    def _record_usage(self, response):
+        """Export token usage reported by the server, if any"""
+        usage = getattr(response, "usage", None)
+        if usage:
+            metrics.record_tokens("localai", self.model, usage.prompt_tokens, usage.completion_tokens)
+    
     def _build_messages(
         self,
         file_path: str,
@@ -1,42 +1,186 @@
 """
 Ollama LLM Provider - Local LLM using Ollama
+
+Environment:
+    OLLAMA_KEEP_ALIVE          How long Ollama keeps the model loaded after a request (default: 30m, -1 = forever)
+    OLLAMA_WARMUP              "0" to skip loading the model at backend startup (default: enabled)
+    OLLAMA_NUM_CTX             Context window per model, e.g. "8192" or "llama3=8192,phi3=4096,*=4096"
+                               (default: 8192); prompts are truncated to fit it
+    OLLAMA_COLD_THRESHOLD_MS   Model load time counted as a cold start (default: 500)
 """
 import os
 import logging
 import json
-from typing import List, Dict, Optional
+import threading
+from typing import List, Dict, Optional, Tuple
 import httpx
 
 from .base_provider import LLMProvider
+import metrics
 from schemas import ContextResponse, DesignDecision, RelatedFile
 
 logger = logging.getLogger(__name__)
 
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+DEFAULT_NUM_CTX = 8192
+COLD_THRESHOLD = float(os.getenv("OLLAMA_COLD_THRESHOLD_MS", "500")) / 1000.0
+
+# Output budget for /context/file analysis JSON
+ANALYSIS_MAX_TOKENS = 1024
+# Marker left where the middle of an oversized prompt was cut
+TRUNCATION_MARKER = "\n\n[... truncated to fit the context window ...]\n\n"
+
+
+def _parse_num_ctx(spec: str) -> Dict[str, int]:
+    sizes = {}
+    for part in spec.split(","):
+        model, _, size = part.strip().rpartition("=")
+        if size:
+            sizes[model or "*"] = int(size)
+    return sizes
+
+
+NUM_CTX = _parse_num_ctx(os.getenv("OLLAMA_NUM_CTX", str(DEFAULT_NUM_CTX)))
+
+MODEL_LOAD = metrics.Histogram(
+    "contextweave_llm_model_load_seconds",
+    "Model load time reported by the LLM server, by trigger (warmup or request)",
+    ["provider", "model", "trigger"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+PROMPT_TRUNCATIONS = metrics.Counter(
+    "contextweave_llm_prompt_truncations_total",
+    "Prompts cut to fit the model's fixed context window",
+    ["provider", "model"]
+)
+
+COLD_STARTS = metrics.Counter(
+    "contextweave_llm_cold_starts_total",
+    "Calls that had to load the model first (load time above OLLAMA_COLD_THRESHOLD_MS)",
+    ["provider", "model", "trigger"]
+)
+
 
 class OllamaProvider(LLMProvider):
     """Ollama local LLM provider"""
     
+    # Characters per prompt token, calibrated from the prompt_eval_count
+    # Ollama reports, so context sizing follows the model's real tokenizer
+    _chars_per_token = 4.0
+    _calibration_lock = threading.Lock()
+    
     def __init__(self, config: Dict):
         super().__init__(config)
-        self.api_base = config.get('api_base', 'http://localhost:11434')
+        self.api_base = config.get('api_base') or os.getenv("OLLAMA_API_BASE", "http://localhost:11434")
         self.model = config.get('model', 'llama3')
         self.timeout = config.get('timeout', 60.0)
+        self.keep_alive = config.get('keep_alive', KEEP_ALIVE)
+        self.num_ctx = config.get('num_ctx') or NUM_CTX.get(self.model) or NUM_CTX.get("*", DEFAULT_NUM_CTX)
+    
+    @classmethod
+    def preload(cls):
+        """Load the configured model into Ollama so the first request does not pay for it"""
+        if os.getenv("OLLAMA_WARMUP", "1") == "0":
+            return
+        cls({}).warm_up()
+    
+    def warm_up(self) -> bool:
+        """
+        Ask Ollama to load the model without generating anything
+        
+        Returns:
+            True if the model is loaded
+        """
+        try:
+            # An empty prompt only loads the model; num_ctx is the one every
+            # request uses, so the first real request does not reload it
+            response = httpx.post(
+                f"{self.api_base}/api/generate",
+                json={
+                    "model": self.model,
+                    "prompt": "",
+                    "stream": False,
+                    "keep_alive": self.keep_alive,
+                    "options": {"num_ctx": self.num_ctx}
+                },
+                timeout=max(self.timeout, 120.0)
+            )
+        except httpx.HTTPError as e:
+            logger.info(f"Ollama warm-up skipped: {e}")
+            return False
+        if response.status_code != 200:
+            logger.warning(f"Ollama warm-up failed with status {response.status_code}: {response.text[:200]}")
+            return False
+        load_seconds = self._record_load(response.json(), "warmup")
+        logger.info(f"Ollama model {self.model} loaded (load {load_seconds * 1000:.0f}ms, keep_alive {self.keep_alive})")
+        return True
+    
+    def _fit(
+        self,
+        prompt: str,
+        max_tokens: int,
+        temperature: Optional[float] = None,
+        context_tokens: int = 0
+    ) -> Tuple[str, Dict]:
+        """
+        Fit one prompt into the model's context window
+        
+        num_ctx is fixed per model (OLLAMA_NUM_CTX): Ollama reloads the model
+        whenever num_ctx changes, which would undo the warm-up, keep_alive and
+        prompt-prefix reuse. A prompt that does not fit, together with its
+        output budget, loses its middle, so the static instructions at the
+        start and the question at the end survive.
+        
+        Returns:
+            (prompt to send, Ollama options)
+        """
+        num_ctx = self.num_ctx
+        # Leave at least half the window for the prompt
+        num_predict = max(min(max_tokens, num_ctx // 2), 64)
+        budget = num_ctx - num_predict - context_tokens
+        if len(prompt) / self._chars_per_token + 1 > budget:
+            # 5% slack for the estimate
+            keep = max(int(budget * self._chars_per_token * 0.95) - len(TRUNCATION_MARKER), 0)
+            head = keep * 2 // 3
+            prompt = prompt[:head] + TRUNCATION_MARKER + prompt[len(prompt) - (keep - head):]
+            PROMPT_TRUNCATIONS.inc(provider="ollama", model=self.model)
+            logger.warning(f"Prompt truncated to about {budget} tokens to fit num_ctx {num_ctx}")
+        
+        options = {"num_ctx": num_ctx, "num_predict": num_predict}
+        if temperature is not None:
+            options["temperature"] = temperature
+        return prompt, options
+    
+    def _record_load(self, result: Dict, trigger: str) -> float:
+        """Record model load time from an Ollama response (durations are in nanoseconds)"""
+        load_seconds = (result.get('load_duration') or 0) / 1e9
+        MODEL_LOAD.observe(load_seconds, provider="ollama", model=self.model, trigger=trigger)
+        if load_seconds >= COLD_THRESHOLD:
+            COLD_STARTS.inc(provider="ollama", model=self.model, trigger=trigger)
+            if trigger == "request":
+                logger.info(f"Ollama cold start: model {self.model} took {load_seconds * 1000:.0f}ms to load")
+        return load_seconds
+    
+    def _after_call(self, prompt: str, result: Dict, calibrate: bool = True):
+        """Record metrics for a completed /api/generate call and refine the token estimate"""
+        prompt_tokens = result.get('prompt_eval_count')
+        metrics.record_tokens("ollama", self.model, prompt_tokens, result.get('eval_count'))
+        self._record_load(result, "request")
+        # With a context array the evaluated tokens no longer match the prompt text
+        if prompt_tokens and calibrate:
+            with self._calibration_lock:
+                measured = len(prompt) / prompt_tokens
+                cls = type(self)
+                cls._chars_per_token = 0.8 * cls._chars_per_token + 0.2 * measured
     
     def is_available(self) -> bool:
         """Check if Ollama server is running"""
         try:
-            import asyncio
-            # Try to connect to Ollama server
-            async def check():
-                async with httpx.AsyncClient(timeout=5.0) as client:
-                    response = await client.get(f"{self.api_base}/api/tags")
-                    return response.status_code == 200
-            
-            # Run async check
-            loop = asyncio.new_event_loop()
-            result = loop.run_until_complete(check())
-            loop.close()
-            return result
+            # Synchronous probe: a nested event loop cannot be started from
+            # inside a running FastAPI handler
+            response = httpx.get(f"{self.api_base}/api/tags", timeout=5.0)
+            return response.status_code == 200
         except Exception as e:
             logger.debug(f"Ollama not available: {e}")
             return False
@@ -56,41 +200,49 @@ class OllamaProvider(LLMProvider):
         
         try:
             # Build prompt
-            prompt = self._build_prompt(
-                file_path=file_path,
-                file_content=file_content[:8000],  # Truncate to reasonable size
-                commits=commits,
-                related_files_data=related_files_data,
-                selected_code=selected_code
-            )
+            with metrics.observe_stage("prompt_build", "ollama", self.model):
+                prompt = self._build_prompt(
+                    file_path=file_path,
+                    file_content=file_content[:8000],  # Truncate to reasonable size
+                    commits=commits,
+                    related_files_data=related_files_data,
+                    selected_code=selected_code
+                )
+            
+            prompt, options = self._fit(prompt, ANALYSIS_MAX_TOKENS)
             
             # Call Ollama API
             logger.info(f"Calling Ollama API: {self.api_base} with model {self.model}")
             
             async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.api_base}/api/generate",
-                    json={
-                        "model": self.model,
-                        "prompt": prompt,
-                        "stream": False,
-                        "format": "json"
-                    }
-                )
+                with metrics.observe_stage("llm_call", "ollama", self.model):
+                    response = await client.post(
+                        f"{self.api_base}/api/generate",
+                        json={
+                            "model": self.model,
+                            "prompt": prompt,
+                            "stream": False,
+                            "format": "json",
+                            "keep_alive": self.keep_alive,
+                            "options": options
+                        }
+                    )
                 
                 if response.status_code != 200:
                     raise Exception(f"Ollama API returned status {response.status_code}: {response.text}")
                 
                 result = response.json()
                 llm_response = result.get('response', '')
+                self._after_call(prompt, result)
                 
                 # Parse JSON response
-                try:
-                    parsed = json.loads(llm_response)
-                    return self._parse_response(parsed, commits, file_path)
-                except json.JSONDecodeError:
-                    logger.warning("Failed to parse Ollama JSON response, using fallback")
-                    return self._create_fallback_response(file_path, commits, related_files_data, selected_code)
+                with metrics.observe_stage("response_parse", "ollama", self.model):
+                    try:
+                        parsed = json.loads(llm_response)
+                        return self._parse_response(parsed, commits, file_path)
+                    except json.JSONDecodeError:
+                        logger.warning("Failed to parse Ollama JSON response, using fallback")
+                        return self._create_fallback_response(file_path, commits, related_files_data, selected_code)
             
         except httpx.ConnectError:
             logger.error("Cannot connect to Ollama server. Is it running?")
@@ -102,6 +254,73 @@ class OllamaProvider(LLMProvider):
             logger.error(f"Error calling Ollama API: {e}", exc_info=True)
             raise Exception(f"Ollama error: {str(e)}")
     
+    async def complete(
+        self,
+        prompt: str,
+        temperature: float = 0.3,
+        max_tokens: int = 800
+    ) -> str:
+        """Generate free-form text using Ollama API"""
+        result = await self._generate_text(prompt, temperature, max_tokens)
+        return result.get('response', '')
+    
+    async def complete_in_session(
+        self,
+        prompt: str,
+        session_state: Optional[List[int]] = None,
+        temperature: float = 0.3,
+        max_tokens: int = 800
+    ) -> Tuple[str, Optional[List[int]]]:
+        """Continue a conversation from the context tokens Ollama returned for the previous turn"""
+        result = await self._generate_text(prompt, temperature, max_tokens, context=session_state)
+        return result.get('response', ''), result.get('context')
+    
+    async def _generate_text(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        context: Optional[List[int]] = None
+    ) -> Dict:
+        """POST /api/generate and return the decoded result"""
+        
+        try:
+            logger.info(f"Calling Ollama API: {self.api_base} with model {self.model}")
+            
+            prompt, options = self._fit(prompt, max_tokens, temperature, context_tokens=len(context or []))
+            payload = {
+                "model": self.model,
+                "prompt": prompt,
+                "stream": False,
+                "keep_alive": self.keep_alive,
+                "options": options
+            }
+            if context:
+                payload["context"] = context
+            
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                with metrics.observe_stage("llm_call", "ollama", self.model):
+                    response = await client.post(f"{self.api_base}/api/generate", json=payload)
+                
+                if response.status_code != 200:
+                    raise Exception(f"Ollama API returned status {response.status_code}: {response.text}")
+                
+                result = response.json()
+                self._after_call(prompt, result, calibrate=not context)
+                return result
+            
+        except httpx.ConnectError:
+            logger.error("Cannot connect to Ollama server. Is it running?")
+            metrics.record_provider_error("ollama", self.model)
+            raise Exception("Local LLM server not running. Please start Ollama with: ollama serve")
+        except httpx.TimeoutException:
+            logger.error("Ollama request timed out")
+            metrics.record_provider_error("ollama", self.model)
+            raise Exception("Local LLM server timed out. Try a smaller file or faster model.")
+        except Exception:
+            metrics.record_provider_error("ollama", self.model)
+            raise
+    
     def _build_prompt(
         self,
         file_path: str,
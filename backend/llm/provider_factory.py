@@ -3,16 +3,30 @@ LLM Provider Factory
 Selects and instantiates the appropriate LLM provider based on configuration
 """
 import os
+import asyncio
 import logging
-from typing import Dict, Optional
+import importlib
+from typing import Dict, Optional, Tuple
 
 from .base_provider import LLMProvider
-from .groq_provider import GroqProvider
-from .ollama_provider import OllamaProvider
-from .localai_provider import LocalAIProvider
 
 logger = logging.getLogger(__name__)
 
+# Provider modules are imported on first use: each pulls in heavy client
+# libraries (openai, instructor, tiktoken, httpx)
+_PROVIDER_CLASSES = {
+    "groq": (".groq_provider", "GroqProvider"),
+    "ollama": (".ollama_provider", "OllamaProvider"),
+    "localai": (".localai_provider", "LocalAIProvider"),
+}
+
+
+def _provider_class(provider_name: str):
+    """Import and return the provider class registered under provider_name"""
+    module_name, class_name = _PROVIDER_CLASSES[provider_name]
+    module = importlib.import_module(module_name, __package__)
+    return getattr(module, class_name)
+
 
 def get_llm_provider(provider_name: Optional[str] = None, config: Optional[Dict] = None) -> LLMProvider:
     """
@@ -41,15 +55,11 @@ def get_llm_provider(provider_name: Optional[str] = None, config: Optional[Dict]
     logger.info(f"Initializing LLM provider: {provider_name}")
     
     # Instantiate provider
-    if provider_name == "groq":
-        return GroqProvider(config)
-    elif provider_name == "ollama":
-        return OllamaProvider(config)
-    elif provider_name == "localai":
-        return LocalAIProvider(config)
-    else:
+    if provider_name not in _PROVIDER_CLASSES:
         logger.warning(f"Unknown provider '{provider_name}', falling back to Groq")
-        return GroqProvider(config)
+        provider_name = "groq"
+    
+    return _provider_class(provider_name)(config)
 
 
 def get_available_providers() -> Dict[str, bool]:
@@ -60,10 +70,44 @@ def get_available_providers() -> Dict[str, bool]:
         Dictionary mapping provider names to availability status
     """
     providers = {
-        "groq": GroqProvider({}).is_available(),
-        "ollama": OllamaProvider({}).is_available(),
-        "localai": LocalAIProvider({}).is_available(),
+        name: _provider_class(name)({}).is_available()
+        for name in _PROVIDER_CLASSES
     }
     
     logger.info(f"Provider availability: {providers}")
     return providers
+
+
+def preload_provider(provider_name: Optional[str] = None):
+    """
+    Import a provider module and let it warm its dependencies
+    
+    Args:
+        provider_name: Provider to warm; defaults to LLM_PROVIDER
+    """
+    provider_name = (provider_name or os.getenv("LLM_PROVIDER", "groq")).lower()
+    if provider_name not in _PROVIDER_CLASSES:
+        provider_name = "groq"
+    _provider_class(provider_name).preload()
+
+
+_slots: Dict[Tuple[str, int], asyncio.Semaphore] = {}
+
+
+def provider_slots(provider: LLMProvider) -> asyncio.Semaphore:
+    """
+    Process-wide limit on concurrent calls to a provider, for code that fans out
+    several LLM calls per request (per-criterion evaluation, batch grading)
+    
+    Args:
+        provider: Provider instance; its max_concurrency is the default limit
+        
+    Returns:
+        Semaphore shared by all callers of this provider on the running event loop
+    """
+    # Semaphores belong to one event loop
+    key = (provider.get_provider_name(), id(asyncio.get_running_loop()))
+    if key not in _slots:
+        limit = int(os.getenv("LLM_MAX_CONCURRENCY", "0")) or provider.max_concurrency
+        _slots[key] = asyncio.Semaphore(limit)
+    return _slots[key]
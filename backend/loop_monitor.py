@@ -0,0 +1,128 @@
+"""
+Event-loop lag monitor
+A heartbeat coroutine sleeps for a fixed interval and records how late it wakes
+up (scheduling delay) as a metric. A watchdog thread watches the heartbeat;
+when the loop has been stuck for longer than the threshold it captures the
+event-loop thread's stack (the code that is blocking the loop right now) and
+logs it, rate-limited per blocking site.
+
+Environment:
+    LOOP_LAG_MONITOR          "0" to disable (default: enabled)
+    LOOP_LAG_INTERVAL_MS      Heartbeat interval (default: 100)
+    LOOP_LAG_THRESHOLD_MS     Stall length that triggers a stack capture (default: 100)
+    LOOP_LAG_LOG_INTERVAL_S   Minimum seconds between logs for the same site (default: 30)
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = metrics.Histogram(
+    "contextweave_event_loop_lag_seconds",
+    "Delay between when the loop heartbeat was due and when it ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+LOOP_BLOCKED = metrics.Counter(
+    "contextweave_event_loop_blocked_total",
+    "Loop stalls longer than LOOP_LAG_THRESHOLD_MS, by blocking site",
+    ["site"]
+)
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _blocking_site(frame) -> str:
+    """Innermost frame from backend code (falls back to the innermost frame)"""
+    innermost = frame
+    while frame is not None:
+        if frame.f_code.co_filename.startswith(_BACKEND_DIR):
+            return f"{os.path.relpath(frame.f_code.co_filename, _BACKEND_DIR)}:{frame.f_lineno}"
+        frame = frame.f_back
+    return f"{os.path.basename(innermost.f_code.co_filename)}:{innermost.f_lineno}"
+
+
+class LoopLagMonitor:
+    """Heartbeat coroutine plus watchdog thread for one event loop"""
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1, log_interval: float = 30.0):
+        self.interval = interval
+        self.threshold = threshold
+        self.log_interval = log_interval
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._last_logged: Dict[str, float] = {}
+        self._suppressed: Dict[str, int] = {}
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._watchdog, name="loop-lag-watchdog", daemon=True).start()
+        logger.info(
+            f"Event-loop lag monitor started (interval {self.interval*1000:.0f}ms, "
+            f"threshold {self.threshold*1000:.0f}ms)"
+        )
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            LOOP_LAG.observe(max(time.perf_counter() - start - self.interval, 0.0))
+            self._last_beat = time.monotonic()
+
+    def _watchdog(self):
+        captured_for = None
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._last_beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.threshold or captured_for == beat:
+                continue
+            # One capture per stall: the heartbeat value identifies the stall
+            captured_for = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._report(frame, stalled)
+
+    def _report(self, frame, stalled: float):
+        site = _blocking_site(frame)
+        LOOP_BLOCKED.inc(site=site)
+
+        now = time.monotonic()
+        if now - self._last_logged.get(site, 0.0) < self.log_interval:
+            self._suppressed[site] = self._suppressed.get(site, 0) + 1
+            return
+        self._last_logged[site] = now
+        suppressed = self._suppressed.pop(site, 0)
+
+        stack = "".join(traceback.format_stack(frame, limit=15))
+        note = f" ({suppressed} similar stalls suppressed)" if suppressed else ""
+        logger.warning(
+            f"Event loop blocked for >{stalled*1000:.0f}ms at {site}{note}\n{stack}"
+        )
+
+
+def from_env() -> Optional[LoopLagMonitor]:
+    """Build a monitor from environment settings, or None when disabled"""
+    if os.getenv("LOOP_LAG_MONITOR", "1") == "0":
+        return None
+    return LoopLagMonitor(
+        interval=float(os.getenv("LOOP_LAG_INTERVAL_MS", "100")) / 1000.0,
+        threshold=float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100")) / 1000.0,
+        log_interval=float(os.getenv("LOOP_LAG_LOG_INTERVAL_S", "30"))
+    )
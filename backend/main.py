@@ -3,11 +3,17 @@ ContextWeave Lite - FastAPI Backend
 Main application entry point and API endpoints
 """
 import os
+import asyncio
 import logging
 from pathlib import Path
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+import time
+import threading
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
 from pydantic import BaseModel, Field
 from typing import Optional
 
@@ -15,9 +21,21 @@ from typing import Optional
 env_path = Path(__file__).parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
-from git_utils import get_commit_history, get_related_files, read_file_content
-from llm.provider_factory import get_llm_provider, get_available_providers
+from git_utils import get_commit_history, get_related_files, get_head_sha, read_file_content
+from llm.provider_factory import get_llm_provider, get_available_providers, preload_provider
 from schemas import ContextRequest, ContextResponse
+from fast_json import FastJSONResponse
+from store import cache_key, content_hash, get_store, run_eviction
+import batch_grading
+import compression
+import concept_index
+import etags
+import loop_monitor
+import memory
+import metrics
+import prefetch
+import profiling
+import tracing
 
 # Configure logging
 logging.basicConfig(
@@ -30,7 +48,9 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="ContextWeave Coach API",
     description="AI-powered code learning coach with progressive hints and mastery tracking",
-    version="0.2.0"
+    version="0.2.0",
+    # orjson rendering (see fast_json.py)
+    default_response_class=FastJSONResponse
 )
 
 # Add CORS middleware to allow VS Code extension to call the API
@@ -40,13 +60,150 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Trace-Id"],
 )
 
+
+def _route_template(request: Request) -> str:
+    """Path template of the route that will handle the request (e.g. /v1/batches/{job_id}), or "unmatched"
+
+    Routing happens after the middlewares, but the endpoint label has to be set
+    before it: match the routes here so raw paths never become metric labels.
+    """
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Tag the request with its endpoint and record end-to-end latency"""
+    endpoint = _route_template(request)
+    token = metrics.current_endpoint.set(endpoint)
+    start = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        metrics.REQUEST_DURATION.observe(
+            time.perf_counter() - start,
+            endpoint=endpoint,
+            method=request.method,
+            status=status
+        )
+        metrics.current_endpoint.reset(token)
+
+
+@app.middleware("http")
+async def add_server_timing(request: Request, call_next):
+    """Trace the request and report per-stage timings in a Server-Timing header"""
+    trace = tracing.start_trace(f"{request.method} {request.url.path}", endpoint=request.url.path)
+    try:
+        response = await call_next(request)
+        trace.root.end_ns = time.time_ns()
+        response.headers["Server-Timing"] = trace.server_timing()
+        response.headers["X-Trace-Id"] = trace.trace_id
+        return response
+    finally:
+        tracing.finish_trace(trace)
+
+
 # Include new routers
-from routers import explain, labs, chat
+from routers import explain, labs, batches, chat, integrity, concepts, mastery, admin
 app.include_router(explain.router)
 app.include_router(labs.router)
+app.include_router(batches.router)
 app.include_router(chat.router)
+app.include_router(integrity.router)
+app.include_router(concepts.router)
+app.include_router(mastery.router)
+app.include_router(admin.router)
+
+# Pure ASGI middlewares that pass untracked requests straight through;
+# the profiler is outermost and sees compression time
+app.add_middleware(compression.CompressionMiddleware)
+app.add_middleware(memory.MemoryTrackingMiddleware)
+app.add_middleware(profiling.ProfilingMiddleware)
+
+
+lag_monitor = loop_monitor.from_env()
+
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    if lag_monitor:
+        lag_monitor.start()
+
+
+def _preload_dependencies():
+    """Import the configured provider, GitPython and tokenizer data off the request path"""
+    start = time.perf_counter()
+    try:
+        import git  # noqa: F401
+        preload_provider()
+    except Exception as e:
+        logger.warning(f"Background preload failed: {e}")
+        return
+    logger.info(f"Background preload finished in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+
+@app.on_event("startup")
+async def schedule_preload():
+    # Uvicorn binds the port right after startup handlers return, so defer the
+    # preload slightly to keep it out of the time-to-first-response path
+    asyncio.get_running_loop().call_later(
+        0.2,
+        lambda: threading.Thread(target=_preload_dependencies, name="preload", daemon=True).start()
+    )
+
+
+@app.on_event("startup")
+async def start_cache_eviction():
+    app.state.eviction_task = asyncio.create_task(run_eviction())
+
+
+@app.on_event("startup")
+async def start_batch_grader():
+    # Resumes batch grading jobs left unfinished by a crashed or restarted worker
+    if get_store():
+        batch_grading.grader.start()
+
+
+@app.on_event("startup")
+async def start_prefetcher():
+    prefetch.prefetcher.start(_prepare_analysis, _run_analysis)
+
+
+@app.on_event("shutdown")
+async def stop_loop_monitor():
+    if lag_monitor:
+        lag_monitor.stop()
+
+
+@app.on_event("shutdown")
+async def stop_cache_eviction():
+    task = getattr(app.state, "eviction_task", None)
+    if task:
+        task.cancel()
+
+
+@app.on_event("shutdown")
+async def stop_batch_grader():
+    batch_grading.grader.stop()
+
+
+@app.on_event("shutdown")
+async def stop_concept_indexing():
+    concept_index.index.stop()
+
+
+@app.on_event("shutdown")
+async def stop_prefetcher():
+    prefetch.prefetcher.stop()
 
 
 @app.get("/")
@@ -64,7 +221,8 @@ async def root():
 async def health_check():
     """Detailed health check including LLM provider availability"""
     provider_name = os.getenv("LLM_PROVIDER", "groq")
-    available_providers = get_available_providers()
+    # Availability probes are blocking HTTP calls: keep them off the event loop
+    available_providers = await run_in_threadpool(get_available_providers)
     
     return {
         "status": "healthy",
@@ -74,111 +232,216 @@ async def health_check():
     }
 
 
-@app.post("/context/file", response_model=ContextResponse)
-async def analyze_file_context(request: ContextRequest):
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus metrics: per-stage latency, cache, fallback, error and token counters"""
+    return PlainTextResponse(metrics.render_latest(), media_type="text/plain; version=0.0.4")
+
+
+async def _prepare_analysis(request: ContextRequest):
     """
-    Main endpoint: Analyze a file and return summary, design decisions, and related files
+    Validate an analysis request, read the file and compute its cache key
     
     Args:
-        request: ContextRequest with repo_path, file_path, and optional selected_code
+        request: ContextRequest; repo_path falls back to the file's directory
         
     Returns:
-        ContextResponse with summary, decisions, related_files, and optional weird_code_explanation
+        (file_content, provider, analysis_key)
     """
-    logger.info(f"Analyzing file: {request.file_path} in repo: {request.repo_path}")
+    # Step 1: Validate inputs
+    if not os.path.exists(request.file_path):
+        logger.error(f"File does not exist: {request.file_path}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"File does not exist: {request.file_path}"
+        )
     
+    # Repo path is optional - if not provided or doesn't exist, we'll analyze without Git
+    if not request.repo_path or not os.path.exists(request.repo_path):
+        logger.info("Repo path not provided or doesn't exist. Analyzing file without Git history.")
+        request.repo_path = os.path.dirname(request.file_path)  # Use file's directory as fallback
+    
+    # Step 2: Read current file content
+    logger.info("Reading file content...")
     try:
-        # Step 1: Validate inputs
-        if not os.path.exists(request.file_path):
-            logger.error(f"File does not exist: {request.file_path}")
-            raise HTTPException(
-                status_code=400,
-                detail=f"File does not exist: {request.file_path}"
-            )
-        
-        # Repo path is optional - if not provided or doesn't exist, we'll analyze without Git
-        if not request.repo_path or not os.path.exists(request.repo_path):
-            logger.info("Repo path not provided or doesn't exist. Analyzing file without Git history.")
-            request.repo_path = os.path.dirname(request.file_path)  # Use file's directory as fallback
-        
-        # Step 2: Try to get commit history (graceful degradation if not a Git repo)
-        logger.info("Fetching commit history...")
-        commits = []
-        try:
-            commits = get_commit_history(
+        with metrics.observe_stage("file_read"):
+            file_content = read_file_content(request.file_path)
+    except ValueError as e:
+        logger.error(f"File read error: {str(e)}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Could not read file: {str(e)}"
+        )
+    
+    # Step 3: Get LLM provider
+    logger.info("Initializing LLM provider...")
+    provider_config = {}
+    if request.llm_model:
+        provider_config['model'] = request.llm_model
+    
+    provider = get_llm_provider(
+        provider_name=request.llm_provider,
+        config=provider_config
+    )
+    logger.info(f"Using LLM provider: {provider.get_provider_name()}")
+    
+    # Step 4: The cache key covers everything the analysis depends on (file
+    # content, HEAD, provider, model, prompt version, request options) and is
+    # also the ETag
+    head = await run_in_threadpool(get_head_sha, request.repo_path)
+    analysis_key = cache_key(
+        os.path.realpath(request.file_path),
+        content_hash(file_content),
+        head,
+        provider.get_provider_name(),
+        getattr(provider, "model", ""),
+        content_hash(request.selected_code),
+        request.commit_limit,
+        provider.analysis_prompt_version
+    )
+    return file_content, provider, analysis_key
+
+
+async def _run_analysis(request: ContextRequest, provider, file_content: str, analysis_key: str):
+    """
+    Git history, related files and the LLM analysis of a prepared request;
+    real analyses (not fallbacks) are written to the analysis cache
+    
+    Returns:
+        (ContextResponse, related_files_data, fallback)
+    """
+    provider_label = provider.get_provider_name()
+    model_label = getattr(provider, "model", "")
+    
+    # Step 5: Try to get commit history (graceful degradation if not a Git repo)
+    logger.info("Fetching commit history...")
+    commits = []
+    try:
+        # GitPython is synchronous: run Git work in the threadpool
+        with metrics.observe_stage("commit_history"):
+            commits = await run_in_threadpool(
+                get_commit_history,
                 repo_path=request.repo_path,
                 file_path=request.file_path,
                 limit=request.commit_limit
             )
-            
-            if not commits:
-                logger.warning("No commit history found for this file")
-        except ValueError as e:
-            # Not a Git repository - continue without Git history
-            logger.warning(f"Git not available: {str(e)}. Continuing with file-only analysis.")
-            commits = []
-        
-        # Step 3: Read current file content
-        logger.info("Reading file content...")
-        try:
-            file_content = read_file_content(request.file_path)
-        except ValueError as e:
-            logger.error(f"File read error: {str(e)}")
-            raise HTTPException(
-                status_code=400,
-                detail=f"Could not read file: {str(e)}"
-            )
         
-        # Step 4: Compute related files (imports + co-changed files if Git available)
-        logger.info("Computing related files...")
-        try:
-            related_files_data = get_related_files(
+        if not commits:
+            logger.warning("No commit history found for this file")
+    except ValueError as e:
+        # Not a Git repository - continue without Git history
+        logger.warning(f"Git not available: {str(e)}. Continuing with file-only analysis.")
+        commits = []
+    
+    # Step 6: Compute related files (imports + co-changed files if Git available)
+    logger.info("Computing related files...")
+    try:
+        with metrics.observe_stage("related_files"):
+            related_files_data = await run_in_threadpool(
+                get_related_files,
                 repo_path=request.repo_path,
                 file_path=request.file_path,
                 file_content=file_content
             )
-        except Exception as e:
-            # If Git operations fail, just use imports
-            logger.warning(f"Could not analyze co-changed files: {str(e)}. Using imports only.")
-            from git_utils import extract_imports
-            related_files_data = {
-                'imports': extract_imports(file_content, request.file_path),
-                'co_changed': []
-            }
+    except Exception as e:
+        # If Git operations fail, just use imports
+        logger.warning(f"Could not analyze co-changed files: {str(e)}. Using imports only.")
+        from git_utils import extract_imports
+        related_files_data = {
+            'imports': extract_imports(file_content, request.file_path),
+            'co_changed': []
+        }
+    
+    # Step 7: Call provider to analyze
+    logger.info("Calling LLM provider for analysis...")
+    try:
+        response = await provider.generate(
+            file_path=request.file_path,
+            file_content=file_content,
+            commits=commits,
+            related_files_data=related_files_data,
+            selected_code=request.selected_code
+        )
+    except Exception:
+        metrics.record_provider_error(provider_label, model_label)
+        raise
+    
+    fallback = False
+    for reason in ("parse_error", "mock_response", "text_response"):
+        if response.metadata.get(reason):
+            metrics.record_fallback(reason, provider_label, model_label)
+            fallback = True
+    
+    # Only cache real analyses, so a later request can retry after a fallback
+    store = get_store()
+    if not fallback and store:
+        await store.aset("analysis", analysis_key, response.model_dump())
+    
+    logger.info(f"Analysis complete. Analyzed {len(commits)} commits.")
+    return response, related_files_data, fallback
+
+
+@app.post("/context/file", response_model=ContextResponse)
+async def analyze_file_context(request: ContextRequest, http_request: Request, http_response: Response):
+    """
+    Main endpoint: Analyze a file and return summary, design decisions, and related files
+    
+    Successful analyses carry an ETag; sending it back in If-None-Match returns
+    304 when the file, HEAD, provider, model and prompt version are unchanged.
+    Afterwards the top related files are prefetched in the background (see prefetch.py).
+    
+    Args:
+        request: ContextRequest with repo_path, file_path, and optional selected_code
         
-        # Step 5: Get LLM provider and analyze
-        logger.info("Initializing LLM provider...")
-        provider_config = {}
-        if request.llm_model:
-            provider_config['model'] = request.llm_model
+    Returns:
+        ContextResponse with summary, decisions, related_files, and optional weird_code_explanation
+    """
+    logger.info(f"Analyzing file: {request.file_path} in repo: {request.repo_path}")
+    
+    try:
+        file_content, provider, analysis_key = await _prepare_analysis(request)
+        provider_label = provider.get_provider_name()
         
-        provider = get_llm_provider(
-            provider_name=request.llm_provider,
-            config=provider_config
-        )
+        # An unchanged file is answered with 304, or from the shared analysis
+        # cache (possibly filled by a prefetch), without any Git or LLM work
+        etag = etags.etag_for(analysis_key)
+        if etags.not_modified(http_request, etag):
+            logger.info("Analysis not modified")
+            return etags.not_modified_response(etag, "context_file")
         
-        logger.info(f"Using LLM provider: {provider.get_provider_name()}")
+        store = get_store()
+        if store:
+            cached = await store.aget("analysis", analysis_key)
+            joined = False
+            if cached is None and await prefetch.prefetcher.join(analysis_key):
+                # The file was being prefetched: its result is in the cache now
+                joined = True
+                cached = await store.aget("analysis", analysis_key)
+            metrics.record_cache(cached is not None)
+            if cached is not None:
+                logger.info("Analysis cache hit")
+                await prefetch.prefetcher.record_hit(analysis_key, "joined" if joined else "cached")
+                http_response.headers["ETag"] = etag
+                return ContextResponse(**cached)
         
         # Check if provider is available
-        if not provider.is_available():
-            logger.warning(f"Provider {provider.get_provider_name()} is not available")
-            if provider.get_provider_name() in ["ollama", "localai"]:
+        if not await run_in_threadpool(provider.is_available):
+            logger.warning(f"Provider {provider_label} is not available")
+            if provider_label in ["ollama", "localai"]:
                 raise HTTPException(
                     status_code=503,
-                    detail=f"Local LLM server not running. Please start {provider.get_provider_name().title()}."
+                    detail=f"Local LLM server not running. Please start {provider_label.title()}."
                 )
         
-        # Call provider to analyze
-        logger.info("Calling LLM provider for analysis...")
-        response = await provider.generate(
-            file_path=request.file_path,
-            file_content=file_content,
-            commits=commits,
-            related_files_data=related_files_data,
-            selected_code=request.selected_code
-        )
+        async with prefetch.prefetcher.busy():
+            response, related_files_data, fallback = await _run_analysis(
+                request, provider, file_content, analysis_key
+            )
         
-        logger.info(f"Analysis complete. Analyzed {len(commits)} commits.")
+        # Only tag real analyses; fallbacks are not worth prefetching around either
+        if not fallback:
+            http_response.headers["ETag"] = etag
+            prefetch.prefetcher.enqueue(request, related_files_data)
         return response
         
     except HTTPException:
@@ -192,15 +455,41 @@ async def analyze_file_context(request: ContextRequest):
 
 
 if __name__ == "__main__":
+    import argparse
     import uvicorn
     
-    port = int(os.getenv("PORT", "8000"))
-    logger.info(f"Starting ContextWeave Lite API on port {port}")
+    parser = argparse.ArgumentParser(description="ContextWeave Lite API")
+    parser.add_argument("--production", action="store_true",
+                        help="Run without the reloader, with multiple worker processes")
+    parser.add_argument("--workers", type=int,
+                        default=int(os.getenv("WORKERS", os.getenv("WEB_CONCURRENCY", "0"))),
+                        help="Worker processes in production mode (default: CPU count)")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    args = parser.parse_args()
     
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=port,
-        reload=True,
-        log_level="info"
-    )
+    production = args.production or os.getenv("PRODUCTION", "0") == "1"
+    
+    if production:
+        # Workers share caches through the SQLite store (see store.py);
+        # metrics and admin state stay per worker
+        workers = args.workers or os.cpu_count() or 1
+        logger.info(f"Starting ContextWeave Lite API on port {args.port} ({workers} workers)")
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            reload=False,
+            log_level="info"
+        )
+    else:
+        # Development: single process with auto-reload (what the VS Code extension runs)
+        logger.info(f"Starting ContextWeave Lite API on port {args.port}")
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            reload=True,
+            log_level="info"
+        )
@@ -0,0 +1,188 @@
+"""
+Memory accounting
+Exports process RSS, tracks per-request peak Python heap for the heavy
+endpoints, and keeps tracemalloc snapshots that admins can take and diff to
+find leaking allocation sites.
+
+Per-request peaks need tracemalloc to be running: set MEMORY_TRACKING=1 to
+start it at import time, or take a snapshot through /admin/memory/snapshot.
+tracemalloc's peak counter is process-wide, so when several heavy requests
+overlap each one reports the peak of the overlapping window (an upper bound).
+
+Environment:
+    MEMORY_TRACKING          "1" to start tracemalloc at startup (default: off)
+    TRACEMALLOC_FRAMES       Stack depth recorded per allocation (default: 10)
+"""
+import itertools
+import logging
+import os
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+HEAVY_ENDPOINTS = {"/context/file", "/v1/explain", "/v1/chat", "/v1/labs/evaluate"}
+MAX_SNAPSHOTS = 5
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "10"))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> float:
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return float(int(f.read().split()[1]) * _PAGE_SIZE)
+    except OSError:
+        import resource
+        # ru_maxrss is the high-water mark (KiB on Linux, bytes on macOS)
+        return float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+PROCESS_RSS = metrics.Gauge(
+    "contextweave_process_resident_memory_bytes",
+    "Resident set size of the backend process",
+    function=rss_bytes
+)
+
+TRACED_MEMORY = metrics.Gauge(
+    "contextweave_tracemalloc_traced_bytes",
+    "Python heap currently tracked by tracemalloc (0 when tracing is off)",
+    function=lambda: tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+)
+
+REQUEST_PEAK_MEMORY = metrics.Histogram(
+    "contextweave_request_peak_memory_bytes",
+    "Peak Python heap growth while serving a heavy request (requires tracemalloc)",
+    ["endpoint"],
+    buckets=(64e3, 256e3, 1e6, 4e6, 16e6, 64e6, 256e6, 1e9)
+)
+
+
+def start_tracing():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        logger.info(f"tracemalloc started ({TRACEMALLOC_FRAMES} frames)")
+
+
+def stop_tracing():
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+        _snapshots.clear()
+        logger.info("tracemalloc stopped")
+
+
+# Snapshot store
+
+_snapshots: "OrderedDict[int, Dict]" = OrderedDict()
+_snapshot_ids = itertools.count(1)
+
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def _format_stat(stat) -> Dict:
+    frame = stat.traceback[0]
+    entry = {
+        "site": f"{frame.filename}:{frame.lineno}",
+        "size_bytes": stat.size,
+        "count": stat.count,
+    }
+    if hasattr(stat, "size_diff"):
+        entry["size_diff_bytes"] = stat.size_diff
+        entry["count_diff"] = stat.count_diff
+    return entry
+
+
+def take_snapshot(top: int = 20) -> Dict:
+    """Take a tracemalloc snapshot, keep it for diffing, and return top sites"""
+    start_tracing()
+    snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+    snapshot_id = next(_snapshot_ids)
+    _snapshots[snapshot_id] = {"snapshot": snapshot, "taken_at": time.time()}
+    while len(_snapshots) > MAX_SNAPSHOTS:
+        _snapshots.popitem(last=False)
+
+    stats = snapshot.statistics("lineno")
+    return {
+        "id": snapshot_id,
+        "total_bytes": sum(s.size for s in stats),
+        "top": [_format_stat(s) for s in stats[:top]],
+    }
+
+
+def diff_snapshots(base_id: int, current_id: Optional[int] = None, top: int = 20) -> Optional[Dict]:
+    """Compare two stored snapshots (or a stored one against a fresh snapshot)"""
+    base = _snapshots.get(base_id)
+    if base is None:
+        return None
+    if current_id is None:
+        current_id = take_snapshot(top=0)["id"]
+    current = _snapshots.get(current_id)
+    if current is None:
+        return None
+
+    stats = current["snapshot"].compare_to(base["snapshot"], "lineno")
+    return {
+        "base": base_id,
+        "current": current_id,
+        "elapsed_s": round(current["taken_at"] - base["taken_at"], 1),
+        "total_diff_bytes": sum(s.size_diff for s in stats),
+        "top": [_format_stat(s) for s in stats[:top]],
+    }
+
+
+def status() -> Dict:
+    """Summary of process memory and stored snapshots"""
+    traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+    return {
+        "rss_bytes": int(rss_bytes()),
+        "tracemalloc": tracemalloc.is_tracing(),
+        "traced_bytes": traced,
+        "traced_peak_bytes": peak,
+        "snapshots": [
+            {"id": sid, "taken_at": entry["taken_at"]} for sid, entry in _snapshots.items()
+        ],
+    }
+
+
+class MemoryTrackingMiddleware:
+    """ASGI middleware that records peak heap growth for heavy endpoints"""
+
+    def __init__(self, app):
+        self.app = app
+        self._in_flight = 0
+        self._window_base = 0
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["path"] not in HEAVY_ENDPOINTS
+            or not tracemalloc.is_tracing()
+        ):
+            return await self.app(scope, receive, send)
+
+        if self._in_flight == 0:
+            tracemalloc.reset_peak()
+            self._window_base = tracemalloc.get_traced_memory()[0]
+        self._in_flight += 1
+        base = self._window_base
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._in_flight -= 1
+            if tracemalloc.is_tracing():
+                peak = tracemalloc.get_traced_memory()[1]
+                REQUEST_PEAK_MEMORY.observe(max(peak - base, 0), endpoint=scope["path"])
+
+
+if os.getenv("MEMORY_TRACKING", "") == "1":
+    start_tracing()
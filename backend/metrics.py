@@ -0,0 +1,226 @@
+"""
+Lightweight Prometheus-style metrics
+Per-stage latency histograms and counters for cache hits, fallbacks,
+provider errors and token usage, rendered in the text exposition format
+served at /metrics.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import tracing
+
+# Endpoint currently being served (set by the HTTP middleware in main.py)
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="unknown")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_REGISTRY: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base class holding name, help text and label names"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, optionally computed at scrape time"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), function=None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function = function
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            return [f"{self.name} {self._function()}"]
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> (bucket counts, sum, count)
+        self._values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = [[0] * len(self.buckets), 0.0, 0]
+                self._values[key] = entry
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', repr(bound)))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def render_latest() -> str:
+    """Render all registered metrics in Prometheus text exposition format"""
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Metric definitions
+
+REQUEST_DURATION = Histogram(
+    "contextweave_request_duration_seconds",
+    "End-to-end HTTP request latency",
+    ["endpoint", "method", "status"]
+)
+
+STAGE_DURATION = Histogram(
+    "contextweave_stage_duration_seconds",
+    "Latency of individual pipeline stages (commit_history, file_read, related_files, tokenize, prompt_build, llm_call, response_parse)",
+    ["endpoint", "stage", "provider", "model"]
+)
+
+CACHE_REQUESTS = Counter(
+    "contextweave_cache_requests_total",
+    "Analysis cache lookups by result (hit or miss)",
+    ["endpoint", "result"]
+)
+
+FALLBACKS = Counter(
+    "contextweave_fallbacks_total",
+    "Responses served from a fallback path (parse_error, mock_response, text_response)",
+    ["endpoint", "provider", "model", "reason"]
+)
+
+PROVIDER_ERRORS = Counter(
+    "contextweave_provider_errors_total",
+    "LLM provider calls that raised an error",
+    ["endpoint", "provider", "model"]
+)
+
+TOKENS = Counter(
+    "contextweave_llm_tokens_total",
+    "Tokens reported by the LLM provider",
+    ["endpoint", "provider", "model", "kind"]
+)
+
+
+@contextmanager
+def observe_stage(stage: str, provider: str = "", model: str = "") -> Iterator[None]:
+    """Time a pipeline stage, record it under the current endpoint and trace it"""
+    start = time.perf_counter()
+    try:
+        with tracing.span(stage, provider=provider, model=model):
+            yield
+    finally:
+        STAGE_DURATION.observe(
+            time.perf_counter() - start,
+            endpoint=current_endpoint.get(),
+            stage=stage,
+            provider=provider,
+            model=model
+        )
+
+
+def record_cache(hit: bool):
+    CACHE_REQUESTS.inc(endpoint=current_endpoint.get(), result="hit" if hit else "miss")
+
+
+def record_fallback(reason: str, provider: str = "", model: str = ""):
+    FALLBACKS.inc(endpoint=current_endpoint.get(), provider=provider, model=model, reason=reason)
+
+
+def record_provider_error(provider: str, model: str = ""):
+    PROVIDER_ERRORS.inc(endpoint=current_endpoint.get(), provider=provider, model=model)
+
+
+def record_tokens(provider: str, model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+    endpoint = current_endpoint.get()
+    if prompt_tokens:
+        TOKENS.inc(prompt_tokens, endpoint=endpoint, provider=provider, model=model, kind="prompt")
+    if completion_tokens:
+        TOKENS.inc(completion_tokens, endpoint=endpoint, provider=provider, model=model, kind="completion")
@@ -0,0 +1,352 @@
+"""
+Speculative analysis of the files a student is likely to open next
+After /context/file analyzes a file, its top related files (co-changed and
+imported, alternately) are queued for a background analysis with the same
+provider, model and options, so opening one of them next is a cache hit.
+
+Prefetches run one at a time per worker, newest first, and only while the
+providers are idle: no LLM call from a request or batch job in flight in any
+worker and none finished within PREFETCH_IDLE_MS. Each worker publishes its
+foreground activity in the shared store, so with several workers (production
+mode) one busy worker holds back the prefetches of all of them. A foreground
+LLM call that starts meanwhile cancels the running prefetch, which is queued
+again: at once in the same worker, within PREFETCH_IDLE_MS in the others. A
+/context/file request for the very file being prefetched by its own worker
+waits for it instead. Each repo may spend PREFETCH_BUDGET LLM analyses per
+PREFETCH_WINDOW_S, counted in the shared store across workers (files whose
+analysis is already cached, and providers that are down, cost nothing).
+
+Prefetched analyses are marked in the store, and the first /context/file
+request served from one is counted in contextweave_prefetch_hits_total:
+hits / contextweave_prefetch_total{result="analyzed"} is the share of
+prefetches that were used.
+
+Environment:
+    PREFETCH            0 disables prefetching (default: 1)
+    PREFETCH_FILES      Related files queued per analysis (default: 3)
+    PREFETCH_BUDGET     Prefetch analyses per repo per window (default: 30)
+    PREFETCH_WINDOW_S   Budget window in seconds (default: 3600)
+    PREFETCH_IDLE_MS    Quiet time after the last foreground request (default: 500)
+    PREFETCH_QUEUE      Queued prefetches kept per process; the oldest are dropped (default: 50)
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from itertools import zip_longest
+from typing import Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+from llm.provider_factory import provider_slots
+from schemas import ContextRequest
+from store import cache_key, content_hash, get_store, register_durable
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("PREFETCH", "1") != "0"
+FILES = int(os.getenv("PREFETCH_FILES", "3"))
+BUDGET = int(os.getenv("PREFETCH_BUDGET", "30"))
+WINDOW = float(os.getenv("PREFETCH_WINDOW_S", "3600"))
+IDLE = float(os.getenv("PREFETCH_IDLE_MS", "500")) / 1000
+QUEUE_LIMIT = int(os.getenv("PREFETCH_QUEUE", "50"))
+# A prefetch cancelled this many times by foreground requests is dropped
+MAX_PREEMPTIONS = 2
+# Lifetime of a worker's published activity; rewritten every third of it while busy
+ACTIVITY_TTL = 60.0
+# How often the other workers' activity is read while they are busy or a prefetch runs
+ACTIVITY_POLL = max(IDLE, 0.1)
+
+NS_MARK = "prefetched"
+NS_BUDGET = "prefetch_budget"
+NS_ACTIVITY = "prefetch_activity"
+# Losing the spend counter would reset the daily budget
+register_durable(NS_BUDGET)
+
+PREFETCHES = metrics.Counter(
+    "contextweave_prefetch_total",
+    "Related-file prefetches, by result (queued, analyzed, cached, over_budget, "
+    "fallback, unavailable, preempted, dropped, failed)",
+    ["result"]
+)
+
+PREFETCH_HITS = metrics.Counter(
+    "contextweave_prefetch_hits_total",
+    "/context/file requests served by a prefetched analysis: from the cache, "
+    "or joined while the prefetch was running",
+    ["how"]
+)
+
+
+def related_paths(repo_path: str, file_path: str, related_files_data: Dict, limit: int = FILES) -> List[str]:
+    """
+    Existing files in the repo a student is likely to open after file_path
+
+    Args:
+        repo_path: Repository root
+        file_path: File that was just analyzed
+        related_files_data: get_related_files() result ({"imports", "co_changed"})
+        limit: Most paths returned
+
+    Returns:
+        Absolute paths, most likely first: co-changed and imported files alternately
+    """
+    root = os.path.realpath(repo_path)
+    seen = {os.path.realpath(file_path)}
+    paths = []
+    co_changed = [entry.get("path") if isinstance(entry, dict) else entry
+                  for entry in related_files_data.get("co_changed", [])]
+    for candidates in zip_longest(co_changed, related_files_data.get("imports", [])):
+        for relative in filter(None, candidates):
+            # Imports are relative to the importing file or to the repo root
+            for base in (root, os.path.dirname(file_path)):
+                path = os.path.realpath(os.path.join(base, relative))
+                if path not in seen and os.path.commonpath([root, path]) == root and os.path.isfile(path):
+                    seen.add(path)
+                    paths.append(path)
+                    break
+            if len(paths) >= limit:
+                return paths
+    return paths
+
+
+class Prefetcher:
+    """Queue and background worker for related-file analyses in this process"""
+
+    def __init__(self):
+        # job id -> {"request", "repo", "paid", "preempted"}; newest last
+        self.queue: "OrderedDict[str, Dict]" = OrderedDict()
+        self._prepare = None
+        self._analyze = None
+        self._active = 0
+        self._last_foreground = 0.0
+        self._wake: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        # {"id", "key", "task"} of the prefetch being analyzed
+        self._running: Optional[Dict] = None
+        # This worker's foreground activity, as the other workers see it in the store
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._last_foreground_at = 0.0
+        self._activity_changed: Optional[asyncio.Event] = None
+        self._publisher: Optional[asyncio.Task] = None
+
+    def start(self, prepare, analyze):
+        """
+        Start the worker (needs the shared store: prefetches are only useful through the analysis cache)
+
+        Args:
+            prepare: async (ContextRequest) -> (file_content, provider, analysis_key)
+            analyze: async (ContextRequest, provider, file_content, analysis_key)
+                -> (ContextResponse, related_files_data, fallback); caches real analyses
+        """
+        if not ENABLED or not get_store() or self._worker:
+            return
+        self._prepare, self._analyze = prepare, analyze
+        self._wake = asyncio.Event()
+        self._activity_changed = asyncio.Event()
+        self._worker = asyncio.create_task(self._run())
+        self._publisher = asyncio.create_task(self._publish_activity())
+
+    def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+        if self._publisher:
+            self._publisher.cancel()
+            self._publisher = None
+        if self._running:
+            self._running["task"].cancel()
+
+    def enqueue(self, request: ContextRequest, related_files_data: Dict) -> int:
+        """Queue the top related files of an analyzed file; returns how many were queued"""
+        if not self._worker:
+            return 0
+        paths = related_paths(request.repo_path, request.file_path, related_files_data)
+        repo = content_hash(os.path.realpath(request.repo_path))[:16]
+        # Reversed, so the most likely file is at the end and runs first
+        for path in reversed(paths):
+            job_id = cache_key(path, request.llm_provider, request.llm_model, request.commit_limit)
+            if job_id in self.queue:
+                self.queue.move_to_end(job_id)
+                continue
+            if self._running and self._running["id"] == job_id:
+                continue
+            self.queue[job_id] = {
+                "request": ContextRequest(
+                    repo_path=request.repo_path,
+                    file_path=path,
+                    commit_limit=request.commit_limit,
+                    llm_provider=request.llm_provider,
+                    llm_model=request.llm_model,
+                ),
+                "repo": repo,
+                "paid": False,
+                "preempted": 0,
+            }
+            PREFETCHES.inc(result="queued")
+        while len(self.queue) > QUEUE_LIMIT:
+            self.queue.popitem(last=False)
+            PREFETCHES.inc(result="dropped")
+        if paths:
+            self._wake.set()
+        return len(paths)
+
+    @asynccontextmanager
+    async def busy(self):
+        """Marks foreground LLM work: cancels the running prefetch and holds new ones back until it ends"""
+        self._active += 1
+        if self._running:
+            self._running["task"].cancel()
+        if self._activity_changed:
+            self._activity_changed.set()
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._last_foreground = time.monotonic()
+            self._last_foreground_at = time.time()
+            if self._wake:
+                self._wake.set()
+                self._activity_changed.set()
+
+    async def join(self, analysis_key: str) -> bool:
+        """Wait for the running prefetch if it is analyzing analysis_key; True if there was one"""
+        running = self._running
+        if not running or running["key"] != analysis_key:
+            return False
+        # asyncio.wait: a client disconnecting here does not cancel the prefetch
+        await asyncio.wait({running["task"]})
+        return True
+
+    async def record_hit(self, analysis_key: str, how: str):
+        """Count the first cache hit on a prefetched analysis"""
+        store = get_store()
+        if not ENABLED or not store or await store.aget(NS_MARK, analysis_key) is None:
+            return
+        await store.adelete(NS_MARK, analysis_key)
+        PREFETCH_HITS.inc(how=how)
+
+    async def _spend_budget(self, repo: str) -> bool:
+        """Take one prefetch from the repo's budget for the current window"""
+        store = get_store()
+        key = f"{repo}:{int(time.time() // WINDOW)}"
+        for _ in range(5):
+            used = await store.aget(NS_BUDGET, key)
+            if used is not None and used >= BUDGET:
+                return False
+            # used is None creates the window only if no other worker did first
+            if await store.acompare_and_set(NS_BUDGET, key, used, (used or 0) + 1, ttl=WINDOW):
+                return True
+        return False
+
+    async def _publish_activity(self):
+        """Keep this worker's in-flight count and last foreground call in the store"""
+        store = get_store()
+        while True:
+            self._activity_changed.clear()
+            await store.aset(NS_ACTIVITY, self.worker_id, {
+                "active": self._active, "last": self._last_foreground_at,
+            }, ttl=ACTIVITY_TTL)
+            try:
+                # Rewritten before it expires while busy; an idle worker's entry may lapse
+                await asyncio.wait_for(self._activity_changed.wait(), ACTIVITY_TTL / 3 if self._active else None)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _others_quiet_in(self) -> float:
+        """Seconds until the other workers have been idle for PREFETCH_IDLE_MS (0: they have)"""
+        now = time.time()
+        wait = 0.0
+        for worker_id, activity in await get_store().aitems(NS_ACTIVITY):
+            if worker_id == self.worker_id:
+                continue
+            # A busy worker is checked again after ACTIVITY_POLL
+            wait = max(wait, ACTIVITY_POLL if activity.get("active") else IDLE - (now - activity.get("last", 0.0)))
+        return wait
+
+    async def _others_busy(self) -> bool:
+        return any(
+            activity.get("active") for worker_id, activity in await get_store().aitems(NS_ACTIVITY)
+            if worker_id != self.worker_id
+        )
+
+    async def _wait_idle(self):
+        while True:
+            if self.queue and self._active == 0:
+                quiet = IDLE - (time.monotonic() - self._last_foreground)
+                if quiet <= 0:
+                    quiet = await self._others_quiet_in()
+                if quiet <= 0 and self._active == 0:
+                    return
+                await asyncio.sleep(quiet)
+                continue
+            self._wake.clear()
+            await self._wake.wait()
+
+    async def _prefetch(self, job: Dict) -> str:
+        request = job["request"]
+        file_content, provider, analysis_key = await self._prepare(request)
+        self._running["key"] = analysis_key
+        store = get_store()
+        if await store.aget("analysis", analysis_key) is not None:
+            return "cached"
+        # Before the budget: an unreachable provider must not use it up
+        if not await run_in_threadpool(provider.is_available):
+            return "unavailable"
+        if not job["paid"]:
+            if not await self._spend_budget(job["repo"]):
+                return "over_budget"
+            job["paid"] = True
+        async with provider_slots(provider):
+            _, _, fallback = await self._analyze(request, provider, file_content, analysis_key)
+        if fallback:
+            return "fallback"
+        await store.aset(NS_MARK, analysis_key, {"file": request.file_path, "at": time.time()})
+        return "analyzed"
+
+    async def _run(self):
+        while True:
+            await self._wait_idle()
+            job_id, job = self.queue.popitem()
+            task = asyncio.create_task(self._prefetch(job))
+            self._running = {"id": job_id, "key": None, "task": task}
+            try:
+                # Other workers cannot cancel it directly: check their activity meanwhile
+                while not (await asyncio.wait({task}, timeout=ACTIVITY_POLL))[0]:
+                    if await self._others_busy():
+                        task.cancel()
+                        await asyncio.wait({task})
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+            finally:
+                self._running = None
+
+            if task.cancelled():
+                # Counted every time; queued again (as the newest job) until MAX_PREEMPTIONS
+                PREFETCHES.inc(result="preempted")
+                job["preempted"] += 1
+                if job["preempted"] < MAX_PREEMPTIONS and job_id not in self.queue:
+                    self.queue[job_id] = job
+                continue
+            if task.exception() is not None:
+                logger.warning(f"Prefetch of {job['request'].file_path} failed: {task.exception()}")
+                result = "failed"
+            else:
+                result = task.result()
+            logger.info(f"Prefetch of {job['request'].file_path}: {result}")
+            PREFETCHES.inc(result=result)
+
+
+prefetcher = Prefetcher()
+
+QUEUE_DEPTH = metrics.Gauge(
+    "contextweave_prefetch_queue",
+    "Related-file prefetches waiting for the providers to go idle",
+    function=lambda: len(prefetcher.queue)
+)
@@ -0,0 +1,189 @@
+"""
+On-demand per-request CPU profiling
+An admin can run a single request under a sampling profiler by sending
+`X-Profile: 1` (or `?profile=1`) together with a valid `X-Admin-Token`. The
+sampler walks the stacks of the event-loop thread and of the threadpool
+workers (where Git, tokenization and other blocking work runs) every
+PROFILE_INTERVAL_MS, and writes the result in collapsed-stack ("folded")
+format, which flamegraph.pl, speedscope and inferno read directly. Each stack
+starts with the thread it ran on ("event-loop" or "threadpool"); workers
+waiting for a job are not counted.
+
+Requests without the flag go straight to the app: the middleware only inspects
+the scope, so there is no profiling overhead.
+
+Note: samples cover everything running on the event loop and the threadpool
+while the request is in flight, so profile on an otherwise idle backend for
+clean results.
+
+Environment:
+    ADMIN_TOKEN           Shared secret for admin features (disabled when unset)
+    PROFILE_DIR           Where reports are written (default: profiles)
+    PROFILE_INTERVAL_MS   Sampling interval in milliseconds (default: 1)
+"""
+import logging
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "1")) / 1000.0
+
+# Innermost frames seen while the event loop waits for I/O rather than burning
+# CPU (selector-based asyncio, or uvloop where the wait happens in C)
+_IDLE_FRAMES = {"select", "poll", "_run_once", "run_forever", "run_until_complete"}
+
+# run_in_threadpool runs on AnyIO's worker threads; an idle worker blocks in
+# queue.get(), i.e. in threading.Condition.wait()
+_WORKER_THREAD_PREFIX = "AnyIO worker thread"
+
+
+def is_admin(token: Optional[str]) -> bool:
+    """Check a caller-supplied token against ADMIN_TOKEN"""
+    expected = os.getenv("ADMIN_TOKEN", "")
+    return bool(expected and token and secrets.compare_digest(token, expected))
+
+
+class SamplingProfiler:
+    """Periodically sample the event-loop thread's and threadpool workers' stacks into folded-stack counts"""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.idle_samples = 0
+        self._workers: set = set()
+        self._seen: set = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.is_set():
+            frames = sys._current_frames()
+            if not self._seen.issuperset(frames):
+                # The threadpool grows on demand; look up thread names only when threads changed
+                self._seen = set(frames)
+                self._workers = {
+                    thread.ident for thread in threading.enumerate()
+                    if thread.name.startswith(_WORKER_THREAD_PREFIX)
+                }
+            frame = frames.get(self.thread_id)
+            if frame is not None:
+                if frame.f_code.co_name in _IDLE_FRAMES or frame.f_code.co_filename.endswith("runners.py"):
+                    self.idle_samples += 1
+                else:
+                    self.samples["event-loop;" + self._fold(frame)] += 1
+            for ident in self._workers:
+                frame = frames.get(ident)
+                if frame is not None and not (
+                    frame.f_code.co_name == "wait" and frame.f_code.co_filename.endswith("threading.py")
+                ):
+                    self.samples["threadpool;" + self._fold(frame)] += 1
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _fold(frame) -> str:
+        stack: List[str] = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+
+def new_report_name(path: str) -> str:
+    """Generate a unique report file name for a request path"""
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{secrets.token_hex(3)}.folded"
+
+
+def write_report(samples: Counter, name: str):
+    """Write folded stacks to PROFILE_DIR/name"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, name), "w", encoding="utf-8") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+def list_reports() -> List[Dict]:
+    """List stored profile reports, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    reports = []
+    for name in os.listdir(PROFILE_DIR):
+        if not name.endswith(".folded"):
+            continue
+        stat = os.stat(os.path.join(PROFILE_DIR, name))
+        reports.append({"name": name, "size_bytes": stat.st_size, "created": stat.st_mtime})
+    return sorted(reports, key=lambda r: r["created"], reverse=True)
+
+
+def report_path(name: str) -> Optional[str]:
+    """Resolve a report name to a path inside PROFILE_DIR, rejecting traversal"""
+    if os.path.basename(name) != name or not name.endswith(".folded"):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def _wants_profile(scope) -> bool:
+    for name, value in scope.get("headers") or ():
+        if name == b"x-profile":
+            return value.lower() in (b"1", b"true")
+    query = scope.get("query_string", b"")
+    if b"profile" in query:
+        return parse_qs(query.decode("latin-1")).get("profile", [""])[0].lower() in ("1", "true")
+    return False
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles flagged, admin-authorized requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        if not is_admin(headers.get(b"x-admin-token", b"").decode("latin-1")):
+            logger.warning(f"Ignoring profile request without valid admin token: {scope['path']}")
+            return await self.app(scope, receive, send)
+
+        profiler = SamplingProfiler(threading.get_ident())
+        report_name = new_report_name(scope["path"])
+
+        async def send_with_report(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-report", report_name.encode("latin-1"))
+                ]
+            await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_report)
+        finally:
+            samples = profiler.stop()
+            write_report(samples, report_name)
+            logger.info(
+                f"Profiled {scope['method']} {scope['path']}: {sum(samples.values())} CPU samples, "
+                f"{profiler.idle_samples} idle samples -> {report_name}"
+            )
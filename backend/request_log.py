@@ -0,0 +1,137 @@
+"""
+Sampled, size-bounded structured request logging
+Replaces dumping whole request bodies to stdout. Each sampled request is logged
+as one JSON line in which code and file contents are replaced by a SHA-256
+prefix and length, long strings are truncated and long lists are cut, so log
+volume and serialization cost do not grow with payload size. Records go
+through a QueueHandler, so the event loop never waits on the log stream.
+
+Environment:
+    REQUEST_LOG_SAMPLING    Per-endpoint sample rates, e.g.
+                            "/v1/labs/evaluate=1.0,/v1/chat=0.25,*=0.1" (default: "*=1.0")
+    REQUEST_LOG_MAX_FIELD   Maximum characters kept per string field (default: 120)
+"""
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from typing import Any, Dict
+
+from pydantic import BaseModel
+
+import metrics
+
+# Fields whose values are source code: always hashed, never logged verbatim
+CODE_FIELDS = {"code", "content", "selected_code", "file_content"}
+MAX_FIELD_CHARS = int(os.getenv("REQUEST_LOG_MAX_FIELD", "120"))
+MAX_ITEMS = 10
+MAX_DEPTH = 4
+
+_sampled: ContextVar[bool] = ContextVar("request_log_sampled", default=False)
+
+
+def _parse_sampling(spec: str) -> Dict[str, float]:
+    rates = {}
+    for part in spec.split(","):
+        endpoint, _, rate = part.strip().partition("=")
+        if endpoint:
+            rates[endpoint] = float(rate or 1.0)
+    return rates
+
+
+SAMPLE_RATES = _parse_sampling(os.getenv("REQUEST_LOG_SAMPLING", "*=1.0"))
+
+
+def _fingerprint(text: str) -> Dict:
+    return {
+        "sha256": hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()[:16],
+        "chars": len(text),
+    }
+
+
+def summarize(value: Any, key: str = "", depth: int = 0) -> Any:
+    """Reduce a value to a bounded-size, code-free structure for logging"""
+    if isinstance(value, BaseModel):
+        value = {name: getattr(value, name) for name in type(value).model_fields}
+    if isinstance(value, str):
+        if key in CODE_FIELDS:
+            return _fingerprint(value)
+        if len(value) > MAX_FIELD_CHARS:
+            return value[:MAX_FIELD_CHARS] + f"...(+{len(value) - MAX_FIELD_CHARS} chars)"
+        return value
+    if depth >= MAX_DEPTH:
+        return f"<{type(value).__name__}>"
+    if isinstance(value, dict):
+        items = list(value.items())
+        result = {str(k): summarize(v, str(k), depth + 1) for k, v in items[:MAX_ITEMS]}
+        if len(items) > MAX_ITEMS:
+            result["_truncated_keys"] = len(items) - MAX_ITEMS
+        return result
+    if isinstance(value, (list, tuple)):
+        result = [summarize(v, key, depth + 1) for v in value[:MAX_ITEMS]]
+        if len(value) > MAX_ITEMS:
+            result.append({"_truncated_items": len(value) - MAX_ITEMS})
+        return result
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a record's structured payload as a single JSON line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {"ts": round(record.created, 3), "level": record.levelname}
+        payload.update(getattr(record, "payload", {"message": record.getMessage()}))
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Drop records instead of blocking or erroring when the queue is full"""
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+logger = logging.getLogger("contextweave.requests")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=10000)
+_stream_handler = logging.StreamHandler(sys.stderr)
+_stream_handler.setFormatter(JsonFormatter())
+logger.addHandler(_DroppingQueueHandler(_queue))
+_listener = logging.handlers.QueueListener(_queue, _stream_handler)
+_listener.start()
+atexit.register(_listener.stop)
+
+
+def _emit(event: str, fields: Dict):
+    payload = {"event": event, "endpoint": metrics.current_endpoint.get()}
+    payload.update(fields)
+    logger.info(event, extra={"payload": payload})
+
+
+def log_request(request: Any):
+    """Decide sampling for this request and log a bounded summary of it"""
+    endpoint = metrics.current_endpoint.get()
+    rate = SAMPLE_RATES.get(endpoint, SAMPLE_RATES.get("*", 1.0))
+    sampled = random.random() < rate
+    _sampled.set(sampled)
+    if sampled:
+        _emit("request", {"body": summarize(request), "sample_rate": rate})
+
+
+def log_llm_response(response: str):
+    """Log a fingerprint and short preview of the raw LLM output for a sampled request"""
+    if not _sampled.get():
+        return
+    text = response or ""
+    _emit("llm_response", {"response": _fingerprint(text), "preview": text[:MAX_FIELD_CHARS]})
@@ -0,0 +1,75 @@
+"""
+Admin-only diagnostics endpoints
+Gated by the X-Admin-Token header (see ADMIN_TOKEN in .env.example)
+"""
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+from typing import Optional
+
+import memory
+import profiling
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Reject callers without a valid admin token"""
+    if not profiling.is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiles")
+async def list_profiles():
+    """
+    List per-request CPU profiles captured with X-Profile: 1
+    """
+    return {"profiles": profiling.list_reports()}
+
+
+@router.get("/profiles/{name}")
+async def get_profile(name: str):
+    """
+    Download a profile in folded-stack format (flamegraph.pl / speedscope)
+    """
+    path = profiling.report_path(name)
+    if not path:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {name}")
+    return FileResponse(path, media_type="text/plain", filename=name)
+
+
+@router.get("/memory")
+async def memory_status():
+    """
+    Process RSS, tracemalloc totals and stored snapshot ids
+    """
+    return memory.status()
+
+
+# Snapshots take seconds on a large heap: plain `def` runs them in the threadpool
+@router.post("/memory/snapshot")
+def memory_snapshot(top: int = 20):
+    """
+    Take a tracemalloc snapshot (starting tracemalloc if needed) and return the top allocation sites
+    """
+    return memory.take_snapshot(top=top)
+
+
+@router.get("/memory/diff")
+def memory_diff(base: int, current: Optional[int] = None, top: int = 20):
+    """
+    Diff two snapshots; without `current`, diff `base` against a fresh snapshot
+    """
+    result = memory.diff_snapshots(base, current, top=top)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return result
+
+
+@router.post("/memory/stop")
+async def memory_stop():
+    """
+    Stop tracemalloc and drop stored snapshots
+    """
+    memory.stop_tracing()
+    return memory.status()
@@ -0,0 +1,128 @@
+"""
+Batch grading endpoints
+Grade a whole section against one rubric; poll or stream the results
+"""
+import asyncio
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, model_validator
+from typing import Dict, List, Optional
+
+import fast_json
+from batch_grading import grader
+from routers.labs import FileSubmission, LabTestCase
+from store import get_store
+
+router = APIRouter(prefix="/v1/labs", tags=["labs"])
+
+
+class BatchSubmission(BaseModel):
+    student_id: str
+    files: List[FileSubmission] = []
+
+
+class BatchGradeRequest(BaseModel):
+    submissions: List[BatchSubmission] = []
+    rubric: Dict[str, int] = {}
+    rubric_descriptions: Optional[Dict[str, str]] = None
+    mode: Optional[str] = "per_criterion"
+    test_cases: Optional[List[LabTestCase]] = None
+
+    @model_validator(mode="before")
+    @classmethod
+    def accept_rubric_file(cls, data):
+        """Also accept a rubric file as-is: {"criteria": {...}, "descriptions": {...}, "test_cases": [...]}"""
+        if isinstance(data, dict) and isinstance(data.get("rubric"), dict) and "criteria" in data["rubric"]:
+            rubric = data["rubric"]
+            data = dict(data, rubric=rubric["criteria"])
+            data.setdefault("rubric_descriptions", rubric.get("descriptions"))
+            data.setdefault("test_cases", rubric.get("test_cases"))
+        return data
+
+
+def _progress(job: Dict, results: Dict[str, Dict]) -> Dict:
+    statuses = [result.get("status") for result in results.values()]
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "students": len(job["students"]),
+        "unique_submissions": len(job["unique"]),
+        "graded": statuses.count("graded"),
+        "errors": statuses.count("error"),
+        "created_at": job["created_at"],
+        "completed_at": job["completed_at"],
+    }
+
+
+def _student_results(job: Dict, results: Dict[str, Dict]) -> List[Dict]:
+    return [
+        dict(results[key], student_id=student_id)
+        for student_id, key in job["students"].items()
+        if key in results
+    ]
+
+
+async def _load_job(job_id: str) -> Dict:
+    job = await grader.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Batch job not found: {job_id}")
+    return job
+
+
+@router.post("/batches")
+async def create_batch(request: BatchGradeRequest):
+    """
+    Start grading many submissions against one rubric
+    """
+    if not get_store():
+        raise HTTPException(status_code=503, detail="Batch grading needs the shared store (CACHE_DB)")
+    if not request.submissions or not request.rubric:
+        raise HTTPException(status_code=400, detail="submissions and rubric are required")
+
+    job = await grader.create_job(
+        [(submission.student_id, submission.files) for submission in request.submissions],
+        request.rubric,
+        request.rubric_descriptions,
+        request.mode,
+        request.test_cases
+    )
+    return _progress(job, {})
+
+
+@router.get("/batches/{job_id}")
+async def get_batch(job_id: str, include_results: bool = True):
+    """
+    Job progress and, unless include_results=false, every student's result so far
+    """
+    job = await _load_job(job_id)
+    results = await grader.get_results(job_id)
+    response = _progress(job, results)
+    if include_results:
+        response["results"] = _student_results(job, results)
+    # Plain JSON from the store: skip jsonable_encoder over every result
+    return fast_json.FastJSONResponse(response)
+
+
+@router.get("/batches/{job_id}/events")
+async def stream_batch(job_id: str):
+    """
+    Stream results as NDJSON: one line per student as soon as it is graded,
+    then a final progress line when the job completes
+    """
+    job = await _load_job(job_id)
+
+    async def events():
+        sent = set()
+        while True:
+            current = await grader.get_job(job_id) or job
+            results = await grader.get_results(job_id)
+            for result in _student_results(current, results):
+                if result["student_id"] not in sent:
+                    sent.add(result["student_id"])
+                    yield fast_json.dumps(result) + b"\n"
+            if current["status"] != "running":
+                yield fast_json.dumps(dict(_progress(current, results), event="done")) + b"\n"
+                return
+            await asyncio.sleep(1.0)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
@@ -5,6 +5,14 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 from llm.provider_factory import get_llm_provider
+import metrics
+import request_log
+from chat_sessions import CHAT_PROMPT_TOKENS, CONTEXT_MAX_TOKENS, ChatSession, build_session_prompt, estimate_tokens, sessions
+from cohort_analytics import weak_topics
+from integrity_features import extract_features, score_section
+from prefetch import prefetcher
+from similarity import index as similarity_index
+from store import cache_key, content_hash
 
 router = APIRouter(prefix="/v1", tags=["chat"])
 
@@ -18,11 +26,19 @@ class ChatRequest(BaseModel):
     messages: Optional[List[ChatMessage]] = []
     context: Optional[Dict] = None  # current_file, mastery data, etc.
     exam_mode: bool = False
+    # With a session id the server keeps the history: send only the new message
+    # (or the full history the first time the id is used)
+    session_id: Optional[str] = None
+    # Set when only the new message is sent: if the server no longer has the
+    # session (expired, or an in-memory backend restarted) it answers 409 and
+    # the client resends the full history
+    session_continues: bool = False
 
 
 class ChatResponse(BaseModel):
     message: str
     suggested_actions: List[str]
+    session_id: Optional[str] = None
 
 
 CHAT_SYSTEM_PROMPT = """You are ContextWeave Coach - a patient, encouraging programming tutor.
@@ -52,9 +68,11 @@ ENCOURAGED:
 - "Let's break this down step by step"
 - "Good thinking! Now consider..."
 - "That's a common misconception. Actually..."
+"""
 
-{exam_mode_note}
-
+# Appended after the static system prompt, so the prompt prefix is
+# byte-identical across students and turns (provider prefix/KV cache reuse)
+CHAT_CONTEXT_TEMPLATE = """{exam_mode_note}
 Context about student:
 {context_info}
 """
@@ -72,9 +90,9 @@ def build_context_info(context: Optional[Dict]) -> str:
     
     if "mastery" in context:
         mastery = context["mastery"]
-        weak_topics = [topic for topic, data in mastery.items() if data.get("score", 0) < 3]
-        if weak_topics:
-            info.append(f"Weak topics: {', '.join(weak_topics)}")
+        weak = weak_topics(mastery)
+        if weak:
+            info.append(f"Weak topics: {', '.join(weak)}")
     
     if "recent_concepts" in context:
         info.append(f"Recently studied: {', '.join(context['recent_concepts'])}")
@@ -82,14 +100,107 @@ def build_context_info(context: Optional[Dict]) -> str:
     return "\n".join(info) if info else "No context available."
 
 
+def build_system_prompt(context: Optional[Dict], exam_mode: bool) -> str:
+    """Static system prompt followed by exam note and student context"""
+    exam_mode_note = ""
+    if exam_mode:
+        exam_mode_note = "⚠️ EXAM MODE: Provide only conceptual guidance. No detailed hints.\n"
+    
+    return CHAT_SYSTEM_PROMPT + CHAT_CONTEXT_TEMPLATE.format(
+        exam_mode_note=exam_mode_note,
+        context_info=build_context_info(context)
+    )
+
+
+def build_chat_prompt(messages: List[ChatMessage], context: Optional[Dict], exam_mode: bool) -> str:
+    """Static system prompt, then student context, then the recent conversation"""
+    conversation = build_system_prompt(context, exam_mode) + "\n"
+    for msg in messages[-5:]:  # Last 5 messages for context
+        conversation += f"{msg.role.upper()}: {msg.content}\n"
+    
+    conversation += "\nASSISTANT:"
+    return conversation
+
+
+SOLUTION_KEYWORDS = ["write code", "give me code", "complete solution", "full code", "solve this"]
+
+SOLUTION_REFUSAL = "I can't write the complete solution for you, but I can guide you through it! Let's break down the problem step by step. What part are you stuck on?"
+
+
+def _asks_for_solution(user_message: str) -> bool:
+    return any(keyword in user_message.lower() for keyword in SOLUTION_KEYWORDS)
+
+
+async def _session_turn(request: ChatRequest, provider) -> str:
+    """
+    Run one turn of a server-side session
+    
+    The provider's own conversation state is continued when it has one for
+    the same provider, model and system prompt and it is still within
+    CHAT_CONTEXT_MAX_TOKENS; otherwise the prompt is rebuilt from the rolling
+    summary and the recent turns that fit the history budget.
+    """
+    provider_label = provider.get_provider_name()
+    model_label = getattr(provider, "model", "")
+    message = request.messages[-1].content
+    system_prompt = build_system_prompt(request.context, request.exam_mode)
+    state_key = cache_key(provider_label, model_label, content_hash(system_prompt))
+    
+    async with sessions.lock(request.session_id):
+        session = await sessions.load(request.session_id)
+        if session is None:
+            if request.session_continues:
+                # Seeding from the single new message would silently drop the conversation
+                raise HTTPException(status_code=409, detail="Unknown chat session: resend the full history")
+            # New session: seed it with whatever history the client sent
+            session = ChatSession(id=request.session_id)
+            for msg in request.messages[:-1]:
+                if msg.content:
+                    session.add_turn(msg.role or "user", msg.content)
+        
+        with metrics.observe_stage("prompt_build", provider_label, model_label):
+            state = session.provider_state
+            if state and session.provider_state_key == state_key and len(state) <= CONTEXT_MAX_TOKENS:
+                prompt = f"USER: {message}\n\nASSISTANT:"
+                mode = "continued"
+            else:
+                state = None
+                prompt = build_session_prompt(session, system_prompt, message)
+                mode = "full"
+        CHAT_PROMPT_TOKENS.observe(estimate_tokens(prompt), mode=mode)
+        
+        async with prefetcher.busy():
+            response, new_state = await provider.complete_in_session(
+                prompt=prompt,
+                session_state=state,
+                temperature=0.7,
+                max_tokens=500
+            )
+        
+        session.add_turn("user", message)
+        if _asks_for_solution(message):
+            # The student sees the refusal, so neither the history nor the
+            # provider context may keep the model's own answer
+            session.add_turn("assistant", SOLUTION_REFUSAL)
+            new_state = None
+        else:
+            session.add_turn("assistant", response.strip())
+        session.provider_state = new_state
+        session.provider_state_key = state_key if new_state else None
+        await sessions.save(session)
+    
+    sessions.schedule_summary(session, provider)
+    return response
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_tutor(request: ChatRequest):
     """
     Context-aware tutoring chat
     """
     try:
-        # Debug logging
-        print("DEBUG REQUEST:", request.dict())
+        # Sampled, size-bounded request logging (code is hashed, never printed)
+        request_log.log_request(request)
         
         # Validate messages - return helpful response instead of error
         if not request.messages or len(request.messages) == 0:
@@ -105,44 +216,31 @@ async def chat_tutor(request: ChatRequest):
                 suggested_actions=["Ask a question", "Request help"]
             )
         
-        # Build system prompt
-        exam_mode_note = ""
-        if request.exam_mode:
-            exam_mode_note = "\n⚠️ EXAM MODE: Provide only conceptual guidance. No detailed hints."
-        
-        context_info = build_context_info(request.context)
-        
-        system_prompt = CHAT_SYSTEM_PROMPT.format(
-            exam_mode_note=exam_mode_note,
-            context_info=context_info
-        )
-        
         # Get provider
         provider = get_llm_provider()
         
-        # Build conversation
-        conversation = f"{system_prompt}\n\n"
-        for msg in request.messages[-5:]:  # Last 5 messages for context
-            conversation += f"{msg.role.upper()}: {msg.content}\n"
-        
-        conversation += "\nASSISTANT:"
-        
-        # Call LLM
-        response = await provider.generate(
-            prompt=conversation,
-            temperature=0.7,
-            max_tokens=500
-        )
+        if request.session_id:
+            response = await _session_turn(request, provider)
+        else:
+            # Stateless: the client sends the history, the last 5 messages are used
+            with metrics.observe_stage("prompt_build", provider.get_provider_name(), getattr(provider, "model", "")):
+                conversation = build_chat_prompt(request.messages, request.context, request.exam_mode)
+            CHAT_PROMPT_TOKENS.observe(estimate_tokens(conversation), mode="stateless")
+            
+            # Call LLM
+            async with prefetcher.busy():
+                response = await provider.complete(
+                    prompt=conversation,
+                    temperature=0.7,
+                    max_tokens=500
+                )
         
-        # Debug logging
-        print("DEBUG LLM RESPONSE:", response[:200] if response else "None")
+        request_log.log_llm_response(response)
         
         # Detect if student is asking for full solution
         user_message = request.messages[-1].content.lower()
-        solution_keywords = ["write code", "give me code", "complete solution", "full code", "solve this"]
-        
-        if any(keyword in user_message for keyword in solution_keywords):
-            response = "I can't write the complete solution for you, but I can guide you through it! Let's break down the problem step by step. What part are you stuck on?"
+        if _asks_for_solution(user_message):
+            response = SOLUTION_REFUSAL
         
         # Generate suggested actions
         suggested_actions = []
@@ -155,35 +253,61 @@ async def chat_tutor(request: ChatRequest):
         
         return ChatResponse(
             message=response.strip(),
-            suggested_actions=suggested_actions
+            suggested_actions=suggested_actions,
+            session_id=request.session_id
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
 
 
 @router.post("/integrity-check")
-async def check_integrity(code: str, student_history: Optional[Dict] = None):
+async def check_integrity(
+    code: str,
+    student_history: Optional[Dict] = None,
+    section_id: Optional[str] = None,
+    submission_id: Optional[str] = None,
+    lab_id: Optional[str] = None
+):
     """
     Detect potential academic integrity issues
+    
+    With section_id and submission_id, the code is also compared with (and
+    added to) the section's earlier submissions; see /v1/integrity/similar.
+    With lab_id, its structure is scored against the lab baseline (without
+    updating it); see /v1/integrity/batch.
     """
     try:
         signals = []
+        near_duplicates = []
+        
+        if section_id and submission_id:
+            near_duplicates = await similarity_index.check(section_id, submission_id, code)
+            if near_duplicates:
+                signals.append("near_duplicate")
         
         # Check code length
         if len(code) > 500:
             signals.append("large_code_block")
         
-        # Check complexity (simple heuristic)
-        if code.count("def ") > 5 or code.count("class ") > 2:
+        # Check complexity (function and class definitions, not substrings)
+        features = extract_features(code)
+        if features["functions"] > 5 or features["classes"] > 2:
             signals.append("high_complexity")
         
+        if lab_id:
+            structure = (await score_section(lab_id, [code], update_baseline=False))[0]
+            if structure["flags"]:
+                signals.append("atypical_structure")
+        
         # Check for common copy-paste patterns
         if "# TODO" in code or "# FIXME" in code:
             signals.append("template_code")
         
         # Generate response
-        if len(signals) >= 2:
+        if "near_duplicate" in signals or len(signals) >= 2:
             message = "This solution looks quite complete! Want to walk through your reasoning step by step? It helps to explain your thought process."
             severity = "medium"
         elif len(signals) == 1:
@@ -197,7 +321,8 @@ async def check_integrity(code: str, student_history: Optional[Dict] = None):
             "signals": signals,
             "message": message,
             "severity": severity,
-            "suggestion": "Consider adding comments explaining your approach: // My approach: [explain]"
+            "suggestion": "Consider adding comments explaining your approach: // My approach: [explain]",
+            "near_duplicates": near_duplicates
         }
         
     except Exception as e:
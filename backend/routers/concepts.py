@@ -0,0 +1,80 @@
+"""
+Concept index endpoints
+Index a repo's functions by concept in the background, then look up the
+concepts of a file or lab folder and where a concept appears
+"""
+import os
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+from concept_index import index
+
+router = APIRouter(prefix="/v1/concepts", tags=["concepts"])
+
+
+class IndexRequest(BaseModel):
+    repo_path: str
+    # Re-index only these files now (e.g. after a save) instead of starting a full background run
+    paths: Optional[List[str]] = None
+
+
+class FunctionConcepts(BaseModel):
+    name: str
+    line: int
+    end_line: int
+    tags: List[str]
+
+
+class ConceptSummary(BaseModel):
+    path: str
+    files: int
+    concepts: Dict[str, int]
+    functions: List[FunctionConcepts]
+
+
+class ConceptLocation(BaseModel):
+    file: str
+    functions: List[Dict]
+
+
+def _check_repo(repo_path: str) -> str:
+    if not repo_path or not os.path.isdir(repo_path):
+        raise HTTPException(status_code=400, detail=f"Not a directory: {repo_path}")
+    return os.path.realpath(repo_path)
+
+
+@router.post("/index")
+async def index_repo(request: IndexRequest):
+    """
+    Start (or refresh) the concept index of a repo
+
+    With paths, those files are re-indexed before responding; otherwise the
+    whole repo is walked in the background and unchanged files are skipped.
+    """
+    repo_path = _check_repo(request.repo_path)
+    if request.paths:
+        return await index.index_paths(repo_path, request.paths)
+    started = index.start(repo_path)
+    return {"started": started, "status": await index.status(repo_path)}
+
+
+@router.get("/index")
+async def index_status(repo_path: str):
+    """Progress of the last indexing run for a repo"""
+    status = await index.status(_check_repo(repo_path))
+    if not status:
+        raise HTTPException(status_code=404, detail=f"Repo not indexed: {repo_path}")
+    return status
+
+
+@router.get("/summary", response_model=ConceptSummary)
+async def concept_summary(repo_path: str, path: Optional[str] = None):
+    """Concepts exercised by a file, a lab folder, or the whole repo"""
+    return await index.concepts_for(_check_repo(repo_path), path)
+
+
+@router.get("/search", response_model=List[ConceptLocation])
+async def concept_search(repo_path: str, concept: str):
+    """Every indexed function tagged with a concept, e.g. concept=recursion"""
+    return await index.where(_check_repo(repo_path), concept.strip().lower())
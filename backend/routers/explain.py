@@ -2,11 +2,17 @@
 Progressive hint system endpoint
 Provides 3 levels of hints: Conceptual, Logical, Line-by-line
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from pydantic import BaseModel
 from typing import List, Optional
 import os
 from llm.provider_factory import get_llm_provider
+import etags
+import metrics
+import request_log
+from concept_rules import detect_concepts_local
+from prefetch import prefetcher
+from store import cache_key, content_hash, get_store
 
 router = APIRouter(prefix="/v1", tags=["explain"])
 
@@ -40,7 +46,7 @@ MANDATORY RULES:
    - Always encourage reasoning
    - Suggest citations: "// Adapted from [concept] by [student name]"
 
-3. MULTILINGUAL: Respond in {lang} for explanations, English for code/terms
+3. MULTILINGUAL: Respond in the language requested below for explanations, English for code/terms
 
 4. ENCOURAGE REASONING: Ask "What do you think happens next?"
 
@@ -51,39 +57,55 @@ Output format:
 - hint: Your explanation at the requested level
 - concepts: Array of programming concepts (e.g., ["recursion", "binary-search"])
 - difficulty: 1-5 rating
+
+Provide your response as JSON:
+{
+    "hint": "your explanation here",
+    "concepts": ["concept1", "concept2"],
+    "difficulty": 1-5
+}
 """
 
+# Everything that varies per request goes after the static system prompt, so
+# the prompt prefix is byte-identical across requests and the provider can
+# reuse its cached KV state for it
+LANG_INSTRUCTIONS = {
+    "en": "Respond in clear, simple English.",
+    "hi": "Respond in simple Hindi (Hinglish is okay for technical terms). Keep code terms in English."
+}
 
-def get_hint_prompt(code: str, level: int, lang: str, exam_mode: bool) -> str:
-    """Generate prompt based on hint level"""
-    
-    lang_instruction = {
-        "en": "Respond in clear, simple English.",
-        "hi": "Respond in simple Hindi (Hinglish is okay for technical terms). Keep code terms in English."
-    }
-    
-    level_instructions = {
-        1: """Level 1 - CONCEPTUAL OVERVIEW:
+LEVEL_INSTRUCTIONS = {
+    1: """Level 1 - CONCEPTUAL OVERVIEW:
 - Explain WHAT this code does in 2-3 sentences
 - Identify the main algorithm or pattern
 - NO implementation details
 - Example: "This implements binary search to find elements efficiently"
 """,
-        2: """Level 2 - LOGICAL BREAKDOWN:
+    2: """Level 2 - LOGICAL BREAKDOWN:
 - Explain HOW the code works step-by-step
 - Break down the algorithm logic
 - Explain key decisions and flow
 - NO line-by-line code walkthrough
 - Example: "First checks if array is empty, then compares middle element, recursively searches left or right half"
 """,
-        3: """Level 3 - DETAILED EXPLANATION:
+    3: """Level 3 - DETAILED EXPLANATION:
 - Explain line-by-line what each part does
 - Clarify tricky parts and edge cases
 - Explain variable purposes
 - Still NO complete copyable solutions
 - Example: "Line 5: `mid = (left + right) // 2` calculates the middle index to split the search space"
 """
-    }
+}
+
+# Part of the hint cache key and ETag, so edited prompts are not answered from
+# hints generated with the old ones
+HINT_PROMPT_VERSION = content_hash(
+    TUTOR_SYSTEM_PROMPT + "".join(LEVEL_INSTRUCTIONS.values()) + "".join(LANG_INSTRUCTIONS.values())
+)[:12]
+
+
+def get_hint_prompt(code: str, level: int, lang: str, exam_mode: bool) -> str:
+    """Generate prompt based on hint level"""
     
     if exam_mode and level > 1:
         level = 1
@@ -91,37 +113,30 @@ def get_hint_prompt(code: str, level: int, lang: str, exam_mode: bool) -> str:
     else:
         exam_note = ""
     
-    prompt = f"""{TUTOR_SYSTEM_PROMPT.format(lang=lang)}
-
-{lang_instruction[lang]}
-
-{level_instructions[level]}
-
+    # Least-varying parts first: level (3 values), then language, then exam mode
+    prompt = f"""{TUTOR_SYSTEM_PROMPT}
+{LEVEL_INSTRUCTIONS[level]}
+{LANG_INSTRUCTIONS[lang]}
 {exam_note}
 
 CODE TO EXPLAIN:
 ```
 {code}
 ```
-
-Provide your response as JSON:
-{{
-    "hint": "your explanation here",
-    "concepts": ["concept1", "concept2"],
-    "difficulty": 1-5
-}}
 """
     return prompt
 
 
 @router.post("/explain", response_model=ExplainResponse)
-async def explain_code(request: ExplainRequest):
+async def explain_code(request: ExplainRequest, http_request: Request, http_response: Response):
     """
     Provide progressive hints for code understanding
+
+    Parsed hints carry an ETag; If-None-Match with it returns 304 without an LLM call.
     """
     try:
-        # Debug logging
-        print("DEBUG REQUEST:", request.dict())
+        # Sampled, size-bounded request logging (code is hashed, never printed)
+        request_log.log_request(request)
         
         # Guard against empty code - return helpful message instead of error
         if not request.code or not request.code.strip():
@@ -143,75 +158,145 @@ async def explain_code(request: ExplainRequest):
         # Get LLM provider
         provider = get_llm_provider()
         
+        provider_label = provider.get_provider_name()
+        model_label = getattr(provider, "model", "")
+        next_level_available = request.level < 3 and not request.exam_mode
+        
+        # Hint cache shared by all workers: same code, level, language and model
+        store = get_store()
+        hint_key = cache_key(
+            content_hash(request.code), request.level, request.lang, request.exam_mode,
+            provider_label, model_label, HINT_PROMPT_VERSION
+        )
+        etag = etags.etag_for(hint_key)
+        if etags.not_modified(http_request, etag):
+            return etags.not_modified_response(etag, "explain")
+        if store:
+            cached = await store.aget("hint", hint_key)
+            metrics.record_cache(cached is not None)
+            if cached is not None:
+                http_response.headers["ETag"] = etag
+                return ExplainResponse(**cached, next_level_available=next_level_available)
+        
         # Build prompt
-        prompt = get_hint_prompt(request.code, request.level, request.lang, request.exam_mode)
+        with metrics.observe_stage("prompt_build", provider_label, model_label):
+            prompt = get_hint_prompt(request.code, request.level, request.lang, request.exam_mode)
         
         # Call LLM
-        response = await provider.generate(
-            prompt=prompt,
-            temperature=0.3,
-            max_tokens=800
-        )
+        async with prefetcher.busy():
+            response = await provider.complete(
+                prompt=prompt,
+                temperature=0.3,
+                max_tokens=800
+            )
         
-        # Debug logging
-        print("DEBUG LLM RESPONSE:", response[:200] if response else "None")
+        request_log.log_llm_response(response)
         
         # Parse response with robust error handling
         import json
-        try:
-            result = json.loads(response)
-            if not isinstance(result, dict):
-                raise ValueError("Invalid JSON structure")
-        except Exception:
-            result = {
-                "hint": str(response),
-                "concepts": ["general-programming"],
-                "difficulty": 3
-            }
+        with metrics.observe_stage("response_parse", provider_label, model_label):
+            parsed = True
+            try:
+                result = json.loads(response)
+                if not isinstance(result, dict):
+                    raise ValueError("Invalid JSON structure")
+            except Exception:
+                metrics.record_fallback("parse_error", provider_label, model_label)
+                parsed = False
+                result = {
+                    "hint": str(response),
+                    "concepts": ["general-programming"],
+                    "difficulty": 3
+                }
         
-        return ExplainResponse(
+        explanation = ExplainResponse(
             hint=result.get("hint", response),
             concepts=result.get("concepts", ["general-programming"]),
             difficulty=result.get("difficulty", 3),
-            next_level_available=request.level < 3 and not request.exam_mode
+            next_level_available=next_level_available
         )
         
+        if parsed:
+            http_response.headers["ETag"] = etag
+            if store:
+                await store.aset("hint", hint_key, explanation.model_dump(exclude={"next_level_available"}))
+        
+        return explanation
+        
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Explanation failed: {str(e)}")
 
 
+# Rule-based concept results at or above this confidence skip the LLM
+CONCEPTS_MIN_CONFIDENCE = float(os.getenv("CONCEPTS_MIN_CONFIDENCE", "0.7"))
+# "0": never call the LLM for concepts, even for low-confidence results
+CONCEPTS_LLM_FALLBACK = os.getenv("CONCEPTS_LLM_FALLBACK", "1") != "0"
+
+CONCEPT_DETECTIONS = metrics.Counter(
+    "contextweave_concept_detections_total",
+    "detect-concepts requests, by source of the tags (rules or llm)",
+    ["source"]
+)
+
+CONCEPTS_PROMPT = """Analyze the code below and extract programming concepts as tags.
+
+Return ONLY a JSON array of concept tags (lowercase, hyphenated):
+["concept1", "concept2", ...]
+
+Examples: ["recursion", "binary-search", "edge-cases", "arrays", "linked-lists"]
+"""
+
+
 @router.post("/detect-concepts")
 async def detect_concepts(code: str, file_path: Optional[str] = None):
     """
     Extract programming concepts from code for tagging
+    
+    Tags come from local AST/token rules (concept_rules.py); the LLM is only
+    asked when the rules are not confident.
     """
+    local_tags, confidence = detect_concepts_local(code, file_path)
+    if confidence >= CONCEPTS_MIN_CONFIDENCE or not CONCEPTS_LLM_FALLBACK:
+        CONCEPT_DETECTIONS.inc(source="rules")
+        return {"concepts": local_tags or ["general-programming"], "source": "rules", "confidence": confidence}
+    CONCEPT_DETECTIONS.inc(source="llm")
+    
     try:
         provider = get_llm_provider()
+        provider_label = provider.get_provider_name()
+        model_label = getattr(provider, "model", "")
         
-        prompt = f"""Analyze this code and extract programming concepts as tags.
-
+        store = get_store()
+        concepts_key = cache_key(content_hash(code), provider_label, model_label)
+        if store:
+            cached = await store.aget("concepts", concepts_key)
+            metrics.record_cache(cached is not None)
+            if cached is not None:
+                return {"concepts": cached, "source": "llm", "confidence": confidence}
+        
+        prompt = f"""{CONCEPTS_PROMPT}
 CODE:
 ```
 {code}
 ```
-
-Return ONLY a JSON array of concept tags (lowercase, hyphenated):
-["concept1", "concept2", ...]
-
-Examples: ["recursion", "binary-search", "edge-cases", "arrays", "linked-lists"]
 """
         
-        response = await provider.generate(prompt=prompt, temperature=0.2, max_tokens=200)
+        async with prefetcher.busy():
+            response = await provider.complete(prompt=prompt, temperature=0.2, max_tokens=200)
         
         import json
         try:
             concepts = json.loads(response)
             if not isinstance(concepts, list):
                 raise ValueError("Expected list")
-            return {"concepts": concepts}
         except Exception:
-            # Fallback to safe default
-            return {"concepts": ["general-programming"]}
+            # Fallback to whatever the rules found
+            metrics.record_fallback("parse_error", provider_label, model_label)
+            return {"concepts": local_tags or ["general-programming"], "source": "rules", "confidence": confidence}
         
+        if store:
+            await store.aset("concepts", concepts_key, concepts)
+        return {"concepts": concepts, "source": "llm", "confidence": confidence}
+
     except Exception as e:
-        return {"concepts": ["general-programming"]}
+        return {"concepts": local_tags or ["general-programming"], "source": "rules", "confidence": confidence}
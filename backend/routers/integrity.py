@@ -0,0 +1,106 @@
+"""
+Academic integrity endpoints
+Near-duplicate detection and structural outlier scoring across the
+submissions of a section
+"""
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+from integrity_features import score_section
+from routers.labs import FileSubmission
+from similarity import index
+
+router = APIRouter(prefix="/v1/integrity", tags=["integrity"])
+
+
+class SimilarityRequest(BaseModel):
+    section_id: str
+    submission_id: str
+    files: Optional[List[FileSubmission]] = None
+    code: Optional[str] = None
+    # False: only look up matches, do not add this submission to the index
+    insert: bool = True
+    threshold: Optional[float] = None
+
+
+class NearDuplicate(BaseModel):
+    submission_id: str
+    similarity: float
+
+
+class SimilarityResponse(BaseModel):
+    submission_id: str
+    near_duplicates: List[NearDuplicate]
+
+
+def submission_code(files: Optional[List[FileSubmission]], code: Optional[str]) -> str:
+    """All files of a submission in path order, or the single code snippet"""
+    if files:
+        return "\n".join(file.content or "" for file in sorted(files, key=lambda f: f.path or ""))
+    return code or ""
+
+
+@router.post("/similar", response_model=SimilarityResponse)
+async def find_similar(request: SimilarityRequest):
+    """
+    Index a submission and list earlier submissions in its section that are near-duplicates
+    """
+    code = submission_code(request.files, request.code)
+    if not code.strip():
+        raise HTTPException(status_code=400, detail="files or code is required")
+
+    matches = await index.check(
+        request.section_id, request.submission_id, code, request.insert, request.threshold
+    )
+    return SimilarityResponse(submission_id=request.submission_id, near_duplicates=matches)
+
+
+class SectionSubmission(BaseModel):
+    submission_id: str
+    files: Optional[List[FileSubmission]] = None
+    code: Optional[str] = None
+
+
+class SectionScoreRequest(BaseModel):
+    lab_id: str
+    submissions: List[SectionSubmission]
+    # Add this batch to the lab baseline (turn off when re-scoring the same submissions)
+    update_baseline: bool = True
+
+
+class SubmissionScore(BaseModel):
+    submission_id: str
+    features: Dict[str, float]
+    z_scores: Dict[str, Optional[float]]
+    flags: List[str]
+    anomaly_score: Optional[float]
+
+
+class SectionScoreResponse(BaseModel):
+    lab_id: str
+    results: List[SubmissionScore]
+    # Submission ids with at least one flagged feature, most atypical first
+    flagged: List[str]
+
+
+@router.post("/batch", response_model=SectionScoreResponse)
+async def score_section_batch(request: SectionScoreRequest):
+    """
+    Score a whole section's submissions on AST features against the lab baseline
+    """
+    if not request.submissions:
+        raise HTTPException(status_code=400, detail="submissions are required")
+
+    codes = [submission_code(s.files, s.code) for s in request.submissions]
+    scores = await score_section(request.lab_id, codes, request.update_baseline)
+    results = [
+        SubmissionScore(submission_id=submission.submission_id, **score)
+        for submission, score in zip(request.submissions, scores)
+    ]
+    flagged = sorted((r for r in results if r.flags), key=lambda r: -(r.anomaly_score or 0))
+    return SectionScoreResponse(
+        lab_id=request.lab_id,
+        results=results,
+        flagged=[r.submission_id for r in flagged]
+    )
@@ -1,10 +1,19 @@
 """
 Lab evaluation endpoint with rubric-based scoring
 """
+import asyncio
+import json
+import os
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import List, Dict, Optional
-from llm.provider_factory import get_llm_provider
+from typing import List, Dict, Optional, Tuple
+from llm.provider_factory import get_llm_provider, provider_slots
+import metrics
+import request_log
+import sandbox
+from prefetch import prefetcher
+from static_analysis import STATIC_ANALYSIS, analyze_files, findings_text, score_criterion
+from store import cache_key, content_hash, get_store
 
 router = APIRouter(prefix="/v1", tags=["labs"])
 
@@ -20,10 +29,21 @@ class RubricCriterion(BaseModel):
     description: Optional[str] = ""
 
 
+class LabTestCase(BaseModel):
+    name: str
+    code: str  # Python statements run against the submission's top-level names
+    criterion: str = "correctness"
+
+
 class EvaluateRequest(BaseModel):
     files: Optional[List[FileSubmission]] = []
     rubric: Optional[Dict[str, int]] = {}  # {"correctness": 30, "style": 20, ...}
     rubric_descriptions: Optional[Dict[str, str]] = None
+    # "single": one completion for the whole rubric; "per_criterion": one
+    # completion per criterion, run in parallel (default: LAB_EVAL_MODE)
+    mode: Optional[str] = None
+    # Instructor test cases; criteria they name are scored by running them
+    test_cases: Optional[List[LabTestCase]] = None
 
 
 class CriterionResult(BaseModel):
@@ -42,7 +62,15 @@ class EvaluateResponse(BaseModel):
     summary: str
 
 
-EVALUATOR_PROMPT = """You are an objective code evaluator for student lab assignments.
+LAB_EVAL_MODE = os.getenv("LAB_EVAL_MODE", "single")
+
+LAB_CRITERIA = metrics.Counter(
+    "contextweave_lab_criteria_total",
+    "Rubric criteria evaluated, by scorer (tests, static analysis or LLM)",
+    ["scorer"]
+)
+
+EVALUATION_RULES = """You are an objective code evaluator for student lab assignments.
 
 EVALUATION RULES:
 1. Be FAIR and CONSTRUCTIVE
@@ -50,23 +78,434 @@ EVALUATION RULES:
 3. Score as: "Met" (100%), "Partial" (50-70%), "Not Met" (0-30%)
 4. Focus on learning, not punishment
 5. Highlight what's good AND what needs work
+"""
 
+EVALUATOR_PROMPT = EVALUATION_RULES + """
+For each rubric criterion below, provide:
+{
+    "criterion": "name",
+    "score": "Met|Partial|Not Met",
+    "feedback": "specific, actionable feedback"
+}
+
+Return JSON array of evaluations.
+"""
+
+# The rubric and code follow the static instructions above, so the prompt
+# prefix is byte-identical across submissions (provider prefix/KV cache reuse)
+EVALUATION_INPUT_TEMPLATE = """
 RUBRIC CRITERIA:
 {rubric_text}
 
 CODE SUBMISSION:
 {code_text}
+"""
+
 
-For each criterion, provide:
-{{
+# Per-criterion mode: static instructions, then the code (shared by the
+# criteria of one submission), then the criterion
+CRITERION_PROMPT = EVALUATION_RULES + """
+Evaluate the code submission below against ONE rubric criterion, given after the code.
+Return ONLY one JSON object:
+{
     "criterion": "name",
     "score": "Met|Partial|Not Met",
     "feedback": "specific, actionable feedback"
-}}
+}
+"""
 
-Return JSON array of evaluations.
+CRITERION_INPUT_TEMPLATE = """
+CODE SUBMISSION:
+{code_text}
+
+CRITERION: {criterion} ({points} points): {description}{findings}
 """
 
+MANUAL_REVIEW_FEEDBACK = "Unable to evaluate automatically. Please review manually."
+
+
+def _code_text(files: List[FileSubmission]) -> str:
+    code_text = ""
+    for file in files:
+        code_text += f"\n\nFile: {file.path}\n```\n{file.content}\n```"
+    return code_text
+
+
+def _is_test_file(file: FileSubmission) -> bool:
+    name = os.path.basename(file.path or "").lower()
+    return name.startswith("test") or name.endswith(("_test.py", ".test.js", ".test.ts", "test.java"))
+
+
+def relevant_files(files: List[FileSubmission], criterion: str, description: str = "") -> List[FileSubmission]:
+    """
+    Files a criterion needs to see: test files for test-related criteria,
+    source files for everything else (all files when the split is empty)
+    """
+    tests = [f for f in files if _is_test_file(f)]
+    sources = [f for f in files if not _is_test_file(f)]
+    if "test" in f"{criterion} {description}".lower():
+        return tests or files
+    return sources or files
+
+
+def _findings_note(findings: str) -> str:
+    return f"\n  Static analysis findings: {findings}" if findings else ""
+
+
+def build_criterion_prompt(
+    files: List[FileSubmission],
+    criterion: str,
+    points: int,
+    description: str = "",
+    findings: str = ""
+) -> str:
+    """Static per-criterion instructions followed by the relevant code and the criterion"""
+    return CRITERION_PROMPT + CRITERION_INPUT_TEMPLATE.format(
+        code_text=_code_text(files),
+        criterion=criterion.upper(),
+        points=points,
+        description=description,
+        findings=_findings_note(findings)
+    )
+
+
+def build_evaluation_prompt(
+    files: List[FileSubmission],
+    rubric: Dict[str, int],
+    rubric_descriptions: Optional[Dict[str, str]] = None,
+    findings: Optional[Dict[str, str]] = None
+) -> str:
+    """Static evaluator instructions followed by the rubric and the submitted code"""
+    # Build rubric text
+    rubric_text = ""
+    for criterion, points in rubric.items():
+        desc = rubric_descriptions.get(criterion, "") if rubric_descriptions else ""
+        note = _findings_note(findings.get(criterion, "")) if findings else ""
+        rubric_text += f"\n- {criterion.upper()} ({points} points): {desc}{note}"
+    
+    return EVALUATOR_PROMPT + EVALUATION_INPUT_TEMPLATE.format(
+        rubric_text=rubric_text,
+        code_text=_code_text(files)
+    )
+
+
+async def evaluate_criterion(
+    provider,
+    files: List[FileSubmission],
+    criterion: str,
+    points: int,
+    description: str = "",
+    findings: str = ""
+) -> Tuple[Dict, bool]:
+    """
+    Score one rubric criterion with its own completion
+    
+    Successful results are cached per criterion and per relevant file contents,
+    so unchanged files are not re-evaluated when another criterion's files change.
+    
+    Returns:
+        Tuple of (evaluation dict with criterion/score/feedback, True if the
+        LLM result was usable)
+    
+    Raises:
+        Exception: Provider errors, for the caller to isolate
+    """
+    provider_label = provider.get_provider_name()
+    model_label = getattr(provider, "model", "")
+    files = relevant_files(files, criterion, description)
+    
+    store = get_store()
+    result_key = cache_key(
+        criterion, points, description, findings,
+        [(file.path, content_hash(file.content)) for file in files],
+        provider_label, model_label
+    )
+    if store:
+        cached = await store.aget("criterion_result", result_key)
+        if cached is not None:
+            return cached, True
+    
+    prompt = build_criterion_prompt(files, criterion, points, description, findings)
+    async with provider_slots(provider), prefetcher.busy():
+        response = await provider.complete(prompt=prompt, temperature=0.2, max_tokens=400)
+    
+    try:
+        with metrics.observe_stage("response_parse", provider_label, model_label):
+            evaluation = json.loads(response)
+        if not isinstance(evaluation, dict) or "score" not in evaluation:
+            raise ValueError("Expected an object with a score")
+    except Exception:
+        metrics.record_fallback("parse_error", provider_label, model_label)
+        return {"criterion": criterion, "score": "Partial", "feedback": MANUAL_REVIEW_FEEDBACK}, False
+    
+    evaluation = {
+        "criterion": criterion,
+        "score": evaluation.get("score", "Partial"),
+        "feedback": evaluation.get("feedback", "No feedback available")
+    }
+    if store:
+        await store.aset("criterion_result", result_key, evaluation)
+    return evaluation, True
+
+
+async def evaluate_per_criterion(
+    provider,
+    files: List[FileSubmission],
+    rubric: Dict[str, int],
+    rubric_descriptions: Optional[Dict[str, str]] = None,
+    findings: Optional[Dict[str, str]] = None
+) -> Tuple[List[Dict], bool]:
+    """
+    Evaluate all criteria in parallel; a failing criterion falls back on its own
+    
+    Returns:
+        Tuple of (evaluations in rubric order, True if every criterion succeeded)
+        
+    Raises:
+        Exception: The provider error, if no criterion could be evaluated at all
+    """
+    descriptions = rubric_descriptions or {}
+    findings = findings or {}
+    tasks = [
+        evaluate_criterion(
+            provider, files, criterion, points, descriptions.get(criterion, ""), findings.get(criterion, "")
+        )
+        for criterion, points in rubric.items()
+    ]
+    
+    evaluations: Dict[str, Dict] = {}
+    all_ok = True
+    errors = []
+    # Merge results as they arrive: total latency is that of the slowest criterion
+    for task in asyncio.as_completed(tasks):
+        try:
+            evaluation, ok = await task
+        except Exception as e:
+            errors.append(e)
+            continue
+        evaluations[evaluation["criterion"]] = evaluation
+        all_ok = all_ok and ok
+    
+    if errors and not evaluations:
+        raise errors[0]
+    for criterion in rubric:
+        if criterion not in evaluations:
+            metrics.record_fallback("criterion_error", provider.get_provider_name(), getattr(provider, "model", ""))
+            evaluations[criterion] = {"criterion": criterion, "score": "Partial", "feedback": MANUAL_REVIEW_FEEDBACK}
+            all_ok = False
+    
+    return [evaluations[criterion] for criterion in rubric], all_ok
+
+
+def score_evaluations(evaluations: List[Dict], rubric: Dict[str, int]) -> EvaluateResponse:
+    """Convert Met/Partial/Not Met labels into points, totals and a summary"""
+    # Calculate scores
+    results = []
+    total_score = 0
+    total_max = sum(rubric.values())
+    
+    for eval_item in evaluations:
+        criterion = eval_item.get("criterion", "unknown")
+        score_label = eval_item.get("score", "Partial")
+        feedback = eval_item.get("feedback", "No feedback available")
+        
+        max_points = rubric.get(criterion, 0)
+        
+        # Convert score label to points (test results give the fraction passed)
+        if "fraction" in eval_item:
+            points = int(round(max_points * eval_item["fraction"]))
+        elif score_label == "Met":
+            points = max_points
+        elif score_label == "Partial":
+            points = int(max_points * 0.6)  # 60%
+        else:  # Not Met
+            points = int(max_points * 0.2)  # 20%
+        
+        total_score += points
+        
+        results.append(CriterionResult(
+            criterion=criterion,
+            score=score_label,
+            points=points,
+            max_points=max_points,
+            feedback=feedback
+        ))
+    
+    percentage = (total_score / total_max * 100) if total_max > 0 else 0
+    
+    # Generate summary
+    if percentage >= 80:
+        summary = "Excellent work! Strong understanding demonstrated."
+    elif percentage >= 60:
+        summary = "Good effort. Review feedback for improvements."
+    else:
+        summary = "Needs significant work. Focus on fundamentals."
+    
+    return EvaluateResponse(
+        rubric=results,
+        overall_score=total_score,
+        overall_max=total_max,
+        percentage=round(percentage, 1),
+        summary=summary
+    )
+
+
+async def _evaluate_single(
+    provider,
+    files: List[FileSubmission],
+    rubric: Dict[str, int],
+    rubric_descriptions: Optional[Dict[str, str]] = None,
+    findings: Optional[Dict[str, str]] = None
+) -> Tuple[List[Dict], bool]:
+    """Evaluate the whole rubric with one completion"""
+    provider_label = provider.get_provider_name()
+    model_label = getattr(provider, "model", "")
+    
+    with metrics.observe_stage("prompt_build", provider_label, model_label):
+        prompt = build_evaluation_prompt(files, rubric, rubric_descriptions, findings)
+    
+    # Call LLM (batch jobs call this concurrently: share the provider limit)
+    async with provider_slots(provider), prefetcher.busy():
+        response = await provider.complete(
+            prompt=prompt,
+            temperature=0.2,
+            max_tokens=1500
+        )
+    
+    request_log.log_llm_response(response)
+    
+    # Parse response with robust error handling
+    try:
+        with metrics.observe_stage("response_parse", provider_label, model_label):
+            evaluations = json.loads(response)
+        if not isinstance(evaluations, list):
+            raise ValueError("Expected list")
+    except Exception:
+        # Fallback - create safe default evaluations
+        metrics.record_fallback("parse_error", provider_label, model_label)
+        evaluations = [
+            {
+                "criterion": criterion,
+                "score": "Partial",
+                "feedback": MANUAL_REVIEW_FEEDBACK
+            }
+            for criterion in rubric.keys()
+        ]
+        return evaluations, False
+    
+    return evaluations, True
+
+
+async def grade_submission(
+    provider,
+    files: List[FileSubmission],
+    rubric: Dict[str, int],
+    rubric_descriptions: Optional[Dict[str, str]] = None,
+    mode: Optional[str] = None,
+    test_cases: Optional[List[LabTestCase]] = None
+) -> EvaluateResponse:
+    """
+    Evaluate one submission, serving and storing whole evaluations in the shared store
+    
+    Criteria with instructor test cases are scored by running them in the
+    sandbox, in parallel with the LLM calls. Criteria that static analysis
+    can measure (documentation, code style, tests) are scored without the
+    LLM; the rest go to the LLM with the relevant findings attached.
+    
+    Args:
+        provider: LLM provider
+        files: Submitted files
+        rubric: Points per criterion
+        rubric_descriptions: Optional description per criterion
+        mode: "single" or "per_criterion" (default: LAB_EVAL_MODE)
+        test_cases: Optional instructor test cases, each for one criterion
+        
+    Returns:
+        Scored evaluation
+    """
+    provider_label = provider.get_provider_name()
+    model_label = getattr(provider, "model", "")
+    mode = mode or LAB_EVAL_MODE
+    
+    # Same submission, rubric, mode and model: serve the stored evaluation
+    store = get_store()
+    evaluation_key = cache_key(
+        [(file.path, content_hash(file.content)) for file in files],
+        rubric, rubric_descriptions, mode, STATIC_ANALYSIS,
+        [case.model_dump() for case in test_cases or []], provider_label, model_label
+    )
+    if store:
+        cached = await store.aget("lab_evaluation", evaluation_key)
+        metrics.record_cache(cached is not None)
+        if cached is not None:
+            return EvaluateResponse(**cached)
+    
+    # Test cases only run against Python submissions
+    tested: Dict[str, List[LabTestCase]] = {}
+    if any((file.path or "").endswith(".py") for file in files):
+        for case in test_cases or []:
+            if case.criterion in rubric:
+                tested.setdefault(case.criterion, []).append(case)
+    
+    static_evaluations: Dict[str, Dict] = {}
+    findings: Dict[str, str] = {}
+    if STATIC_ANALYSIS:
+        with metrics.observe_stage("static_analysis", provider_label, model_label):
+            static_findings = analyze_files(files)
+            for criterion in rubric:
+                if criterion in tested:
+                    continue
+                static_evaluation = score_criterion(static_findings, criterion)
+                if static_evaluation:
+                    static_evaluations[criterion] = static_evaluation
+                else:
+                    findings[criterion] = findings_text(static_findings, criterion)
+    
+    llm_rubric = {
+        criterion: points for criterion, points in rubric.items()
+        if criterion not in static_evaluations and criterion not in tested
+    }
+    LAB_CRITERIA.inc(len(tested), scorer="tests")
+    LAB_CRITERIA.inc(len(static_evaluations), scorer="static")
+    LAB_CRITERIA.inc(len(llm_rubric), scorer="llm")
+    
+    async def llm_evaluations() -> Tuple[List[Dict], bool]:
+        if not llm_rubric:
+            return [], True
+        if mode == "per_criterion":
+            return await evaluate_per_criterion(provider, files, llm_rubric, rubric_descriptions, findings)
+        return await _evaluate_single(provider, files, llm_rubric, rubric_descriptions, findings)
+    
+    async def test_evaluations() -> Tuple[List[Dict], bool]:
+        if not tested:
+            return [], True
+        cases = [case for criterion_cases in tested.values() for case in criterion_cases]
+        with metrics.observe_stage("tests", provider_label, model_label):
+            results = await sandbox.run_tests(files, cases)
+        evaluations = [
+            sandbox.score_test_results(
+                criterion, [result for case, result in zip(cases, results) if case.criterion == criterion]
+            )
+            for criterion in tested
+        ]
+        return evaluations, not any(result.get("sandbox_failed") for result in results)
+    
+    (evaluations, parsed), (tested_evaluations, ran) = await asyncio.gather(llm_evaluations(), test_evaluations())
+    
+    # Rubric order, with anything the LLM added under another name at the end
+    order = {criterion: index for index, criterion in enumerate(rubric)}
+    evaluations = sorted(
+        list(evaluations) + list(static_evaluations.values()) + tested_evaluations,
+        key=lambda item: order.get(item.get("criterion"), len(order))
+    )
+    evaluation = score_evaluations(evaluations, rubric)
+    
+    # A timed-out or killed sandbox says more about the machine's load than the submission
+    if store and parsed and ran:
+        await store.aset("lab_evaluation", evaluation_key, evaluation.model_dump())
+    
+    return evaluation
+
 
 @router.post("/labs/evaluate", response_model=EvaluateResponse)
 async def evaluate_lab(request: EvaluateRequest):
@@ -74,8 +513,8 @@ async def evaluate_lab(request: EvaluateRequest):
     Evaluate student lab submission against rubric
     """
     try:
-        # Debug logging
-        print("DEBUG REQUEST:", request.dict())
+        # Sampled, size-bounded request logging (code is hashed, never printed)
+        request_log.log_request(request)
         
         # Validate inputs - return helpful response instead of error
         if not request.files or len(request.files) == 0:
@@ -92,99 +531,9 @@ async def evaluate_lab(request: EvaluateRequest):
                 overall_max=0
             )
         
-        # Build rubric text
-        rubric_text = ""
-        for criterion, points in request.rubric.items():
-            desc = request.rubric_descriptions.get(criterion, "") if request.rubric_descriptions else ""
-            rubric_text += f"\n- {criterion.upper()} ({points} points): {desc}"
-        
-        # Build code text
-        code_text = ""
-        for file in request.files:
-            code_text += f"\n\nFile: {file.path}\n```\n{file.content}\n```"
-        
-        # Get provider
         provider = get_llm_provider()
-        
-        # Build prompt
-        prompt = EVALUATOR_PROMPT.format(
-            rubric_text=rubric_text,
-            code_text=code_text
-        )
-        
-        # Call LLM
-        response = await provider.generate(
-            prompt=prompt,
-            temperature=0.2,
-            max_tokens=1500
-        )
-        
-        # Debug logging
-        print("DEBUG LLM RESPONSE:", response[:200] if response else "None")
-        
-        # Parse response with robust error handling
-        import json
-        try:
-            evaluations = json.loads(response)
-            if not isinstance(evaluations, list):
-                raise ValueError("Expected list")
-        except Exception:
-            # Fallback - create safe default evaluations
-            evaluations = [
-                {
-                    "criterion": criterion,
-                    "score": "Partial",
-                    "feedback": "Unable to evaluate automatically. Please review manually."
-                }
-                for criterion in request.rubric.keys()
-            ]
-        
-        # Calculate scores
-        results = []
-        total_score = 0
-        total_max = sum(request.rubric.values())
-        
-        for eval_item in evaluations:
-            criterion = eval_item.get("criterion", "unknown")
-            score_label = eval_item.get("score", "Partial")
-            feedback = eval_item.get("feedback", "No feedback available")
-            
-            max_points = request.rubric.get(criterion, 0)
-            
-            # Convert score label to points
-            if score_label == "Met":
-                points = max_points
-            elif score_label == "Partial":
-                points = int(max_points * 0.6)  # 60%
-            else:  # Not Met
-                points = int(max_points * 0.2)  # 20%
-            
-            total_score += points
-            
-            results.append(CriterionResult(
-                criterion=criterion,
-                score=score_label,
-                points=points,
-                max_points=max_points,
-                feedback=feedback
-            ))
-        
-        percentage = (total_score / total_max * 100) if total_max > 0 else 0
-        
-        # Generate summary
-        if percentage >= 80:
-            summary = "Excellent work! Strong understanding demonstrated."
-        elif percentage >= 60:
-            summary = "Good effort. Review feedback for improvements."
-        else:
-            summary = "Needs significant work. Focus on fundamentals."
-        
-        return EvaluateResponse(
-            rubric=results,
-            overall_score=total_score,
-            overall_max=total_max,
-            percentage=round(percentage, 1),
-            summary=summary
+        return await grade_submission(
+            provider, request.files, request.rubric, request.rubric_descriptions, request.mode, request.test_cases
         )
         
     except Exception as e:
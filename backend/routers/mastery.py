@@ -0,0 +1,41 @@
+"""
+Cohort mastery endpoint
+Instructor view over many students' mastery profiles: weakest topics, exam
+readiness and spaced-review queues
+"""
+from fastapi import APIRouter, HTTPException
+from starlette.concurrency import run_in_threadpool
+
+import fast_json
+from cohort_analytics import analyze_cohort
+from schemas import CohortRequest
+
+router = APIRouter(prefix="/v1/mastery", tags=["mastery"])
+
+
+def _analyze(request: CohortRequest) -> dict:
+    try:
+        return analyze_cohort(
+            [(student.student_id, student.topics) for student in request.students],
+            request.exam_topics,
+            request.as_of,
+            request.queue_limit,
+            request.top,
+        )
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid mastery data: {e}")
+
+
+@router.post("/cohort")
+async def cohort_mastery(request: CohortRequest):
+    """
+    Per-topic weakness, exam readiness and review queues for a whole cohort
+
+    Uses the extension's rules: topics below a score of 3 are weak, readiness
+    is the mean exam-topic score as a percentage (80 Ready, 60 Needs Work),
+    and reviews are due 1, 3 or 7 days after the last one depending on score.
+    """
+    if not request.students:
+        raise HTTPException(status_code=400, detail="students is required")
+    # Analyze in the threadpool, and skip jsonable_encoder for the (plain JSON) result
+    return fast_json.FastJSONResponse(await run_in_threadpool(_analyze, request))
@@ -0,0 +1,210 @@
+"""
+Sandboxed execution of instructor test cases against lab submissions
+Each submission runs in a fresh `python -I` process (sandbox_harness.py) in an
+empty temporary directory, with CPU time, address space, file size and
+wall-clock limits and no environment variables beyond PATH. An audit hook in
+the harness blocks network access, starting processes, links, changes outside
+that directory and reads outside it and the Python installation (see
+sandbox_harness.py for what it cannot prevent). A semaphore sized to the CPU
+count bounds how many sandboxes run at once, so a section's submissions are
+tested in parallel without oversubscribing the machine.
+
+The harness applies the resource limits itself as it starts, before any
+submission code runs; nothing runs between fork and exec in this process,
+which is not safe with the threads the backend runs. With TEST_SANDBOX_USER set
+(the backend must run as root), subprocess starts the process as that user
+with no supplementary groups, so the OS refuses it everything the user may not
+touch. The harness is passed as source, so the user needs access to the Python
+installation but not to the backend directory.
+
+Resource limits and the sandbox user need POSIX; elsewhere (Windows) only the
+wall-clock timeout and the audit hook apply.
+
+Environment:
+    TEST_RUNNER_WORKERS   Sandboxes running at once per process (default: CPU count)
+    TEST_CPU_S            CPU seconds per submission (default: 10)
+    TEST_MEMORY_MB        Address space per submission (default: 512)
+    TEST_TIMEOUT_S        Wall-clock seconds per submission (default: 20)
+    TEST_CASE_TIMEOUT_S   Wall-clock seconds per test case (default: 2)
+    TEST_SANDBOX_USER     Unprivileged user to run sandboxes as, e.g. nobody (default: unset, the backend's user)
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import metrics
+from sandbox_harness import MAX_ERROR_CHARS
+
+try:
+    import pwd
+except ImportError:  # Windows
+    pwd = None
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.getenv("TEST_RUNNER_WORKERS", str(os.cpu_count() or 2)))
+CPU_SECONDS = int(os.getenv("TEST_CPU_S", "10"))
+MEMORY_MB = int(os.getenv("TEST_MEMORY_MB", "512"))
+TIMEOUT = float(os.getenv("TEST_TIMEOUT_S", "20"))
+CASE_TIMEOUT = float(os.getenv("TEST_CASE_TIMEOUT_S", "2"))
+# Resolved at import: a misspelled user fails startup instead of running sandboxes as root
+SANDBOX_USER = pwd.getpwnam(os.environ["TEST_SANDBOX_USER"]) if pwd and os.getenv("TEST_SANDBOX_USER") else None
+
+HARNESS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_harness.py")
+with open(HARNESS, encoding="utf-8") as _harness:
+    HARNESS_SOURCE = _harness.read()
+MAX_FILE_BYTES = 1 << 20
+MAX_OUTPUT_BYTES = 4 << 20
+
+TEST_RUN_SECONDS = metrics.Histogram(
+    "contextweave_test_run_seconds",
+    "Wall-clock time to run one submission's test cases in the sandbox"
+)
+
+TEST_CASES = metrics.Counter(
+    "contextweave_test_cases_total",
+    "Instructor test cases run against submissions, by result",
+    ["result"]
+)
+
+_slots: Dict[int, asyncio.Semaphore] = {}
+
+
+def _sandbox_slots() -> asyncio.Semaphore:
+    loop_id = id(asyncio.get_running_loop())
+    if loop_id not in _slots:
+        _slots[loop_id] = asyncio.Semaphore(WORKERS)
+    return _slots[loop_id]
+
+
+# Applied by the harness with resource.setrlimit before the submission is written
+LIMITS = {
+    "RLIMIT_CPU": CPU_SECONDS,
+    "RLIMIT_AS": MEMORY_MB * 1024 * 1024,
+    "RLIMIT_FSIZE": MAX_FILE_BYTES,
+    "RLIMIT_CORE": 0,
+}
+
+
+def _sandbox_env() -> Dict[str, str]:
+    env = {"PATH": os.defpath, "PYTHONDONTWRITEBYTECODE": "1", "PYTHONHASHSEED": "0"}
+    if "SYSTEMROOT" in os.environ:  # Needed by Python on Windows
+        env["SYSTEMROOT"] = os.environ["SYSTEMROOT"]
+    return env
+
+
+def _failed(test_cases, error: str) -> List[Dict]:
+    # sandbox_failed: the run, not the submission's own result; callers must not cache it
+    return [{"name": case.name, "passed": False, "error": error, "sandbox_failed": True} for case in test_cases]
+
+
+def _parse_results(stdout: bytes, test_cases) -> Optional[List[Dict]]:
+    """The harness's results line, or None unless it has one well-formed result per test case"""
+    try:
+        results = json.loads(stdout.splitlines()[-1])
+        if len(results) != len(test_cases):
+            return None
+        # Names come from the request; errors are bounded whatever the process wrote
+        return [
+            {"name": case.name, "passed": result["passed"] is True,
+             "error": None if result["error"] is None else str(result["error"])[:MAX_ERROR_CHARS]}
+            for case, result in zip(test_cases, results)
+        ]
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+async def run_tests(files, test_cases) -> List[Dict]:
+    """
+    Run test cases against one submission in a sandboxed process
+
+    Args:
+        files: Objects with path and content (FileSubmission)
+        test_cases: Objects with name and code (LabTestCase)
+
+    Returns:
+        One {"name", "passed", "error"} dict per test case, in order. A
+        submission that crashes the sandbox or exceeds a limit fails every
+        case it did not finish; those results also carry "sandbox_failed".
+    """
+    payload = json.dumps({
+        "files": [{"path": f.path, "content": f.content} for f in files],
+        "tests": [{"name": case.name, "code": case.code} for case in test_cases],
+        "case_timeout": CASE_TIMEOUT,
+        "limits": LIMITS,
+    }).encode("utf-8")
+    # Dropped by subprocess itself (no preexec_fn), with no supplementary groups
+    privileges = (
+        {"user": SANDBOX_USER.pw_uid, "group": SANDBOX_USER.pw_gid, "extra_groups": []}
+        if SANDBOX_USER else {}
+    )
+
+    async with _sandbox_slots():
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix="contextweave-sandbox-") as workdir:
+            if SANDBOX_USER:
+                os.chown(workdir, SANDBOX_USER.pw_uid, SANDBOX_USER.pw_gid)
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-I", "-c", HARNESS_SOURCE,
+                cwd=workdir,
+                env=_sandbox_env(),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                limit=MAX_OUTPUT_BYTES,
+                **privileges
+            )
+            try:
+                stdout, _ = await asyncio.wait_for(process.communicate(payload), timeout=TIMEOUT)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                stdout = None
+        TEST_RUN_SECONDS.observe(time.perf_counter() - start)
+
+    if stdout is None:
+        results = _failed(test_cases, f"Timed out after {TIMEOUT:g}s")
+    else:
+        results = _parse_results(stdout, test_cases)
+        if results is None and process.returncode and process.returncode < 0:
+            # Killed by a signal: SIGXCPU for the CPU limit, SIGKILL/SIGSEGV for memory
+            results = _failed(test_cases, f"Sandbox killed by signal {-process.returncode} (resource limit exceeded)")
+        elif results is None:
+            results = _failed(test_cases, f"Sandbox exited with code {process.returncode} without results")
+
+    for result in results:
+        TEST_CASES.inc(result="passed" if result["passed"] else "failed")
+    return results
+
+
+def score_test_results(criterion: str, results: List[Dict]) -> Optional[Dict]:
+    """
+    Evaluation for a criterion from its test results: points in proportion
+    to the cases passed ("fraction"), labelled Met when all pass
+
+    Returns:
+        Evaluation dict with criterion/score/feedback/fraction, or None when
+        there are no results
+    """
+    if not results:
+        return None
+    passed = sum(result["passed"] for result in results)
+    fraction = passed / len(results)
+    if passed == len(results):
+        score = "Met"
+    elif fraction >= 0.5:
+        score = "Partial"
+    else:
+        score = "Not Met"
+
+    feedback = f"[Tests] {passed} of {len(results)} test cases passed."
+    failures = [r for r in results if not r["passed"]]
+    if failures:
+        details = "; ".join(f"{r['name']}: {r['error'] or 'failed'}" for r in failures[:5])
+        feedback += f" Failing: {details}" + (" and others." if len(failures) > 5 else ".")
+    return {"criterion": criterion, "score": score, "feedback": feedback, "fraction": fraction}
@@ -0,0 +1,265 @@
+"""
+Sandbox harness for lab test cases
+Started by sandbox.py as `python -I -c <this file's source>` in an empty
+temporary directory (as TEST_SANDBOX_USER when set). Reads {"files": [...],
+"tests": [...], "case_timeout": seconds, "limits": {"RLIMIT_CPU": value, ...}}
+as JSON on stdin, applies the resource limits (soft and hard, so the
+submission cannot raise them), writes the submission files, imports
+them and runs each test case's code in a namespace holding the submission's
+top-level names. Writes one JSON results line to a private copy of stdout and
+exits immediately, so nothing the submission registered runs after it. File
+descriptors 1 and 2 point to /dev/null while the submission runs: what it
+prints, even through sys.__stdout__, is never read as results.
+
+Only the standard library is used. Once the files are written, an audit hook
+blocks, for the rest of the run (audit hooks cannot be removed):
+    - network access, starting processes, signals, ctypes and hard or symbolic links
+    - writing, creating, deleting, renaming or changing the mode, owner or times
+      of anything outside the working directory
+    - reading anything outside the working directory and the Python installation
+Paths are checked after resolving symlinks, whether given as str, bytes, a
+file descriptor or relative to a dir_fd.
+
+The test cases run in the submission's process, so a submission written to
+attack the grader can still make its own cases report as passed (by patching
+what they call, or writing to the results descriptor). The sandbox protects
+the host and the other submissions, not the score of the one it runs; run the
+backend with TEST_SANDBOX_USER for an OS-level boundary as well.
+"""
+import importlib.util
+import json
+import os
+import signal
+import sys
+import traceback
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BLOCKED_EVENTS = (
+    "socket.",
+    "subprocess.Popen",
+    "os.system",
+    "os.exec",
+    "os.posix_spawn",
+    "os.spawn",
+    "os.fork",
+    "os.forkpty",
+    "os.startfile",
+    "os.kill",
+    "ctypes.",
+    "os.symlink",
+    "os.link",
+)
+
+# Events that change the filesystem: (path, dir_fd) argument positions of each path
+PATH_EVENTS = {
+    "os.remove": ((0, 1),),
+    "os.rmdir": ((0, 1),),
+    "os.mkdir": ((0, 2),),
+    "os.rename": ((0, 2), (1, 3)),
+    "os.chmod": ((0, 2),),
+    "os.chown": ((0, 3),),
+    "os.utime": ((0, 3),),
+    "os.truncate": ((0, None),),
+    "shutil.rmtree": ((0, 1),),
+}
+
+# Events that list a directory: (path,)
+LIST_EVENTS = ("os.listdir", "os.scandir")
+
+WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_APPEND
+
+MAX_ERROR_CHARS = 500
+
+# Bound before any submission code runs, in case it patches builtins or json
+_exec = exec
+_compile = compile
+_dumps = json.dumps
+_write = os.write
+_exit = os._exit
+
+
+class CaseTimeout(Exception):
+    pass
+
+
+def _resolve(path, dir_fd=-1) -> Optional[str]:
+    """Absolute path with symlinks resolved, or None when it cannot be told"""
+    try:
+        if isinstance(path, int):
+            # An open descriptor: whatever it was opened as (a pipe or socket is not a path)
+            path = os.readlink(f"/proc/self/fd/{path}")
+            return os.path.realpath(path) if os.path.isabs(path) else None
+        path = os.fsdecode(path)
+        if dir_fd not in (None, -1):
+            base = os.readlink(f"/proc/self/fd/{dir_fd}")
+            if not os.path.isabs(base):
+                return None
+            path = os.path.join(base, path)
+        return os.path.realpath(path)
+    except (OSError, TypeError, ValueError):
+        return None
+
+
+def _inside(path: Optional[str], roots) -> bool:
+    return path is not None and any(path == root or path.startswith(root + os.sep) for root in roots)
+
+
+def _install_audit_hook(workdir: str):
+    writable = (workdir,)
+    readable = (workdir, os.devnull) + tuple({
+        os.path.realpath(prefix)
+        for prefix in (sys.prefix, sys.base_prefix, sys.exec_prefix, sys.base_exec_prefix)
+    })
+
+    def hook(event, args):
+        if event.startswith(BLOCKED_EVENTS):
+            raise PermissionError(f"Blocked in sandbox: {event}")
+        if event == "open" and args:
+            mode = args[1] if len(args) > 1 and isinstance(args[1], str) else "r"
+            flags = args[2] if len(args) > 2 and isinstance(args[2], int) else 0
+            writing = any(c in mode for c in "wax+") or flags & WRITE_FLAGS
+            if not _inside(_resolve(args[0]), writable if writing else readable):
+                raise PermissionError(
+                    "Blocked in sandbox: " + ("writing outside" if writing else "reading outside")
+                    + " the working directory"
+                )
+        elif event in PATH_EVENTS:
+            for path, dir_fd in PATH_EVENTS[event]:
+                dir_fd = args[dir_fd] if dir_fd is not None and dir_fd < len(args) else -1
+                if not _inside(_resolve(args[path], dir_fd), writable):
+                    raise PermissionError(f"Blocked in sandbox: {event} outside the working directory")
+        elif event in LIST_EVENTS and args:
+            if not _inside(_resolve(args[0] if args[0] is not None else "."), readable):
+                raise PermissionError(f"Blocked in sandbox: {event} outside the working directory")
+
+    sys.addaudithook(hook)
+
+
+def _on_alarm(signum, frame):
+    raise CaseTimeout()
+
+
+def _apply_limits(limits):
+    """Set each RLIMIT_* to its value, capped at an existing hard limit"""
+    if resource is None:
+        return
+    for name, value in limits.items():
+        kind = getattr(resource, name)
+        hard = resource.getrlimit(kind)[1]
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        resource.setrlimit(kind, (value, value))
+
+
+def _write_submission(files, workdir: str) -> list:
+    """Write the submission's files; return the paths of its Python files"""
+    paths = []
+    for file in files:
+        relative = os.path.normpath(file.get("path") or "main.py").lstrip(os.sep)
+        if relative.startswith(".."):
+            continue
+        path = os.path.join(workdir, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write(file.get("content") or "")
+        if path.endswith(".py"):
+            paths.append(path)
+    return paths
+
+
+def _import_submission(paths, workdir: str) -> dict:
+    """Import the submission's Python files; return their merged top-level names"""
+    sys.path.insert(0, workdir)
+    namespace = {}
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+        namespace[name] = module
+        namespace.update({k: v for k, v in vars(module).items() if not k.startswith("_")})
+    return namespace
+
+
+def _error_text(e: BaseException) -> str:
+    text = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+    return text[:MAX_ERROR_CHARS]
+
+
+def _send(fd: int, data: bytes):
+    while data:
+        data = data[_write(fd, data):]
+
+
+def main():
+    request = json.loads(sys.stdin.read())
+    _apply_limits(request.get("limits", {}))
+    # Results go to a private copy of stdout; the submission's fds 1 and 2 go nowhere
+    results_fd = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    workdir = os.path.realpath(os.getcwd())
+    case_timeout = float(request.get("case_timeout", 2.0))
+    alarm = hasattr(signal, "setitimer")
+    if alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+
+    paths = _write_submission(request.get("files", []), workdir)
+    _install_audit_hook(workdir)
+
+    results = []
+    try:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, case_timeout)
+        namespace = _import_submission(paths, workdir)
+        load_error = None
+    except BaseException as e:
+        load_error = "Submission failed to load: " + (
+            "timed out" if isinstance(e, CaseTimeout) else _error_text(e)
+        )
+        namespace = {}
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    for test in request.get("tests", []):
+        result = {"name": test.get("name", ""), "passed": False, "error": load_error}
+        if load_error is None:
+            try:
+                code = _compile(test.get("code", ""), f"<test {result['name']}>", "exec")
+                if alarm:
+                    signal.setitimer(signal.ITIMER_REAL, case_timeout)
+                _exec(code, dict(namespace))
+                result["passed"] = True
+            except CaseTimeout:
+                result["error"] = f"Timed out after {case_timeout:g}s"
+            except AssertionError as e:
+                result["error"] = _error_text(e) if str(e) else "Assertion failed"
+            except MemoryError:
+                result["error"] = "Memory limit exceeded"
+            except BaseException as e:
+                # Innermost frame in the submission or the test case
+                frames = [
+                    f for f in traceback.extract_tb(e.__traceback__)
+                    if f.filename.startswith((workdir, "<test "))
+                ]
+                where = f" ({os.path.basename(frames[-1].filename)}, line {frames[-1].lineno})" if frames else ""
+                result["error"] = _error_text(e) + where
+            finally:
+                if alarm:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+        results.append(result)
+
+    _send(results_fd, (_dumps(results) + "\n").encode("utf-8"))
+    _exit(0)
+
+
+if __name__ == "__main__":
+    main()
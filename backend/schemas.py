@@ -1,8 +1,9 @@
 """
 Pydantic models for request/response validation
 """
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from datetime import date
+from pydantic import AliasChoices, BaseModel, Field
+from typing import Any, Dict, List, Optional
 
 
 class ContextRequest(BaseModel):
@@ -35,3 +36,21 @@ class ContextResponse(BaseModel):
     related_files: List[RelatedFile] = Field(default_factory=list, description="Related files to read next")
     weird_code_explanation: Optional[str] = Field(None, description="Explanation of selected code if provided")
     metadata: dict = Field(default_factory=dict, description="Additional metadata about the analysis")
+
+
+class StudentMastery(BaseModel):
+    """One student's mastery profile; the extension's {"userId", "topics"} is accepted as-is"""
+    student_id: str = Field(..., validation_alias=AliasChoices("student_id", "userId"), description="Student identifier")
+    # Plain dicts because a cohort has hundreds of thousands of them
+    topics: Dict[str, Dict[str, Any]] = Field(
+        default_factory=dict, description='Per topic: {"score", "attempts", "hint_usage", "last_review"}'
+    )
+
+
+class CohortRequest(BaseModel):
+    """Request model for /v1/mastery/cohort endpoint"""
+    students: List[StudentMastery] = Field(default_factory=list, description="Mastery profile of every student")
+    exam_topics: Optional[List[str]] = Field(None, description="Topics of an upcoming exam; readiness is skipped without them")
+    as_of: Optional[date] = Field(None, description="Day the schedule is computed for (default: today)")
+    queue_limit: int = Field(5, description="Topics listed in each student's review queue", ge=0, le=100)
+    top: int = Field(20, description="Students listed in each cohort ranking", ge=1, le=1000)
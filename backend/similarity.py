@@ -0,0 +1,250 @@
+"""
+Near-duplicate detection across submissions (MinHash + LSH)
+Code is tokenized and normalized (identifiers, strings and numbers replaced by
+placeholders, comments and layout dropped), so renaming variables or
+reformatting does not hide a copy. Overlapping token shingles are summarized
+by a MinHash signature whose agreement with another signature estimates the
+Jaccard similarity of their shingle sets. Signatures are split into LSH bands,
+and each band is stored under its own key, so finding candidates for a new
+submission reads a few index ranges instead of comparing against every
+earlier submission. Candidates are then confirmed by their estimated
+similarity.
+
+Submissions are indexed per section (a class or lab) incrementally, as they
+arrive. The index lives in the shared store (store.py) so all workers see it,
+or in process memory when the store is off; it is kept out of the store's
+size eviction and expires only after SIMILARITY_TTL_S.
+
+Environment:
+    SIMILARITY_THRESHOLD   Estimated Jaccard similarity reported as a near-duplicate (default: 0.8)
+    SIMILARITY_TTL_S       How long indexed submissions are kept (default: 10368000, 120 days)
+"""
+import builtins
+import hashlib
+import io
+import keyword
+import os
+import random
+import re
+import time
+import tokenize
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+from store import content_hash, get_store, register_durable
+
+THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.8"))
+TTL = float(os.getenv("SIMILARITY_TTL_S", str(120 * 24 * 3600)))
+
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+# 16 bands of 8 rows: pairs at Jaccard 0.8 become candidates ~95% of the time, at 0.5 ~6%
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(42)  # Fixed: signatures must be comparable across processes and restarts
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+NS_SIGNATURE = "similarity_signature"
+NS_BUCKET = "similarity_bucket"
+# A section's index is built once, as submissions arrive: evicting part of it would hide copies
+register_durable(NS_SIGNATURE, NS_BUCKET)
+
+KEEP_NAMES = set(keyword.kwlist) | set(dir(builtins)) | {
+    # Common keywords of the other languages students submit
+    "function", "var", "let", "const", "new", "this", "null", "undefined", "public", "private",
+    "static", "void", "int", "long", "double", "float", "char", "boolean", "string", "String",
+    "switch", "case", "do", "extends", "implements", "interface", "package", "throw", "throws",
+}
+
+_TOKEN = re.compile(r"[A-Za-z_]\w*|\d+(?:\.\d+)?|\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|==|!=|<=|>=|&&|\|\||\S")
+_COMMENTS = re.compile(r"//[^\n]*|/\*.*?\*/|#[^\n]*", re.S)
+
+SIMILARITY_CANDIDATES = metrics.Histogram(
+    "contextweave_similarity_candidates",
+    "LSH candidates checked per near-duplicate query",
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+)
+
+NEAR_DUPLICATES = metrics.Counter(
+    "contextweave_near_duplicate_queries_total",
+    "Near-duplicate queries, by whether a match was found",
+    ["result"]
+)
+
+
+def _normalize(name: str) -> str:
+    return name if name in KEEP_NAMES else "ID"
+
+
+def _python_tokens(code: str) -> List[str]:
+    tokens = []
+    skip = {tokenize.COMMENT, tokenize.NL, tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT, tokenize.ENCODING}
+    previous = tokenize.NEWLINE
+    for token in tokenize.generate_tokens(io.StringIO(code).readline):
+        kind = token.type
+        if kind in skip or kind == tokenize.ENDMARKER:
+            previous = kind if kind in (tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT) else previous
+            continue
+        if kind == tokenize.STRING:
+            # Docstrings (a string statement on its own) are documentation, not code
+            if previous in (tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT):
+                previous = kind
+                continue
+            tokens.append("STR")
+        elif kind == tokenize.NUMBER:
+            tokens.append("NUM")
+        elif kind == tokenize.NAME:
+            tokens.append(_normalize(token.string))
+        else:
+            tokens.append(token.string)
+        previous = kind
+    return tokens
+
+
+def normalized_tokens(code: str) -> List[str]:
+    """Code tokens with identifiers, literals, comments and layout normalized away"""
+    try:
+        return _python_tokens(code)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        pass
+    tokens = []
+    for token in _TOKEN.findall(_COMMENTS.sub(" ", code)):
+        if token[0] in "\"'":
+            tokens.append("STR")
+        elif token[0].isdigit():
+            tokens.append("NUM")
+        elif token[0].isalpha() or token[0] == "_":
+            tokens.append(_normalize(token))
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def shingles(tokens: List[str], size: int = SHINGLE_SIZE) -> Set[int]:
+    """64-bit hashes of overlapping token windows (the whole sequence if shorter)"""
+    windows = [tokens[i:i + size] for i in range(max(len(tokens) - size + 1, 1))] if tokens else []
+    return {
+        int.from_bytes(hashlib.blake2b(" ".join(window).encode("utf-8"), digest_size=8).digest(), "big") & _PRIME
+        for window in windows
+    }
+
+
+def minhash(shingle_set: Set[int]) -> List[int]:
+    """MinHash signature: the minimum of each permutation over the shingles"""
+    if not shingle_set:
+        return []
+    values = list(shingle_set)
+    return [min((a * x + b) % _PRIME for x in values) for a, b in _PERMUTATIONS]
+
+
+def signature_for(code: str) -> List[int]:
+    return minhash(shingles(normalized_tokens(code)))
+
+
+def estimated_similarity(first: List[int], second: List[int]) -> float:
+    """Fraction of agreeing signature positions, an estimate of Jaccard similarity"""
+    if not first or len(first) != len(second):
+        return 0.0
+    return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+def _band_keys(section_key: str, signature: List[int]) -> List[str]:
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(",".join(map(str, rows)).encode("ascii"), digest_size=8).hexdigest()
+        keys.append(f"{section_key}:{band}:{digest}:")
+    return keys
+
+
+class SimilarityIndex:
+    """Per-section LSH index of submission signatures"""
+
+    def __init__(self):
+        # In-process fallback when the shared store is off
+        self._signatures: Dict[str, Dict] = {}
+        self._buckets: Dict[str, Set[str]] = defaultdict(set)
+
+    async def _candidates(self, band_keys: List[str]) -> Set[str]:
+        store = get_store()
+        found: Set[str] = set()
+        for band_key in band_keys:
+            if store:
+                found.update(key[len(band_key):] for key, _ in await store.aitems(NS_BUCKET, band_key))
+            else:
+                found.update(self._buckets.get(band_key, ()))
+        return found
+
+    async def _get(self, signature_key: str) -> Optional[Dict]:
+        store = get_store()
+        if store:
+            return await store.aget(NS_SIGNATURE, signature_key)
+        return self._signatures.get(signature_key)
+
+    async def _add(self, signature_key: str, band_keys: List[str], submission_id: str, entry: Dict):
+        store = get_store()
+        if store:
+            await store.aset(NS_SIGNATURE, signature_key, entry, ttl=TTL)
+            for band_key in band_keys:
+                await store.aset(NS_BUCKET, band_key + submission_id, 1, ttl=TTL)
+        else:
+            self._signatures[signature_key] = entry
+            for band_key in band_keys:
+                self._buckets[band_key].add(submission_id)
+
+    async def check(
+        self,
+        section_id: str,
+        submission_id: str,
+        code: str,
+        insert: bool = True,
+        threshold: Optional[float] = None
+    ) -> List[Dict]:
+        """
+        Find earlier submissions in a section that are near-duplicates of this one
+
+        Args:
+            section_id: Class, lab or assignment the submission belongs to
+            submission_id: Unique id of the submission (e.g. the student id)
+            code: Submission code (all files concatenated)
+            insert: Add the submission to the index after the lookup
+            threshold: Minimum estimated similarity (default: SIMILARITY_THRESHOLD)
+
+        Returns:
+            [{"submission_id", "similarity"}] sorted by similarity, highest first
+        """
+        threshold = THRESHOLD if threshold is None else threshold
+        # Pure-Python hashing: keep large submissions off the event loop
+        signature = await run_in_threadpool(signature_for, code)
+        if not signature:
+            return []
+
+        section_key = content_hash(section_id)[:16]
+        band_keys = _band_keys(section_key, signature)
+        candidates = await self._candidates(band_keys)
+        candidates.discard(submission_id)
+        SIMILARITY_CANDIDATES.observe(len(candidates))
+
+        matches = []
+        for candidate in candidates:
+            entry = await self._get(f"{section_key}:{candidate}")
+            if not entry:
+                continue
+            similarity = estimated_similarity(signature, entry["signature"])
+            if similarity >= threshold:
+                matches.append({"submission_id": candidate, "similarity": round(similarity, 3)})
+        matches.sort(key=lambda match: match["similarity"], reverse=True)
+        NEAR_DUPLICATES.inc(result="match" if matches else "no_match")
+
+        if insert:
+            entry = {"signature": signature, "indexed_at": time.time()}
+            await self._add(f"{section_key}:{submission_id}", band_keys, submission_id, entry)
+        return matches
+
+
+index = SimilarityIndex()
@@ -0,0 +1,331 @@
+"""
+Static pre-analysis of lab submissions
+Parses Python files with the ast module and measures what does not need an
+LLM: docstring coverage, naming and layout issues, test functions and
+assertions, loop nesting and recursion. Rubric criteria about documentation,
+code style and tests are scored from these signals directly; the remaining
+criteria go to the LLM with the relevant findings attached. Scores are
+deterministic: the same files always get the same result.
+
+Only Python files are analyzed. Criteria are left to the LLM when a
+submission has no Python files or a file does not parse.
+
+Environment:
+    LAB_STATIC_ANALYSIS   Score static criteria without the LLM: "1" or "0" (default: 1)
+"""
+import ast
+import os
+import re
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+STATIC_ANALYSIS = os.getenv("LAB_STATIC_ANALYSIS", "1") != "0"
+
+MAX_LINE_LENGTH = 100
+MAX_FUNCTION_LINES = 50
+
+# "_" and "__" are the conventional throwaway names
+SNAKE_CASE = re.compile(r"^(_+|_{0,2}[a-z][a-z0-9_]*(__)?)$")
+CONSTANT_CASE = re.compile(r"^_?[A-Z][A-Z0-9_]*$")
+CAP_WORDS = re.compile(r"^_?[A-Z][a-zA-Z0-9]*$")
+AMBIGUOUS_NAMES = {"l", "O", "I"}
+BIG_O = re.compile(r"\bO\s*\(\s*[^)]*\)")
+
+# Whole words in a criterion name that mark each kind of static signal
+CRITERION_WORDS = {
+    "documentation": re.compile(r"\b(docs?|docstrings?|document\w*|comments?|commented|commenting)\b"),
+    "code_style": re.compile(r"\b(style|styling|stylistic|naming|readab\w*)\b"),
+    "tests": re.compile(r"\b(tests?|testing|tested|unittests?)\b"),
+    "complexity": re.compile(r"\b(complex\w*|efficien\w*|performan\w*)\b"),
+}
+
+
+class FunctionFindings(BaseModel):
+    name: str
+    lines: int
+    has_docstring: bool
+    loop_depth: int  # Deepest nesting of for/while loops
+    recursive: bool
+    halves_input: bool  # Loop that divides an index or size by two (logarithmic)
+
+
+class StaticFindings(BaseModel):
+    python_files: int = 0
+    syntax_errors: List[str] = []
+    module_docstrings: int = 0
+    functions: List[FunctionFindings] = []
+    classes: int = 0
+    classes_documented: int = 0
+    naming_issues: List[str] = []
+    long_lines: int = 0
+    mixed_indentation: bool = False
+    test_functions: int = 0
+    assertions: int = 0
+    has_main_checks: bool = False  # `if __name__ == "__main__":` block calling code
+    complexity_explained: bool = False  # O(...) in a docstring or comment
+
+    @property
+    def analyzed(self) -> bool:
+        return self.python_files > 0 and not self.syntax_errors
+
+    @property
+    def documentable(self) -> int:
+        return self.python_files + len(self.functions) + self.classes
+
+    @property
+    def documented(self) -> int:
+        return self.module_docstrings + sum(f.has_docstring for f in self.functions) + self.classes_documented
+
+
+class _Visitor(ast.NodeVisitor):
+    """Collects per-file findings into a StaticFindings"""
+
+    def __init__(self, findings: StaticFindings, is_test_file: bool):
+        self.findings = findings
+        self.is_test_file = is_test_file
+        self.function_stack: List[str] = []
+        self.loop_depth = 0
+        self.max_loop_depth: List[int] = []
+        self.calls: List[set] = []
+        self.halves: List[bool] = []
+
+    def _check_name(self, name: str, pattern, kind: str, line: int):
+        if name in AMBIGUOUS_NAMES or not pattern.match(name):
+            self.findings.naming_issues.append(f"{kind} '{name}' (line {line})")
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self.findings.classes += 1
+        self.findings.classes_documented += ast.get_docstring(node) is not None
+        self._check_name(node.name, CAP_WORDS, "class", node.lineno)
+        self.generic_visit(node)
+
+    def visit_FunctionDef(self, node):
+        self._check_name(node.name, SNAKE_CASE, "function", node.lineno)
+        for arg in node.args.args + node.args.kwonlyargs:
+            if arg.arg not in ("self", "cls"):
+                self._check_name(arg.arg, SNAKE_CASE, "argument", node.lineno)
+
+        is_test = node.name.startswith("test")
+        if is_test and (self.is_test_file or not self.function_stack):
+            self.findings.test_functions += 1
+
+        self.function_stack.append(node.name)
+        self.max_loop_depth.append(0)
+        self.calls.append(set())
+        self.halves.append(False)
+        outer_depth, self.loop_depth = self.loop_depth, 0
+        self.generic_visit(node)
+        self.loop_depth = outer_depth
+        self.function_stack.pop()
+
+        self.findings.functions.append(FunctionFindings(
+            name=node.name,
+            lines=(node.end_lineno or node.lineno) - node.lineno + 1,
+            has_docstring=ast.get_docstring(node) is not None,
+            loop_depth=self.max_loop_depth.pop(),
+            recursive=node.name in self.calls.pop(),
+            halves_input=self.halves.pop()
+        ))
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def _visit_loop(self, node):
+        self.loop_depth += 1
+        if self.max_loop_depth:
+            self.max_loop_depth[-1] = max(self.max_loop_depth[-1], self.loop_depth)
+        self.generic_visit(node)
+        self.loop_depth -= 1
+
+    visit_For = visit_AsyncFor = visit_While = _visit_loop
+
+    def visit_BinOp(self, node: ast.BinOp):
+        halving = (
+            isinstance(node.op, (ast.FloorDiv, ast.Div)) and isinstance(node.right, ast.Constant) and node.right.value == 2
+        ) or (
+            isinstance(node.op, ast.RShift) and isinstance(node.right, ast.Constant) and node.right.value == 1
+        )
+        if halving and self.loop_depth and self.halves:
+            self.halves[-1] = True
+        self.generic_visit(node)
+
+    def visit_Call(self, node: ast.Call):
+        if isinstance(node.func, ast.Name) and self.calls:
+            self.calls[-1].add(node.func.id)
+        if isinstance(node.func, ast.Attribute) and node.func.attr.startswith("assert"):
+            self.findings.assertions += 1
+        self.generic_visit(node)
+
+    def visit_Assert(self, node: ast.Assert):
+        self.findings.assertions += 1
+        self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name):
+        if isinstance(node.ctx, ast.Store) and self.function_stack:
+            self._check_name(node.id, SNAKE_CASE, "variable", node.lineno)
+        elif isinstance(node.ctx, ast.Store) and not (SNAKE_CASE.match(node.id) or CONSTANT_CASE.match(node.id)):
+            self.findings.naming_issues.append(f"variable '{node.id}' (line {node.lineno})")
+
+    def visit_If(self, node: ast.If):
+        test = node.test
+        if (
+            not self.function_stack
+            and isinstance(test, ast.Compare)
+            and isinstance(test.left, ast.Name) and test.left.id == "__name__"
+            and any(isinstance(n, ast.Call) for n in ast.walk(node))
+        ):
+            self.findings.has_main_checks = True
+        self.generic_visit(node)
+
+
+def _is_test_path(path: str) -> bool:
+    name = os.path.basename(path or "").lower()
+    return name.startswith("test") or name.endswith("_test.py")
+
+
+def analyze_files(files) -> StaticFindings:
+    """
+    Collect static signals from the Python files of a submission
+
+    Args:
+        files: Objects with path and content (FileSubmission)
+
+    Returns:
+        Findings over all Python files; analyzed is False when there is
+        nothing reliable to score
+    """
+    findings = StaticFindings()
+    for file in files:
+        if not (file.path or "").endswith(".py"):
+            continue
+        content = file.content or ""
+        findings.python_files += 1
+        try:
+            tree = ast.parse(content)
+        except SyntaxError as e:
+            findings.syntax_errors.append(f"{file.path}: line {e.lineno}: {e.msg}")
+            continue
+
+        findings.module_docstrings += ast.get_docstring(tree) is not None
+        _Visitor(findings, _is_test_path(file.path)).visit(tree)
+
+        lines = content.splitlines()
+        findings.long_lines += sum(len(line) > MAX_LINE_LENGTH for line in lines)
+        indents = {line[0] for line in lines if line[:1] in (" ", "\t") and line.strip()}
+        findings.mixed_indentation = findings.mixed_indentation or len(indents) > 1
+        findings.complexity_explained = findings.complexity_explained or bool(BIG_O.search(content))
+    return findings
+
+
+def criterion_kind(criterion: str) -> Optional[str]:
+    """
+    Which static signal a rubric criterion is about, judged from the words in
+    its name; None when no kind or more than one matches (e.g. "Documentation
+    of style choices" is for the LLM)
+    """
+    name = criterion.lower().replace("_", " ")
+    kinds = [kind for kind, words in CRITERION_WORDS.items() if words.search(name)]
+    return kinds[0] if len(kinds) == 1 else None
+
+
+def _label(ratio: float, met: float, partial: float) -> str:
+    if ratio >= met:
+        return "Met"
+    if ratio >= partial:
+        return "Partial"
+    return "Not Met"
+
+
+def _score_documentation(findings: StaticFindings) -> Dict:
+    total, documented = findings.documentable, findings.documented
+    ratio = documented / total if total else 0.0
+    missing = [f.name for f in findings.functions if not f.has_docstring]
+    feedback = f"Docstrings on {documented} of {total} modules, classes and functions ({ratio:.0%})."
+    if missing:
+        feedback += f" Add docstrings to: {', '.join(missing[:5])}" + (" and others." if len(missing) > 5 else ".")
+    return {"score": _label(ratio, 0.8, 0.4), "feedback": feedback}
+
+
+def _score_code_style(findings: StaticFindings) -> Dict:
+    long_functions = [f.name for f in findings.functions if f.lines > MAX_FUNCTION_LINES]
+    issues = []
+    if findings.naming_issues:
+        issues.append(
+            f"{len(findings.naming_issues)} name(s) not following PEP 8 naming, e.g. "
+            + ", ".join(findings.naming_issues[:3])
+        )
+    if findings.long_lines:
+        issues.append(f"{findings.long_lines} line(s) longer than {MAX_LINE_LENGTH} characters")
+    if findings.mixed_indentation:
+        issues.append("tabs and spaces mixed in indentation")
+    if long_functions:
+        issues.append(f"function(s) longer than {MAX_FUNCTION_LINES} lines: {', '.join(long_functions[:3])}")
+
+    if not issues:
+        return {"score": "Met", "feedback": "Names follow PEP 8, lines are short and indentation is consistent."}
+    score = "Partial" if len(findings.naming_issues) + findings.long_lines <= 5 and not findings.mixed_indentation else "Not Met"
+    return {"score": score, "feedback": "Style issues: " + "; ".join(issues) + "."}
+
+
+def _score_tests(findings: StaticFindings) -> Dict:
+    tests, asserts = findings.test_functions, findings.assertions
+    if tests >= 3 and asserts >= tests:
+        return {"score": "Met", "feedback": f"{tests} test functions with {asserts} assertions."}
+    if tests or asserts:
+        return {
+            "score": "Partial",
+            "feedback": f"{tests} test function(s) with {asserts} assertion(s). "
+                        "Add more test functions covering normal and edge cases, each with assertions."
+        }
+    if findings.has_main_checks:
+        return {
+            "score": "Partial",
+            "feedback": "Manual checks in the __main__ block print results but assert nothing. "
+                        "Turn them into test functions with assert statements."
+        }
+    return {"score": "Not Met", "feedback": "No tests found. Add test functions with assert statements."}
+
+
+SCORERS = {
+    "documentation": _score_documentation,
+    "code_style": _score_code_style,
+    "tests": _score_tests,
+}
+
+
+def score_criterion(findings: StaticFindings, criterion: str) -> Optional[Dict]:
+    """
+    Score a criterion from static findings alone
+
+    Returns:
+        Evaluation dict with criterion/score/feedback, or None when the
+        criterion needs the LLM
+    """
+    scorer = SCORERS.get(criterion_kind(criterion))
+    if not scorer or not findings.analyzed:
+        return None
+    evaluation = scorer(findings)
+    evaluation["criterion"] = criterion
+    evaluation["feedback"] = f"[Static analysis] {evaluation['feedback']}"
+    return evaluation
+
+
+def findings_text(findings: StaticFindings, criterion: str) -> str:
+    """Findings worth attaching to an LLM-scored criterion ("" when none apply)"""
+    if criterion_kind(criterion) != "complexity" or not findings.analyzed:
+        return ""
+    parts = []
+    for function in findings.functions:
+        if function.name.startswith("test"):
+            continue
+        traits = [f"loop nesting depth {function.loop_depth}"]
+        if function.halves_input:
+            traits.append("halves its range inside a loop")
+        if function.recursive:
+            traits.append("recursive")
+        parts.append(f"{function.name}: {', '.join(traits)}")
+    parts.append(
+        "Big-O complexity is mentioned in comments or docstrings" if findings.complexity_explained
+        else "No Big-O complexity is mentioned in comments or docstrings"
+    )
+    return "; ".join(parts)
@@ -0,0 +1,308 @@
+"""
+Shared local key/value store
+A small SQLite database (WAL mode) that every worker process opens, so caches
+such as analysis results, the co-change index and the hint cache are shared
+across workers and survive restarts instead of being rebuilt per process.
+Entries expire after a TTL, and evict() keeps the file under a size budget by
+dropping expired entries first and then the oldest ones. Namespaces holding
+durable state (batch jobs, baselines, indexes) are registered with
+register_durable() and only ever leave the store through their TTL.
+
+Environment:
+    CACHE_DB                Path of the SQLite file (default: backend/.cache/contextweave.db)
+                            Set to "off" to disable the shared store.
+    CACHE_TTL_S             Default entry lifetime in seconds (default: 604800, 7 days)
+    CACHE_MAX_MB            Size budget for cached values (default: 200)
+    CACHE_EVICT_INTERVAL_S  Seconds between eviction runs (default: 600)
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "contextweave.db")
+DEFAULT_TTL = float(os.getenv("CACHE_TTL_S", str(7 * 24 * 3600)))
+MAX_BYTES = int(float(os.getenv("CACHE_MAX_MB", "200")) * 1024 * 1024)
+EVICT_INTERVAL = float(os.getenv("CACHE_EVICT_INTERVAL_S", "600"))
+
+STORE_BYTES = metrics.Gauge(
+    "contextweave_cache_store_bytes",
+    "Size of cached values in the shared store, as of the last eviction run"
+)
+
+STORE_ENTRIES = metrics.Gauge(
+    "contextweave_cache_store_entries",
+    "Entries in the shared store, as of the last eviction run"
+)
+
+STORE_EVICTIONS = metrics.Counter(
+    "contextweave_cache_evictions_total",
+    "Entries removed from the shared store by this worker",
+    ["reason"]
+)
+
+
+# Namespaces the size budget never evicts from; see register_durable()
+_durable_namespaces = set()
+
+
+def register_durable(*namespaces: str):
+    """
+    Exempt namespaces from size eviction
+
+    For state that is not a cache and cannot be rebuilt, such as queued batch
+    jobs. Entries there still expire by TTL.
+    """
+    _durable_namespaces.update(namespaces)
+
+
+def cache_key(*parts: Any) -> str:
+    """Stable hash of the values that determine a cached result"""
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def content_hash(text: Optional[str]) -> str:
+    return hashlib.sha256((text or "").encode("utf-8", errors="ignore")).hexdigest()
+
+
+class SharedStore:
+    """Namespaced JSON key/value store backed by a WAL-mode SQLite file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._init_schema()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread: sqlite3 connections must not be shared
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL,
+                size INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_created ON entries (created_at)")
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        try:
+            row = self._conn().execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared store read failed: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        """
+        Store a JSON-serializable value
+        
+        Args:
+            namespace: Cache name, e.g. "analysis" or "hint"
+            key: Key within the namespace (see cache_key)
+            value: JSON-serializable value
+            ttl: Lifetime in seconds (default: CACHE_TTL_S); 0 keeps it until evicted
+        """
+        ttl = DEFAULT_TTL if ttl is None else ttl
+        now = time.time()
+        encoded = json.dumps(value, default=str)
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, created_at, expires_at, size) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, encoded, now, now + ttl if ttl > 0 else None, len(encoded))
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Shared store write failed: {e}")
+
+    def items(self, namespace: str, prefix: str = "") -> List[Tuple[str, Any]]:
+        """All live (key, value) pairs in a namespace whose key starts with prefix"""
+        # A key range rather than substr() so SQLite can use the primary key index
+        upper = prefix + "\U0010ffff"
+        try:
+            rows = self._conn().execute(
+                "SELECT key, value FROM entries WHERE namespace = ? AND key >= ? AND key < ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, prefix, upper, time.time())
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared store scan failed: {e}")
+            return []
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def delete(self, namespace: str, key: str):
+        try:
+            self._conn().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+        except sqlite3.Error as e:
+            logger.warning(f"Shared store write failed: {e}")
+
+    def compare_and_set(self, namespace: str, key: str, expected: Any, value: Any, ttl: Optional[float] = None) -> bool:
+        """
+        Replace a value only if it still equals `expected` (atomic across workers)
+        
+        Args:
+            expected: Current value; None to insert only if the key is missing or expired
+        
+        Returns:
+            True if the value was replaced (or inserted)
+        """
+        ttl = DEFAULT_TTL if ttl is None else ttl
+        now = time.time()
+        encoded = json.dumps(value, default=str)
+        expires_at = now + ttl if ttl > 0 else None
+        try:
+            if expected is None:
+                # An expired row may still be there until evicted: it counts as missing
+                cursor = self._conn().execute(
+                    "INSERT INTO entries (namespace, key, value, created_at, expires_at, size) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, "
+                    "created_at = excluded.created_at, expires_at = excluded.expires_at, size = excluded.size "
+                    "WHERE entries.expires_at IS NOT NULL AND entries.expires_at <= ?",
+                    (namespace, key, encoded, now, expires_at, len(encoded), now)
+                )
+            else:
+                cursor = self._conn().execute(
+                    "UPDATE entries SET value = ?, created_at = ?, expires_at = ?, size = ? "
+                    "WHERE namespace = ? AND key = ? AND value = ?",
+                    (encoded, now, expires_at, len(encoded),
+                     namespace, key, json.dumps(expected, default=str))
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Shared store write failed: {e}")
+            return False
+        return cursor.rowcount == 1
+
+    async def aget(self, namespace: str, key: str) -> Optional[Any]:
+        """get() from the threadpool, so lock waits never block the event loop"""
+        return await run_in_threadpool(self.get, namespace, key)
+
+    async def aset(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        await run_in_threadpool(self.set, namespace, key, value, ttl)
+
+    async def aitems(self, namespace: str, prefix: str = "") -> List[Tuple[str, Any]]:
+        return await run_in_threadpool(self.items, namespace, prefix)
+
+    async def adelete(self, namespace: str, key: str):
+        await run_in_threadpool(self.delete, namespace, key)
+
+    async def acompare_and_set(self, namespace: str, key: str, expected: Any, value: Any, ttl: Optional[float] = None) -> bool:
+        return await run_in_threadpool(self.compare_and_set, namespace, key, expected, value, ttl)
+
+    def evict(self, max_bytes: int = MAX_BYTES) -> int:
+        """
+        Drop expired entries, then the oldest entries until values fit in max_bytes
+
+        Durable namespaces count towards the budget but are never evicted for it.
+        
+        Safe to run from several workers at once: each pass is one write transaction.
+        
+        Returns:
+            Number of entries removed
+        """
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                expired = conn.execute(
+                    "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                    (time.time(),)
+                ).rowcount
+                total, count = conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries").fetchone()
+                oversize = 0
+                if total > max_bytes:
+                    # Walk entries oldest first until enough bytes are freed
+                    excess = total - max_bytes
+                    cutoff = None
+                    freed = 0
+                    durable = sorted(_durable_namespaces)
+                    evictable = f"namespace NOT IN ({', '.join('?' * len(durable))})" if durable else "1"
+                    for created_at, size in conn.execute(
+                        f"SELECT created_at, size FROM entries WHERE {evictable} ORDER BY created_at", durable
+                    ):
+                        freed += size
+                        cutoff = created_at
+                        if freed >= excess:
+                            break
+                    oversize = conn.execute(
+                        f"DELETE FROM entries WHERE created_at <= ? AND {evictable}", (cutoff, *durable)
+                    ).rowcount
+                    total, count = conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries").fetchone()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            # Give freed WAL pages back to the filesystem
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error as e:
+            logger.warning(f"Shared store eviction failed: {e}")
+            return 0
+        
+        if expired:
+            STORE_EVICTIONS.inc(expired, reason="expired")
+        if oversize:
+            STORE_EVICTIONS.inc(oversize, reason="size")
+        STORE_BYTES.set(total)
+        STORE_ENTRIES.set(count)
+        removed = expired + oversize
+        if removed:
+            logger.info(f"Shared store evicted {expired} expired and {oversize} oldest entries")
+        return removed
+
+
+_store: Optional[SharedStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> Optional[SharedStore]:
+    """Process-wide store instance, or None when CACHE_DB=off"""
+    global _store
+    path = os.getenv("CACHE_DB", DEFAULT_DB_PATH)
+    if path.lower() == "off":
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SharedStore(path)
+    return _store
+
+
+async def run_eviction(interval: float = EVICT_INTERVAL):
+    """Background task: evict on startup and then every `interval` seconds"""
+    while True:
+        store = get_store()
+        if store:
+            await run_in_threadpool(store.evict)
+        await asyncio.sleep(interval)
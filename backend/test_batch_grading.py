@@ -0,0 +1,105 @@
+"""
+Tests for batch grading jobs
+Jobs must survive cache pressure on the shared store, and a job abandoned by
+a dead worker must be resumed with only its ungraded submissions.
+
+Run with: python -m pytest test_batch_grading.py
+"""
+import asyncio
+import time
+
+import batch_grading
+import store
+from batch_grading import NS_JOB, NS_RESULT, NS_SUBMISSION, BatchGrader, submission_key
+from routers.labs import FileSubmission
+
+
+class FakeEvaluation:
+    def __init__(self, files):
+        self.files = files
+
+    def model_dump(self):
+        return {"files": [file.path for file in self.files]}
+
+
+def setup(monkeypatch, tmp_path, on_grade=None):
+    monkeypatch.setenv("CACHE_DB", str(tmp_path / "store.db"))
+    monkeypatch.setattr(store, "_store", None)
+    monkeypatch.setattr(batch_grading, "get_llm_provider", lambda: None)
+    graded = []
+
+    async def grade_submission(provider, files, *args):
+        graded.append(files[0].path)
+        if on_grade:
+            await on_grade()
+        return FakeEvaluation(files)
+
+    monkeypatch.setattr(batch_grading, "grade_submission", grade_submission)
+    return store.get_store(), graded
+
+
+def submissions(count):
+    return [(f"student{i}", [FileSubmission(path=f"lab{i}.py", content=f"x = {i}\n")]) for i in range(count)]
+
+
+async def wait_for(grader):
+    while grader._tasks:
+        await asyncio.gather(*grader._tasks.values(), return_exceptions=True)
+
+
+def test_job_survives_store_filling_past_size_budget(monkeypatch, tmp_path):
+    async def fill_store():
+        shared = store.get_store()
+        for i in range(50):
+            await shared.aset("analysis", f"entry{i}", "x" * 2000)
+        shared.evict(max_bytes=20_000)
+
+    shared, graded = setup(monkeypatch, tmp_path, fill_store)
+
+    async def run():
+        grader = BatchGrader()
+        job = await grader.create_job(submissions(6), {"correctness": 10})
+        await wait_for(grader)
+        return job, await grader.get_job(job["id"]), await grader.get_results(job["id"])
+
+    job, finished, results = asyncio.run(run())
+    assert finished["status"] == "completed"
+    assert len(graded) == 6
+    assert all(result["status"] == "graded" for result in results.values())
+    assert len(shared.items(NS_SUBMISSION, f"{job['id']}:")) == 6
+    assert len(shared.items("analysis")) < 50
+
+
+def test_abandoned_job_resumes_only_ungraded_submissions(monkeypatch, tmp_path):
+    shared, graded = setup(monkeypatch, tmp_path)
+    pending = submissions(3)
+    keys = [submission_key(files) for _, files in pending]
+    for key, (_, files) in zip(keys, pending):
+        shared.set(NS_SUBMISSION, f"job1:{key}", [f.model_dump() for f in files])
+    shared.set(NS_RESULT, f"job1:{keys[0]}", {"status": "graded", "evaluation": {}})
+    shared.set(NS_JOB, "job1", {
+        "id": "job1", "status": "running", "rubric": {"correctness": 10},
+        "rubric_descriptions": None, "mode": None, "test_cases": [],
+        "students": {student: key for (student, _), key in zip(pending, keys)}, "unique": keys,
+        "created_at": 0.0, "completed_at": None, "owner": "elsewhere:1:dead", "heartbeat": 0.0,
+    })
+
+    async def run():
+        grader = BatchGrader()
+        await grader.resume_abandoned()
+        await wait_for(grader)
+        return grader.owner, await grader.get_job("job1")
+
+    owner, job = asyncio.run(run())
+    assert job["owner"] == owner
+    assert job["status"] == "completed"
+    assert sorted(graded) == ["lab1.py", "lab2.py"]
+
+
+def test_job_with_live_lease_is_not_taken_over(monkeypatch, tmp_path):
+    shared, graded = setup(monkeypatch, tmp_path)
+    job = {"id": "job2", "status": "running", "unique": [], "owner": "elsewhere:1:live", "heartbeat": time.time()}
+    shared.set(NS_JOB, "job2", job)
+    asyncio.run(BatchGrader().resume_abandoned())
+    assert shared.get(NS_JOB, "job2") == job
+    assert graded == []
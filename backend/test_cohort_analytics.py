@@ -0,0 +1,65 @@
+"""
+Tests for cohort mastery analytics
+The array implementation must follow the extension's rules for review
+intervals, readiness and overdue reviews, and /v1/mastery/cohort must
+validate its body with CohortRequest.
+
+Run with: python -m pytest test_cohort_analytics.py
+"""
+from datetime import date
+
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from cohort_analytics import analyze_cohort, review_interval, review_intervals
+from routers import mastery
+
+PROFILES = [
+    ("amy", {"loops": {"score": 4, "last_review": "2026-10-10"}, "recursion": {"score": 1, "last_review": "2026-10-17"}}),
+    ("ben", {"loops": {"score": 2}, "recursion": {"score": 5, "last_review": "2026-10-01T09:30:00"}}),
+    ("cat", {}),
+]
+
+
+def test_review_intervals_match_scalar_rule():
+    scores = np.array([0, 1.5, 2, 2.5, 3.5, 3.6, 5])
+    assert review_intervals(scores).tolist() == [review_interval(score) for score in scores]
+
+
+def test_cohort_readiness_and_reviews():
+    result = analyze_cohort(PROFILES, ["loops", "recursion"], date(2026, 10, 19), queue_limit=2, top=2)
+
+    assert result["students"] == 3
+    assert [(t["topic"], t["mean_score"], t["weak_share"]) for t in result["topics"]] == [
+        ("loops", 3.0, 0.5), ("recursion", 3.0, 0.5)
+    ]
+    assert result["readiness"]["counts"] == {"Ready": 0, "Needs Work": 1, "Not Ready": 2}
+    assert [(e["student_id"], e["percentage"]) for e in result["readiness"]["at_risk"]] == [("cat", 0), ("amy", 50)]
+    assert [(e["student_id"], e["due_topics"], e["overdue_days"]) for e in result["most_overdue"]] == [
+        ("ben", 2, 11), ("amy", 2, 3)
+    ]
+    # Most overdue first; never-reviewed topics are due on the analysis day
+    assert [(e["topic"], e["due"], e["interval_days"]) for e in result["review_queues"]["ben"]] == [
+        ("recursion", "2026-10-08", 7), ("loops", "2026-10-19", 1)
+    ]
+    assert result["review_queues"]["cat"] == []
+
+
+def test_readiness_is_skipped_without_exam_topics():
+    assert "readiness" not in analyze_cohort(PROFILES, as_of=date(2026, 10, 19))
+
+
+def test_endpoint_validates_cohort_request():
+    app = FastAPI()
+    app.include_router(mastery.router)
+    client = TestClient(app)
+
+    response = client.post("/v1/mastery/cohort", json={
+        "students": [{"userId": "amy", "topics": PROFILES[0][1]}], "as_of": "2026-10-19", "top": 1
+    })
+    assert response.status_code == 200
+    assert response.json()["review_queues"]["amy"][0]["topic"] == "loops"
+    assert client.post("/v1/mastery/cohort", json={"students": []}).status_code == 400
+    assert client.post("/v1/mastery/cohort", json={"students": [{"topics": {}}]}).status_code == 422
+    assert client.post("/v1/mastery/cohort", json={"students": [{"userId": "amy"}], "top": 0}).status_code == 422
@@ -0,0 +1,62 @@
+"""
+Tests for gzip request and response bodies
+Gzipped requests reach the endpoint decompressed, zip bombs get 413 and
+corrupt bodies 400 before the endpoint runs, and only complete responses
+above GZIP_MIN_BYTES are compressed.
+
+Run with: python -m pytest test_compression.py
+"""
+import gzip
+import json
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import compression
+
+
+def make_client():
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        body = await request.json()
+        return {"items": body["items"], "content_length": request.headers["content-length"]}
+
+    @app.get("/stream")
+    async def stream():
+        return StreamingResponse(iter([b"{}\n"] * 500), media_type="application/x-ndjson")
+
+    app.add_middleware(compression.CompressionMiddleware)
+    return TestClient(app)
+
+
+def post_gzipped(client, data: bytes):
+    return client.post("/echo", content=data, headers={"Content-Encoding": "gzip", "Content-Type": "application/json"})
+
+
+def test_gzipped_request_is_decompressed():
+    raw = json.dumps({"items": list(range(1000))}).encode()
+    response = post_gzipped(make_client(), gzip.compress(raw))
+    assert response.status_code == 200
+    assert response.json() == {"items": list(range(1000)), "content_length": str(len(raw))}
+
+
+def test_oversized_and_corrupt_requests_are_rejected(monkeypatch):
+    client = make_client()
+    monkeypatch.setattr(compression, "MAX_REQUEST_BYTES", 1000)
+    assert post_gzipped(client, gzip.compress(b" " * 10_000)).status_code == 413
+    assert post_gzipped(client, b"not gzip").status_code == 400
+    assert post_gzipped(client, gzip.compress(b'{"items": []}')[:-8]).status_code == 400
+
+
+def test_only_large_complete_responses_are_gzipped():
+    client = make_client()
+    large = client.post("/echo", json={"items": list(range(1000))}, headers={"Accept-Encoding": "gzip"})
+    small = client.post("/echo", json={"items": [1]}, headers={"Accept-Encoding": "gzip"})
+    stream = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert large.headers.get("Content-Encoding") == "gzip"
+    assert large.json()["items"] == list(range(1000))
+    assert "Content-Encoding" not in small.headers
+    assert "Content-Encoding" not in stream.headers
@@ -0,0 +1,55 @@
+"""
+Tests for the repo-wide concept index
+Unchanged files are skipped and identical functions reuse their cached tags,
+but a new rules version re-indexes every file and tags every function again.
+
+Run with: python -m pytest test_concept_index.py
+"""
+import asyncio
+import os
+
+import concept_index
+from concept_index import ConceptIndex
+
+FACT = "def fact(n):\n    if n < 2:\n        return 1\n    return n * fact(n - 1)\n"
+LOOP = "def total(items):\n    result = 0\n    for item in items:\n        result += item\n    return result\n"
+
+
+def index_files(index, repo, *names):
+    return asyncio.run(index.index_paths(str(repo), [str(repo / name) for name in names]))
+
+
+def test_unchanged_files_and_identical_functions_are_not_tagged_again(monkeypatch, tmp_path):
+    monkeypatch.setenv("CACHE_DB", "off")
+    index = ConceptIndex()
+    (tmp_path / "a.py").write_text(FACT + LOOP)
+    (tmp_path / "b.py").write_text(FACT)
+
+    assert index_files(index, tmp_path, "a.py") == {"files_indexed": 1, "functions_tagged": 2}
+    assert index_files(index, tmp_path, "a.py", "b.py") == {"files_indexed": 1, "functions_tagged": 0}
+    assert [posting["file"] for posting in asyncio.run(index.where(str(tmp_path), "recursion"))] == ["a.py", "b.py"]
+
+
+def test_edited_file_updates_its_postings(monkeypatch, tmp_path):
+    monkeypatch.setenv("CACHE_DB", "off")
+    index = ConceptIndex()
+    path = tmp_path / "a.py"
+    path.write_text(FACT)
+    index_files(index, tmp_path, "a.py")
+
+    path.write_text(LOOP)
+    os.utime(path, ns=(0, 1))
+    assert index_files(index, tmp_path, "a.py") == {"files_indexed": 1, "functions_tagged": 1}
+    assert asyncio.run(index.where(str(tmp_path), "recursion")) == []
+    assert "loops" in asyncio.run(index.concepts_for(str(tmp_path), "a.py"))["concepts"]
+
+
+def test_new_rules_version_reindexes_and_retags(monkeypatch, tmp_path):
+    monkeypatch.setenv("CACHE_DB", "off")
+    index = ConceptIndex()
+    (tmp_path / "a.py").write_text(FACT + LOOP)
+    index_files(index, tmp_path, "a.py")
+
+    monkeypatch.setattr(concept_index, "RULES_VERSION", concept_index.RULES_VERSION + 1)
+    assert index_files(index, tmp_path, "a.py") == {"files_indexed": 1, "functions_tagged": 2}
+    assert index_files(index, tmp_path, "a.py") == {"files_indexed": 0, "functions_tagged": 0}
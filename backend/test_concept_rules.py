@@ -0,0 +1,68 @@
+"""
+Tests for local rule-based concept detection
+Recursion is tagged only for a function calling itself inside its own body,
+and confidence is low whenever the rules recognized little, so the endpoint
+falls back to the LLM.
+
+Run with: python -m pytest test_concept_rules.py
+"""
+import pytest
+
+from concept_rules import detect_concepts_local
+
+BINARY_SEARCH = """
+def search(items, target):
+    low, high = 0, len(items) - 1
+    while low <= high:
+        mid = (low + high) // 2
+        if items[mid] == target:
+            return mid
+        if items[mid] < target:
+            low = mid + 1
+        else:
+            high = mid - 1
+    return -1
+"""
+
+
+@pytest.mark.parametrize("code", [
+    "def fact(n):\n    if n < 2:\n        return 1\n    return n * fact(n - 1)\n",
+    "class Tree:\n    def walk(self, n):\n        if n:\n            self.walk(n - 1)\n",
+])
+def test_self_calls_are_recursion(code):
+    tags, confidence = detect_concepts_local(code, "lab.py")
+    assert tags[0] == "recursion"
+    assert confidence == 0.9
+
+
+@pytest.mark.parametrize("code", [
+    # A nested function that shares the name of the one being called
+    "def outer(n):\n    def fact(k):\n        return 1\n    return fact(n)\n",
+    # Another object's method with the same name as the caller
+    "class Stack:\n    def size(self):\n        return len(self.items)\n"
+    "    def total(self, other):\n        return other.size() + self.size()\n",
+])
+def test_calls_to_other_functions_are_not_recursion(code):
+    assert "recursion" not in detect_concepts_local(code, "lab.py")[0]
+
+
+def test_token_rules_look_inside_the_function_body():
+    recursive = "function fact(n) {\n  if (n < 2) return 1;\n  return n * fact(n - 1);\n}\n"
+    caller = "function fact(n) {\n  return n;\n}\nfunction main() {\n  return fact(3);\n}\n"
+    assert "recursion" in detect_concepts_local(recursive, "lab.js")[0]
+    assert "recursion" not in detect_concepts_local(caller, "lab.js")[0]
+
+
+def test_specific_tags_come_first_with_high_confidence():
+    tags, confidence = detect_concepts_local(BINARY_SEARCH, "lab.py")
+    assert tags == ["binary-search", "arrays", "loops", "conditionals", "functions"]
+    assert confidence == 0.9
+
+
+@pytest.mark.parametrize("code, path", [
+    ("x = 1\nprint(x)\n", "lab.py"),
+    ("def f(:\n", "lab.py"),
+    ("function f(n) {\n  return n;\n}\n", "lab.js"),
+])
+def test_little_recognized_is_low_confidence(code, path):
+    assert detect_concepts_local(code, path)[1] <= 0.5
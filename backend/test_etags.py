@@ -0,0 +1,78 @@
+"""
+Tests for conditional requests on cached analysis endpoints
+A parsed hint carries an ETag; sending it back in If-None-Match returns 304
+without an LLM call, also after gzip has made the ETag weak, while other
+inputs or an unparsed LLM reply never match.
+
+Run with: python -m pytest test_etags.py
+"""
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import compression
+from routers import explain
+
+HINT = {"hint": "Look at how the range shrinks " * 60, "concepts": ["binary-search"], "difficulty": 2}
+
+
+class Provider:
+    model = "test-model"
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = 0
+
+    def get_provider_name(self):
+        return "test"
+
+    async def complete(self, **kwargs):
+        self.calls += 1
+        return self.reply
+
+
+def client_for(monkeypatch, reply=json.dumps(HINT)):
+    monkeypatch.setenv("CACHE_DB", "off")
+    provider = Provider(reply)
+    monkeypatch.setattr(explain, "get_llm_provider", lambda: provider)
+    app = FastAPI()
+    app.include_router(explain.router)
+    app.add_middleware(compression.CompressionMiddleware)
+    return TestClient(app), provider
+
+
+def test_matching_etag_returns_304_without_llm_call(monkeypatch):
+    client, provider = client_for(monkeypatch)
+    body = {"code": "def f(): pass", "level": 2}
+    first = client.post("/v1/explain", json=body, headers={"Accept-Encoding": "identity"})
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and etag.startswith('"')
+
+    again = client.post("/v1/explain", json=body, headers={"If-None-Match": f'"other", {etag}'})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert provider.calls == 1
+
+    other_level = client.post("/v1/explain", json=dict(body, level=3), headers={"If-None-Match": etag})
+    assert other_level.status_code == 200
+    assert other_level.headers["ETag"] != etag
+
+
+def test_gzipped_response_etag_is_weak_and_still_matches(monkeypatch):
+    client, provider = client_for(monkeypatch)
+    body = {"code": "def f(): pass"}
+    first = client.post("/v1/explain", json=body, headers={"Accept-Encoding": "gzip"})
+    assert first.headers["Content-Encoding"] == "gzip"
+    assert first.headers["ETag"].startswith('W/"')
+
+    again = client.post("/v1/explain", json=body, headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert provider.calls == 1
+
+
+def test_unparsed_reply_has_no_etag(monkeypatch):
+    client, _ = client_for(monkeypatch, reply="not json")
+    response = client.post("/v1/explain", json={"code": "def f(): pass"})
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
@@ -0,0 +1,77 @@
+"""
+Tests for integrity feature scoring
+Column stats and z-scores must match the plain per-value formulas, columns
+whose baseline is too small or constant must be left out, and concurrent
+baseline merges must not lose a batch.
+
+Run with: python -m pytest test_integrity_features.py
+"""
+import asyncio
+import math
+
+import numpy as np
+
+import integrity_features
+import store
+from integrity_features import FEATURES, MIN_BASELINE, _column_stats, _merge, score_section, z_scores
+
+
+def use_store(monkeypatch, path):
+    monkeypatch.setenv("CACHE_DB", str(path))
+    monkeypatch.setattr(store, "_store", None)
+    monkeypatch.setattr(integrity_features, "baselines", integrity_features.BaselineStore())
+
+
+def test_column_stats_match_per_value_formulas():
+    matrix = np.random.default_rng(1).normal(size=(12, len(FEATURES)))
+    stats = _column_stats(matrix)
+    for j, feature in enumerate(FEATURES):
+        column = matrix[:, j].tolist()
+        mean = sum(column) / len(column)
+        assert stats[feature]["count"] == 12
+        assert math.isclose(stats[feature]["mean"], mean)
+        assert math.isclose(stats[feature]["m2"], sum((v - mean) ** 2 for v in column))
+
+
+def test_merged_stats_equal_stats_of_combined_rows():
+    matrix = np.random.default_rng(2).normal(size=(20, len(FEATURES)))
+    merged = _column_stats(matrix[:7])
+    for feature, stats in _column_stats(matrix[7:]).items():
+        merged[feature] = _merge(merged[feature], stats)
+    for feature, stats in _column_stats(matrix).items():
+        assert merged[feature]["count"] == stats["count"]
+        assert math.isclose(merged[feature]["mean"], stats["mean"])
+        assert math.isclose(merged[feature]["m2"], stats["m2"])
+
+
+def test_small_or_constant_columns_have_no_z_score():
+    matrix = np.random.default_rng(3).normal(size=(MIN_BASELINE, len(FEATURES)))
+    matrix[:, 0] = 4.0
+    z = z_scores(matrix, _column_stats(matrix))
+    assert np.isnan(z[:, 0]).all()
+    assert not np.isnan(z[:, 1:]).any()
+    assert np.isnan(z_scores(matrix[:2], _column_stats(matrix[:2]))).all()
+
+
+def test_outlier_is_flagged(monkeypatch):
+    monkeypatch.setenv("CACHE_DB", "off")
+    monkeypatch.setattr(integrity_features, "baselines", integrity_features.BaselineStore())
+    plain = [f"def f{i}(x):\n    return x + {i}\n" for i in range(20)]
+    nested = "def g(x):\n" + "".join("    " * (d + 1) + f"for i{d} in x:\n" for d in range(8)) + "    " * 9 + "pass\n"
+    results = asyncio.run(score_section("lab", plain + [nested]))
+    assert len(results) == 21
+    assert "max_nesting" in results[-1]["flags"]
+    assert results[-1]["anomaly_score"] > max(r["anomaly_score"] or 0 for r in results[:-1])
+    assert asyncio.run(score_section("lab", [])) == []
+
+
+def test_concurrent_merges_keep_every_batch(monkeypatch, tmp_path):
+    use_store(monkeypatch, tmp_path / "store.db")
+    batch = _column_stats(np.ones((3, len(FEATURES))))
+
+    async def merge_all():
+        await asyncio.gather(*(integrity_features.baselines.merge("lab", batch) for _ in range(4)))
+        return await integrity_features.baselines.get("lab")
+
+    baseline = asyncio.run(merge_all())
+    assert all(stats["count"] == 12 for stats in baseline.values())
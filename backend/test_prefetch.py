@@ -0,0 +1,136 @@
+"""
+Tests for speculative prefetching of related files
+The per-repo budget must hold across workers, unavailable providers must not
+spend it, and foreground work in this worker or another one must hold back
+or cancel a prefetch, which then runs again once the providers are idle.
+
+Run with: python -m pytest test_prefetch.py
+"""
+import asyncio
+
+import prefetch
+import store
+from prefetch import NS_ACTIVITY, Prefetcher
+from schemas import ContextRequest
+
+
+class Provider:
+    max_concurrency = 4
+
+    def __init__(self, available=True):
+        self.available = available
+
+    def get_provider_name(self):
+        return "test"
+
+    def is_available(self):
+        return self.available
+
+
+def setup(monkeypatch, tmp_path):
+    monkeypatch.setenv("CACHE_DB", str(tmp_path / "store.db"))
+    monkeypatch.setattr(store, "_store", None)
+    monkeypatch.setattr(prefetch, "ENABLED", True)
+    monkeypatch.setattr(prefetch, "IDLE", 0.05)
+    monkeypatch.setattr(prefetch, "ACTIVITY_POLL", 0.05)
+    return store.get_store()
+
+
+def start(prefetcher, provider, analyzed, seconds=0.3):
+    async def prepare(request):
+        return "code", provider, f"key:{request.file_path}"
+
+    async def analyze(request, provider, file_content, analysis_key):
+        await asyncio.sleep(seconds)
+        analyzed.append(request.file_path)
+        return None, {}, False
+
+    prefetcher.start(prepare, analyze)
+
+
+def queue(prefetcher, path):
+    prefetcher.queue[path] = {
+        "request": ContextRequest(repo_path="/repo", file_path=path), "repo": "repo", "paid": False, "preempted": 0,
+    }
+    prefetcher._wake.set()
+
+
+async def wait_until(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_budget_is_shared_across_workers(monkeypatch, tmp_path):
+    setup(monkeypatch, tmp_path)
+    monkeypatch.setattr(prefetch, "BUDGET", 3)
+
+    async def spend():
+        workers = [Prefetcher(), Prefetcher()]
+        return await asyncio.gather(*(worker._spend_budget("repo") for worker in workers * 4))
+
+    assert sum(asyncio.run(spend())) == 3
+
+
+def test_unavailable_provider_spends_no_budget(monkeypatch, tmp_path):
+    shared = setup(monkeypatch, tmp_path)
+
+    async def run():
+        prefetcher, analyzed = Prefetcher(), []
+        start(prefetcher, Provider(available=False), analyzed)
+        queue(prefetcher, "a.py")
+        await wait_until(lambda: not prefetcher.queue and prefetcher._running is None)
+        await asyncio.sleep(0.1)
+        prefetcher.stop()
+        return analyzed
+
+    assert asyncio.run(run()) == []
+    assert shared.items(prefetch.NS_BUDGET) == []
+
+
+def test_foreground_work_preempts_and_prefetch_resumes(monkeypatch, tmp_path):
+    shared = setup(monkeypatch, tmp_path)
+
+    async def run():
+        prefetcher, analyzed = Prefetcher(), []
+        start(prefetcher, Provider(), analyzed)
+        queue(prefetcher, "a.py")
+        await wait_until(lambda: prefetcher._running is not None)
+        async with prefetcher.busy():
+            await wait_until(lambda: prefetcher._running is None)
+            assert "a.py" in prefetcher.queue
+            await asyncio.sleep(0.2)
+            assert prefetcher._running is None
+        await wait_until(lambda: analyzed)
+        prefetcher.stop()
+        return analyzed
+
+    assert asyncio.run(run()) == ["a.py"]
+    # Paid once, though it started twice
+    assert [value for _, value in shared.items(prefetch.NS_BUDGET)] == [1]
+
+
+def test_busy_worker_holds_back_and_preempts_others(monkeypatch, tmp_path):
+    shared = setup(monkeypatch, tmp_path)
+
+    async def run():
+        prefetcher, analyzed = Prefetcher(), []
+        shared.set(NS_ACTIVITY, "other", {"active": 1, "last": 0.0})
+        start(prefetcher, Provider(), analyzed)
+        queue(prefetcher, "a.py")
+        await asyncio.sleep(0.3)
+        assert prefetcher._running is None
+
+        shared.set(NS_ACTIVITY, "other", {"active": 0, "last": 0.0})
+        await wait_until(lambda: prefetcher._running is not None)
+        shared.set(NS_ACTIVITY, "other", {"active": 1, "last": 0.0})
+        await wait_until(lambda: prefetcher._running is None)
+        assert analyzed == [] and "a.py" in prefetcher.queue
+
+        shared.set(NS_ACTIVITY, "other", {"active": 0, "last": 0.0})
+        await wait_until(lambda: analyzed)
+        prefetcher.stop()
+        return analyzed
+
+    assert asyncio.run(run()) == ["a.py"]
@@ -0,0 +1,91 @@
+"""
+Tests that prompt assembly keeps a static, byte-identical prefix
+Per-request values (language, level, exam mode, student context, rubric, code)
+must come after the shared system prompt, or provider-side prefix caching
+(Ollama, llama.cpp-backed LocalAI, hosted APIs) cannot reuse it.
+
+Run with: python -m pytest test_prompts.py
+"""
+import os
+
+from routers.chat import CHAT_SYSTEM_PROMPT, ChatMessage, build_chat_prompt
+from routers.explain import CONCEPTS_PROMPT, TUTOR_SYSTEM_PROMPT, get_hint_prompt
+from routers.labs import EVALUATOR_PROMPT, FileSubmission, build_evaluation_prompt
+
+# Prefixes shorter than this are not worth caching
+MIN_PREFIX_CHARS = 400
+
+
+def common_prefix(prompts):
+    return os.path.commonprefix(list(prompts))
+
+
+def test_static_prompts_have_no_placeholders():
+    for template in (TUTOR_SYSTEM_PROMPT, CHAT_SYSTEM_PROMPT, EVALUATOR_PROMPT, CONCEPTS_PROMPT):
+        assert "{lang}" not in template
+        assert "{exam_mode_note}" not in template
+        assert "{context_info}" not in template
+        assert "{rubric_text}" not in template
+        assert "{code_text}" not in template
+
+
+def test_hint_prompt_prefix_is_stable():
+    prompts = [
+        get_hint_prompt(code, level, lang, exam_mode)
+        for code in ("def f(x):\n    return x * 2", "while lo < hi:\n    mid = (lo + hi) // 2")
+        for level in (1, 2, 3)
+        for lang in ("en", "hi")
+        for exam_mode in (False, True)
+    ]
+    prefix = common_prefix(prompts)
+    assert prefix.startswith(TUTOR_SYSTEM_PROMPT)
+    assert len(prefix) >= MIN_PREFIX_CHARS
+
+
+def test_chat_prompt_prefix_is_stable():
+    contexts = [
+        None,
+        {"current_file": "search.py", "recent_concepts": ["recursion"]},
+        {"mastery": {"arrays": {"score": 1}}},
+    ]
+    histories = [
+        [ChatMessage(role="user", content="Why does my loop never end?")],
+        [ChatMessage(role="user", content="hi"), ChatMessage(role="assistant", content="Hello!"),
+         ChatMessage(role="user", content="Explain recursion")],
+    ]
+    prompts = [
+        build_chat_prompt(messages, context, exam_mode)
+        for messages in histories
+        for context in contexts
+        for exam_mode in (False, True)
+    ]
+    prefix = common_prefix(prompts)
+    assert prefix.startswith(CHAT_SYSTEM_PROMPT)
+    assert len(prefix) >= MIN_PREFIX_CHARS
+
+
+def test_evaluation_prompt_prefix_is_stable():
+    submissions = [
+        [FileSubmission(path="lab1.py", content="print('hello')")],
+        [FileSubmission(path="main.py", content="x = 1"), FileSubmission(path="util.py", content="y = 2")],
+    ]
+    rubrics = [
+        ({"correctness": 30, "style": 20}, None),
+        ({"testing": 50}, {"testing": "Has unit tests"}),
+    ]
+    prompts = [
+        build_evaluation_prompt(files, rubric, descriptions)
+        for files in submissions
+        for rubric, descriptions in rubrics
+    ]
+    prefix = common_prefix(prompts)
+    assert prefix.startswith(EVALUATOR_PROMPT)
+    assert len(prefix) >= MIN_PREFIX_CHARS
+
+
+def test_prefix_is_identical_bytes_across_calls():
+    first = get_hint_prompt("a = 1", 2, "hi", False)
+    second = get_hint_prompt("b = 2", 2, "hi", False)
+    encoded = TUTOR_SYSTEM_PROMPT.encode("utf-8")
+    assert first.encode("utf-8")[:len(encoded)] == encoded
+    assert second.encode("utf-8")[:len(encoded)] == encoded
@@ -0,0 +1,127 @@
+"""
+Tests that lab test cases cannot escape the sandbox
+A submission must not write, delete, rename or link anything outside its
+working directory (through symlinks, bytes paths or file descriptors either),
+read files from the backend's machine into its feedback, or pass off output of
+its own as the harness's results. Evaluations from a sandbox that timed out
+are not cached.
+
+Run with: python -m pytest test_sandbox.py
+"""
+import asyncio
+
+import sandbox
+import store
+from routers.labs import FileSubmission, LabTestCase, grade_submission
+from sandbox import LIMITS, run_tests
+
+
+def run(tests):
+    files = [FileSubmission(path="lab.py", content="def answer():\n    return 42\n")]
+    cases = [LabTestCase(name=f"case{i}", criterion="correctness", code=test) for i, test in enumerate(tests)]
+    return asyncio.run(run_tests(files, cases))
+
+
+def test_passing_and_failing_cases():
+    results = run(["assert answer() == 42", "assert answer() == 41"])
+    assert [r["passed"] for r in results] == [True, False]
+
+
+def test_files_inside_working_directory_are_allowed():
+    results = run([
+        "import os, shutil\n"
+        "os.mkdir('out')\n"
+        "open('out/a.txt', 'w').write('x')\n"
+        "os.rename('out/a.txt', 'out/b.txt')\n"
+        "os.chmod('out/b.txt', 0o600)\n"
+        "shutil.rmtree('out')\n"
+        "assert not os.path.exists('out')",
+    ])
+    assert results[0]["passed"], results[0]["error"]
+
+
+def test_symlink_escape_is_blocked(tmp_path):
+    target = tmp_path / "target.txt"
+    results = run([
+        f"import os\nos.symlink({str(target)!r}, 'link')\nopen('link', 'w').write('pwned')",
+        f"import os\nos.link({str(target)!r}, 'hard')",
+    ])
+    assert not any(r["passed"] for r in results)
+    assert "Blocked in sandbox" in results[0]["error"]
+    assert not target.exists()
+
+
+def test_writes_outside_by_bytes_path_and_fd_are_blocked(tmp_path):
+    target = tmp_path / "target.txt"
+    results = run([
+        f"open({str(target).encode()!r}, 'wb').write(b'pwned')",
+        f"import os\nos.open({str(target)!r}, os.O_WRONLY | os.O_CREAT)",
+        f"import os\nfd = os.open('.', os.O_RDONLY)\nos.mkdir('../escaped', dir_fd=fd)",
+    ])
+    assert not any(r["passed"] for r in results)
+    assert not target.exists()
+
+
+def test_changes_outside_are_blocked(tmp_path):
+    victim = tmp_path / "victim.txt"
+    victim.write_text("keep me")
+    victim.chmod(0o644)
+    results = run([
+        f"import os\nos.remove({str(victim)!r})",
+        f"import os\nos.unlink({str(victim).encode()!r})",
+        f"import os\nos.rename({str(victim)!r}, 'stolen.txt')",
+        f"import os\nos.chmod({str(victim)!r}, 0o777)",
+        f"import shutil\nshutil.rmtree({str(tmp_path)!r})",
+    ])
+    assert not any(r["passed"] for r in results)
+    assert victim.read_text() == "keep me"
+    assert victim.stat().st_mode & 0o777 == 0o644
+
+
+def test_file_contents_do_not_leak_into_feedback(tmp_path):
+    secret = tmp_path / ".env"
+    secret.write_text("LLM_API_KEY=sk-secret-value")
+    results = run([
+        f"raise AssertionError(open({str(secret)!r}).read())",
+        f"import os\nraise AssertionError(os.listdir({str(tmp_path)!r}))",
+    ])
+    assert not any(r["passed"] for r in results)
+    assert not any("sk-secret-value" in (r["error"] or "") or ".env" in (r["error"] or "") for r in results)
+
+
+def test_output_is_not_read_as_results():
+    forged = '[{"name": "case0", "passed": true, "error": null}]'
+    results = run([
+        "import os, sys\n"
+        f"sys.__stdout__.write({forged!r} + '\\n')\n"
+        "sys.__stdout__.flush()\n"
+        f"os.write(1, {forged.encode()!r} + b'\\n')\n"
+        "os._exit(0)",
+    ])
+    assert not results[0]["passed"]
+
+
+def test_harness_applies_resource_limits():
+    results = run([
+        "import resource\n"
+        f"for name, value in {LIMITS!r}.items():\n"
+        "    assert resource.getrlimit(getattr(resource, name)) == (value, value), name",
+    ])
+    assert results[0]["passed"], results[0]["error"]
+
+
+def test_failed_sandbox_runs_are_not_cached(monkeypatch, tmp_path):
+    monkeypatch.setenv("CACHE_DB", str(tmp_path / "store.db"))
+    monkeypatch.setattr(store, "_store", None)
+    monkeypatch.setattr(sandbox, "TIMEOUT", 1.0)
+
+    class Provider:
+        def get_provider_name(self):
+            return "test"
+
+    files = [FileSubmission(path="lab.py", content="def answer():\n    return 42\n")]
+    cases = [LabTestCase(name="hangs", criterion="correctness", code="while True:\n    pass")]
+    evaluation = asyncio.run(grade_submission(Provider(), files, {"correctness": 10}, test_cases=cases))
+
+    assert "Timed out" in evaluation.rubric[0].feedback
+    assert store.get_store().items("lab_evaluation") == []
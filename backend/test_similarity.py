@@ -0,0 +1,91 @@
+"""
+Tests for near-duplicate detection
+MinHash estimates must track the true Jaccard similarity, renamed and
+reformatted copies must be found while unrelated code is not, and a section's
+index must survive the shared store filling past its size budget.
+
+Run with: python -m pytest test_similarity.py
+"""
+import asyncio
+
+import store
+from similarity import SimilarityIndex, estimated_similarity, minhash, normalized_tokens, shingles
+
+ORIGINAL = '''
+def binary_search(items, target):
+    """Index of target in the sorted list, or -1"""
+    low, high = 0, len(items) - 1
+    while low <= high:
+        mid = (low + high) // 2
+        if items[mid] == target:
+            return mid
+        if items[mid] < target:
+            low = mid + 1
+        else:
+            high = mid - 1
+    return -1
+'''
+
+RENAMED = '''
+def find(values, wanted):
+    """Position of wanted"""
+    lo, hi = 0, len(values) - 1
+    while lo <= hi:
+        middle = (lo + hi) // 2
+        if values[middle] == wanted: return middle
+        if values[middle] < wanted:
+            lo = middle + 1
+        else:
+            hi = middle - 1
+    return -1   # not found
+'''
+
+UNRELATED = '''
+def word_counts(text):
+    counts = {}
+    for word in text.lower().split():
+        counts[word] = counts.get(word, 0) + 1
+    return sorted(counts.items(), key=lambda item: -item[1])
+'''
+
+
+def test_minhash_estimates_jaccard_similarity():
+    first, second = set(range(0, 1000)), set(range(250, 1250))
+    exact = len(first & second) / len(first | second)
+    assert abs(estimated_similarity(minhash(first), minhash(second)) - exact) < 0.1
+    assert estimated_similarity(minhash(first), minhash(first)) == 1.0
+
+
+def test_renaming_and_layout_do_not_change_tokens():
+    assert normalized_tokens(ORIGINAL) == normalized_tokens(RENAMED)
+    assert not shingles(normalized_tokens(ORIGINAL)) & shingles(normalized_tokens(UNRELATED))
+
+
+def test_copies_are_found_per_section(monkeypatch):
+    monkeypatch.setenv("CACHE_DB", "off")
+    index = SimilarityIndex()
+
+    async def run():
+        await index.check("lab1", "alice", ORIGINAL)
+        await index.check("lab1", "carol", UNRELATED)
+        return await index.check("lab1", "bob", RENAMED), await index.check("lab2", "dave", RENAMED)
+
+    same_section, other_section = asyncio.run(run())
+    assert [match["submission_id"] for match in same_section] == ["alice"]
+    assert other_section == []
+
+
+def test_index_survives_size_eviction(monkeypatch, tmp_path):
+    monkeypatch.setenv("CACHE_DB", str(tmp_path / "store.db"))
+    monkeypatch.setattr(store, "_store", None)
+    index = SimilarityIndex()
+
+    async def run():
+        await index.check("lab1", "alice", ORIGINAL)
+        shared = store.get_store()
+        for i in range(50):
+            await shared.aset("analysis", f"entry{i}", "x" * 2000)
+        shared.evict(max_bytes=10_000)
+        return await index.check("lab1", "bob", RENAMED)
+
+    assert [match["submission_id"] for match in asyncio.run(run())] == ["alice"]
@@ -0,0 +1,94 @@
+"""
+Tests for static pre-analysis of lab submissions
+Naming findings must follow PEP 8 (throwaway names included), complexity
+findings must describe loop nesting, halving and recursion, and rubric
+criteria must be routed by whole words in their names.
+
+Run with: python -m pytest test_static_analysis.py
+"""
+import pytest
+
+from routers.labs import FileSubmission
+from static_analysis import analyze_files, criterion_kind, findings_text, score_criterion
+
+
+def analyze(code, path="lab.py"):
+    return analyze_files([FileSubmission(path=path, content=code)])
+
+
+def test_throwaway_names_are_not_naming_issues():
+    findings = analyze(
+        "def pairs(items):\n"
+        "    for _ in range(2):\n"
+        "        __ = len(items)\n"
+        "    _, __ = items\n"
+        "    return __\n"
+    )
+    assert findings.naming_issues == []
+
+
+def test_non_pep8_names_are_reported():
+    findings = analyze(
+        "class bad_class:\n"
+        "    pass\n"
+        "def camelCase(someArg):\n"
+        "    l = 1\n"
+        "    return l\n"
+        "moduleValue = 2\n"
+    )
+    assert findings.naming_issues == [
+        "class 'bad_class' (line 1)",
+        "function 'camelCase' (line 3)",
+        "argument 'someArg' (line 3)",
+        "variable 'l' (line 4)",
+        "variable 'moduleValue' (line 6)",
+    ]
+    assert score_criterion(findings, "Code Style")["score"] == "Partial"
+
+
+def test_complexity_findings():
+    findings = analyze(
+        '"""Binary search is O(log n)"""\n'
+        "def search(items, target):\n"
+        "    low, high = 0, len(items)\n"
+        "    while low < high:\n"
+        "        mid = (low + high) // 2\n"
+        "        if items[mid] < target:\n"
+        "            low = mid + 1\n"
+        "        else:\n"
+        "            high = mid\n"
+        "    return low\n"
+        "def pairs(items):\n"
+        "    for a in items:\n"
+        "        for b in items:\n"
+        "            yield a, b\n"
+        "def fact(n):\n"
+        "    return 1 if n < 2 else n * fact(n - 1)\n"
+    )
+    assert findings_text(findings, "Efficiency") == (
+        "search: loop nesting depth 1, halves its range inside a loop; "
+        "pairs: loop nesting depth 2; "
+        "fact: loop nesting depth 0, recursive; "
+        "Big-O complexity is mentioned in comments or docstrings"
+    )
+    assert findings_text(findings, "Correctness") == ""
+    assert score_criterion(findings, "Efficiency") is None
+
+
+@pytest.mark.parametrize("criterion, kind", [
+    ("Documentation", "documentation"),
+    ("Docstrings and comments", "documentation"),
+    ("Code Style & Naming", "code_style"),
+    ("Readability", "code_style"),
+    ("code_style", "code_style"),
+    ("Unit Tests", "tests"),
+    ("Testing", "tests"),
+    ("Time Complexity", "complexity"),
+    ("Efficiency", "complexity"),
+    ("Documentation of style choices", None),
+    ("Contest readiness", None),
+    ("Docker setup", None),
+    ("Correctness", None),
+])
+def test_criterion_routing(criterion, kind):
+    assert criterion_kind(criterion) == kind
@@ -0,0 +1,115 @@
+"""
+Tests for the shared SQLite store
+Every worker's connection must see the others' writes, compare_and_set must
+let exactly one concurrent writer win, expired entries must read as missing,
+and eviction must drop expired entries, then the oldest cache entries, and
+never touch namespaces registered as durable for size.
+
+Run with: python -m pytest test_store.py
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from store import SharedStore, register_durable
+
+
+def test_workers_share_entries(tmp_path):
+    path = str(tmp_path / "store.db")
+    first, second = SharedStore(path), SharedStore(path)
+    first.set("hint", "a", {"text": "hello"})
+    first.set("hint", "ab", [1, 2])
+    first.set("other", "a", "x")
+
+    assert second.get("hint", "a") == {"text": "hello"}
+    assert second.items("hint", "a") == [("a", {"text": "hello"}), ("ab", [1, 2])]
+    second.delete("hint", "a")
+    assert first.get("hint", "a") is None
+    assert first.get("other", "a") == "x"
+
+
+def test_compare_and_set(tmp_path):
+    shared = SharedStore(str(tmp_path / "store.db"))
+    assert shared.compare_and_set("job", "1", None, {"v": 1})
+    assert not shared.compare_and_set("job", "1", None, {"v": 2})
+    assert not shared.compare_and_set("job", "1", {"v": 0}, {"v": 2})
+    assert shared.compare_and_set("job", "1", {"v": 1}, {"v": 2})
+    assert shared.get("job", "1") == {"v": 2}
+
+
+def test_concurrent_increments_are_not_lost(tmp_path):
+    path = str(tmp_path / "store.db")
+    SharedStore(path).set("counter", "n", 0)
+
+    def increment(_):
+        shared = SharedStore(path)
+        while True:
+            current = shared.get("counter", "n")
+            if shared.compare_and_set("counter", "n", current, current + 1):
+                return
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(increment, range(40)))
+    assert SharedStore(path).get("counter", "n") == 40
+
+
+def test_expired_entries_read_as_missing(tmp_path, monkeypatch):
+    shared = SharedStore(str(tmp_path / "store.db"))
+    shared.set("hint", "short", 1, ttl=60)
+    shared.set("hint", "forever", 2, ttl=0)
+    later = time.time() + 120
+    monkeypatch.setattr(time, "time", lambda: later)
+
+    assert shared.get("hint", "short") is None
+    assert shared.get("hint", "forever") == 2
+    assert shared.items("hint") == [("forever", 2)]
+
+
+def test_compare_and_set_none_replaces_expired_entry(tmp_path, monkeypatch):
+    shared = SharedStore(str(tmp_path / "store.db"))
+    shared.set("baseline", "lab", {"count": 3}, ttl=60)
+    assert not shared.compare_and_set("baseline", "lab", None, {"count": 1})
+
+    later = time.time() + 120
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert shared.compare_and_set("baseline", "lab", None, {"count": 1}, ttl=60)
+    assert shared.get("baseline", "lab") == {"count": 1}
+
+
+def test_eviction_drops_expired_then_oldest(tmp_path, monkeypatch):
+    shared = SharedStore(str(tmp_path / "store.db"))
+    shared.set("hint", "expired", "x" * 100, ttl=1)
+    for i in range(5):
+        shared.set("hint", f"entry{i}", "x" * 1000, ttl=0)
+    later = time.time() + 10
+    monkeypatch.setattr(time, "time", lambda: later)
+
+    assert shared.evict(max_bytes=100_000) == 1
+    assert shared.evict(max_bytes=3500) == 2
+    assert [key for key, _ in shared.items("hint")] == ["entry2", "entry3", "entry4"]
+
+
+def test_eviction_keeps_durable_namespaces(tmp_path):
+    register_durable("test_durable")
+    shared = SharedStore(str(tmp_path / "store.db"))
+    shared.set("test_durable", "job", "x" * 5000)
+    for i in range(20):
+        shared.set("test_cache", f"entry{i}", "x" * 1000)
+
+    removed = shared.evict(max_bytes=10_000)
+
+    assert removed > 0
+    assert shared.get("test_durable", "job") == "x" * 5000
+    remaining = [key for key, _ in shared.items("test_cache")]
+    assert remaining == [f"entry{i}" for i in range(20 - len(remaining), 20)]
+
+
+def test_eviction_stops_at_cache_when_durable_state_exceeds_budget(tmp_path):
+    register_durable("test_durable")
+    shared = SharedStore(str(tmp_path / "store.db"))
+    shared.set("test_durable", "job", "x" * 5000)
+    shared.set("test_cache", "entry", "x" * 100)
+
+    shared.evict(max_bytes=1000)
+
+    assert shared.get("test_durable", "job") is not None
+    assert shared.get("test_cache", "entry") is None
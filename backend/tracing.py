@@ -0,0 +1,186 @@
+"""
+Per-request trace spans and Server-Timing headers
+Every request gets a span tree (root request span plus one child per pipeline
+stage). The stage durations are summarized in a Server-Timing header, and the
+full tree can optionally be exported to a local JSON-lines file or an OTLP/HTTP
+collector in a background thread.
+
+Environment:
+    TRACE_EXPORT         "", "file" or "otlp" (default: disabled)
+    TRACE_FILE           Output path for TRACE_EXPORT=file (default: traces.jsonl)
+    TRACE_OTLP_ENDPOINT  Collector URL for TRACE_EXPORT=otlp
+                         (default: http://localhost:4318/v1/traces)
+"""
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Short Server-Timing metric names for pipeline stages
+SERVER_TIMING_NAMES = {
+    "commit_history": "git",
+    "file_read": "read",
+    "related_files": "related",
+    "tokenize": "tokenize",
+    "prompt_build": "prompt",
+    "llm_call": "llm",
+    "response_parse": "parse",
+}
+
+
+class Span:
+    """A single timed operation within a trace"""
+
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Optional[Dict] = None):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes or {}
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """All spans recorded while serving one request"""
+
+    def __init__(self, name: str, attributes: Optional[Dict] = None):
+        self.trace_id = secrets.token_hex(16)
+        self.root = Span(name, None, attributes)
+        self.spans: List[Span] = [self.root]
+
+    def server_timing(self) -> str:
+        """Build a Server-Timing header value, summing repeated stages"""
+        totals: Dict[str, float] = {}
+        for span in self.spans[1:]:
+            key = SERVER_TIMING_NAMES.get(span.name, span.name)
+            totals[key] = totals.get(key, 0.0) + span.duration_ms
+        entries = [f"{name};dur={duration:.1f}" for name, duration in totals.items()]
+        entries.append(f"total;dur={self.root.duration_ms:.1f}")
+        return ", ".join(entries)
+
+    def to_dict(self) -> Dict:
+        return {"trace_id": self.trace_id, "spans": [s.to_dict() for s in self.spans]}
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """Record a child span under the active span of the current trace"""
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get() or trace.root
+    child = Span(name, parent.span_id, {k: v for k, v in attributes.items() if v})
+    trace.spans.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+
+def start_trace(name: str, **attributes) -> Trace:
+    """Begin a trace for the current request"""
+    trace = Trace(name, attributes)
+    current_trace.set(trace)
+    _current_span.set(trace.root)
+    return trace
+
+
+def finish_trace(trace: Trace):
+    """Close the root span and hand the trace to the exporter, if enabled"""
+    trace.root.end_ns = time.time_ns()
+    if _exporter is not None:
+        _exporter.submit(trace)
+
+
+def _to_otlp(trace: Trace) -> Dict:
+    """Encode a trace as an OTLP/HTTP JSON ExportTraceServiceRequest"""
+    spans = []
+    for s in trace.spans:
+        otlp_span = {
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 2 if s.parent_id is None else 1,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns or s.start_ns),
+            "attributes": [
+                {"key": k, "value": {"stringValue": str(v)}} for k, v in s.attributes.items()
+            ],
+        }
+        if s.parent_id:
+            otlp_span["parentSpanId"] = s.parent_id
+        spans.append(otlp_span)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "contextweave-backend"}}]},
+            "scopeSpans": [{"scope": {"name": "contextweave"}, "spans": spans}],
+        }]
+    }
+
+
+class _Exporter:
+    """Background exporter so trace I/O never runs on the event loop"""
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.path = os.getenv("TRACE_FILE", "traces.jsonl")
+        self.endpoint = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+        self._queue: "queue.Queue[Trace]" = queue.Queue(maxsize=1000)
+        threading.Thread(target=self._run, name="trace-exporter", daemon=True).start()
+
+    def submit(self, trace: Trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            logger.debug("Trace export queue full, dropping trace")
+
+    def _run(self):
+        import httpx
+
+        while True:
+            trace = self._queue.get()
+            try:
+                if self.mode == "file":
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(trace.to_dict()) + "\n")
+                else:
+                    httpx.post(self.endpoint, json=_to_otlp(trace), timeout=5.0)
+            except Exception as e:
+                logger.debug(f"Trace export failed: {e}")
+
+
+_mode = os.getenv("TRACE_EXPORT", "").lower()
+_exporter: Optional[_Exporter] = _Exporter(_mode) if _mode in ("file", "otlp") else None
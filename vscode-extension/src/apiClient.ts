@@ -27,6 +27,11 @@ export interface RelatedFile {
     reason: string;
 }
 
+// Last analysis per request, revalidated with its ETag: the backend answers
+// 304 without Git or LLM work when nothing it depends on has changed
+const analysisCache = new Map<string, { etag: string; data: AnalysisResult }>();
+const ANALYSIS_CACHE_SIZE = 50;
+
 export async function analyzeFile(
     repoPath: string,
     filePath: string,
@@ -65,6 +70,9 @@ export async function analyzeFile(
         llm_model: llmModel
     });
 
+    const cacheKey = JSON.stringify(requestBody);
+    const cached = analysisCache.get(cacheKey);
+
     try {
         const response = await axios.post<AnalysisResult>(
             `${backendUrl}/context/file`,
@@ -72,12 +80,18 @@ export async function analyzeFile(
             {
                 timeout: 60000, // 60 second timeout for local LLMs
                 headers: {
-                    'Content-Type': 'application/json'
+                    'Content-Type': 'application/json',
+                    ...(cached ? { 'If-None-Match': cached.etag } : {})
                 },
                 validateStatus: (status) => status < 600 // Don't throw on 4xx/5xx, handle manually
             }
         );
 
+        if (response.status === 304 && cached) {
+            console.log('API Response: not modified, using cached analysis');
+            return cached.data;
+        }
+
         if (response.status >= 400) {
             // Backend returned an error
             const errorDetail = response.data as any;
@@ -97,6 +111,18 @@ export async function analyzeFile(
             has_related_files: response.data.related_files.length > 0
         });
 
+        const etag = response.headers['etag'];
+        if (etag) {
+            analysisCache.delete(cacheKey);
+            analysisCache.set(cacheKey, { etag, data: response.data });
+            if (analysisCache.size > ANALYSIS_CACHE_SIZE) {
+                // Maps iterate in insertion order: drop the least recently stored entry
+                analysisCache.delete(analysisCache.keys().next().value as string);
+            }
+        } else {
+            analysisCache.delete(cacheKey);
+        }
+
         return response.data;
 
     } catch (error: any) {
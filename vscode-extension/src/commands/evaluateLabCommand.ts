@@ -4,9 +4,13 @@
 import * as vscode from 'vscode';
 import * as path from 'path';
 import * as fs from 'fs';
+import * as zlib from 'zlib';
 import axios from 'axios';
 import { RubricPanel } from '../webviews/RubricPanel';
 
+// Submissions at least this large are sent gzipped (the backend accepts Content-Encoding: gzip)
+const GZIP_REQUEST_BYTES = 64 * 1024;
+
 export class EvaluateLabCommand {
     constructor(
         private extensionUri: vscode.Uri,
@@ -53,11 +57,20 @@ export class EvaluateLabCommand {
                 }));
 
                 // Call backend
-                const response = await axios.post(`${this.backendUrl}/v1/labs/evaluate`, {
+                const body = JSON.stringify({
                     files: files,
                     rubric: rubric.criteria || rubric,
-                    rubric_descriptions: rubric.descriptions
-                }, {
+                    rubric_descriptions: rubric.descriptions,
+                    test_cases: rubric.test_cases
+                });
+                const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+                let payload: string | Buffer = body;
+                if (Buffer.byteLength(body) >= GZIP_REQUEST_BYTES) {
+                    payload = zlib.gzipSync(body);
+                    headers['Content-Encoding'] = 'gzip';
+                }
+                const response = await axios.post(`${this.backendUrl}/v1/labs/evaluate`, payload, {
+                    headers,
                     timeout: 60000
                 });
 
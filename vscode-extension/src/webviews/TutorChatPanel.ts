@@ -3,6 +3,7 @@
  */
 import * as vscode from 'vscode';
 import axios from 'axios';
+import { randomUUID } from 'crypto';
 import { MasteryManager } from '../storage/masteryManager';
 
 interface ChatMessage {
@@ -15,6 +16,10 @@ export class TutorChatPanel {
     private readonly _panel: vscode.WebviewPanel;
     private _disposables: vscode.Disposable[] = [];
     private messages: ChatMessage[] = [];
+    // The backend keeps the conversation for this id; after the first reply
+    // only the new message is sent
+    private readonly sessionId: string = randomUUID();
+    private sessionStarted = false;
 
     private constructor(
         panel: vscode.WebviewPanel,
@@ -82,14 +87,28 @@ export class TutorChatPanel {
                 recent_concepts: this.masteryManager.getDueTopics()
             };
 
-            const response = await axios.post(`${this.backendUrl}/v1/chat`, {
-                messages: this.messages,
+            const send = (continues: boolean) => axios.post(`${this.backendUrl}/v1/chat`, {
+                messages: continues ? this.messages.slice(-1) : this.messages,
                 context: context,
-                exam_mode: examMode
+                exam_mode: examMode,
+                session_id: this.sessionId,
+                session_continues: continues
             }, {
                 timeout: 30000
             });
 
+            let response;
+            try {
+                response = await send(this.sessionStarted);
+            } catch (error: any) {
+                // 409: the server lost the session (expired or restarted): resend the whole conversation
+                if (!this.sessionStarted || error.response?.status !== 409) {
+                    throw error;
+                }
+                response = await send(false);
+            }
+
+            this.sessionStarted = true;
             this.messages.push({ role: 'assistant', content: response.data.message });
             this.updateChat();
 